@@ -0,0 +1,374 @@
+"""
+Анализ отраслей по таблице companies по шагам: load -> clean -> analyze ->
+report. Загруженные и очищенные данные запоминаются по маркеру изменений
+базы (snapshot.change_marker) и параметрам очистки - в памяти и, если задан
+cache_dir, на диске. Поэтому расчет с другими весами perspective_score не
+перечитывает и не чистит таблицу:
+
+    data = load('companies.db')
+    cleaned = clean(data, CleanParams(method='mad'))
+    result = analyze(cleaned, ScoreWeights(growth=0.5, revenue=0.2, positive_growth=0.3))
+    report(result)
+
+Командная строка - main() (python analysis.py или analyze_outliers.py).
+"""
+import argparse
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from incremental_metrics import DEFAULT_CACHE_PATH, incremental_industry_metrics
+from industry_metrics import (
+    DEFAULT_WEIGHTS, MAX_ANALYSIS_REVENUE, ScoreWeights, add_perspective_score, compute_group_metrics,
+)
+from outlier_filters import DEFAULT_METHOD, FILTERS, clean_by_group, loss_report, outlier_mask
+from plotting import PLOT_PATH, frame_box_stats, plot_distributions, state_box_stats
+from report_writer import REPORT_FORMATS, REPORT_NAME, TOP_COLUMNS, top_by_group, write_report
+from snapshot import SNAPSHOT_PATH, change_marker, fill_top_details, load_analysis_frame
+from streaming_metrics import metrics_from_state, stream_industry_state, top_companies
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = 'companies.db'
+# Сколько результатов load/clean держится в памяти
+MEMO_SIZE = 4
+
+_memo: 'OrderedDict[tuple, object]' = OrderedDict()
+
+
+@dataclass(frozen=True)
+class CleanParams:
+    method: str = DEFAULT_METHOD
+    threshold: Optional[float] = None  # None - порог метода по умолчанию
+    max_revenue: Optional[float] = MAX_ANALYSIS_REVENUE  # None - без ограничения
+    min_companies: int = 0  # отрасли с меньшим числом компаний после очистки отбрасываются
+
+
+class LoadedData:
+    """
+    Строки companies для анализа. Кадр читается при первом обращении к
+    frame, поэтому, если очищенные данные уже есть в кэше, таблица не читается.
+    """
+
+    def __init__(self, db_path: str, snapshot_path: str, marker: Optional[str]):
+        self.db_path = db_path
+        self.snapshot_path = snapshot_path
+        self.marker = marker  # None - изменения базы не отслеживаются, результат не запоминается
+        self.source: Optional[str] = None  # 'snapshot' или 'sqlite' после чтения
+        self._frame: Optional[pd.DataFrame] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._frame is not None
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        if self._frame is None:
+            start = time.perf_counter()
+            self._frame, self.source = load_analysis_frame(self.db_path, self.snapshot_path, max_revenue=None)
+            logger.info(f"Загружено {len(self._frame)} строк из {self.source} "
+                        f"за {time.perf_counter() - start:.2f} с")
+        return self._frame
+
+
+@dataclass
+class CleanedData:
+    frame: pd.DataFrame
+    params: CleanParams
+    loaded_rows: int
+    losses: pd.DataFrame  # loss_report очистки
+    group_metrics: pd.DataFrame  # compute_group_metrics без perspective_score
+    tops: Dict[str, pd.DataFrame]
+    revenue_mean: float
+    # Откуда взяты: 'computed' - очищены сейчас, 'memo' - из памяти, 'cache' - из cache_dir
+    source: str = 'computed'
+
+
+@dataclass
+class AnalysisResult:
+    metrics: pd.DataFrame
+    tops: Dict[str, pd.DataFrame]
+    cleaned: Optional[CleanedData] = None  # None в потоковом и инкрементальном режимах
+    # Статистики графиков по колонкам, если строк в памяти нет (потоковый режим)
+    box_stats: Dict[str, List[dict]] = field(default_factory=dict)
+
+
+def clear_memo():
+    _memo.clear()
+
+
+def _remember(key: tuple, value):
+    _memo[key] = value
+    _memo.move_to_end(key)
+    while len(_memo) > MEMO_SIZE:
+        _memo.popitem(last=False)
+    return value
+
+
+def _recall(key: tuple):
+    value = _memo.get(key)
+    if value is not None:
+        _memo.move_to_end(key)
+    return value
+
+
+def db_marker(db_path: str) -> Optional[str]:
+    cnx = sqlite3.connect(db_path)
+    try:
+        return change_marker(cnx)
+    finally:
+        cnx.close()
+
+
+def _load_key(db_path: str, snapshot_path: str, marker: Optional[str]) -> tuple:
+    return 'load', os.path.abspath(db_path), os.path.abspath(snapshot_path), marker
+
+
+def load(db_path: str = DB_PATH, snapshot_path: str = SNAPSHOT_PATH) -> LoadedData:
+    """
+    Строки companies с revenue и growth_rate (без ограничения выручки - оно
+    в CleanParams): из свежего снимка или из SQLite. Пока маркер базы не
+    изменился, возвращается запомненный результат.
+    """
+    marker = db_marker(db_path)
+    key = _load_key(db_path, snapshot_path, marker)
+    if marker is not None:
+        cached = _recall(key)
+        if cached is not None:
+            return cached
+    data = LoadedData(db_path, snapshot_path, marker)
+    return _remember(key, data) if marker is not None else data
+
+
+def _cache_file(cache_dir: str, key: tuple) -> str:
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f'clean-{digest}.pkl')
+
+
+def _read_cached(path: str, key: tuple) -> Optional[CleanedData]:
+    try:
+        with open(path, 'rb') as f:
+            stored_key, cleaned = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Кэш очистки {path} не прочитан: {e}")
+        return None
+    return cleaned if stored_key == key else None
+
+
+def _write_cached(path: str, key: tuple, cleaned: CleanedData):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump((key, cleaned), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _clean(data: LoadedData, params: CleanParams) -> CleanedData:
+    frame = data.frame
+    loaded_rows = len(frame)
+    if params.max_revenue is not None:
+        frame = frame[frame['revenue'] < params.max_revenue]
+    # Очистка по каждому ОКВЭД отдельно: маска без копирования групп
+    keep = outlier_mask(frame, params.method, params.threshold)
+    cleaned = frame[keep].reset_index(drop=True)
+    if params.min_companies > 0:
+        counts = cleaned['okved_1'].value_counts()
+        cleaned = cleaned[cleaned['okved_1'].isin(counts[counts >= params.min_companies].index)]
+
+    if data.source == 'snapshot':
+        # В снимке прочитаны только колонки для метрик, остальное - для топ-10
+        tops = fill_top_details(top_by_group(cleaned, ['inn']), data.snapshot_path, TOP_COLUMNS)
+    else:
+        tops = top_by_group(cleaned)
+    return CleanedData(
+        frame=cleaned, params=params, loaded_rows=loaded_rows, losses=loss_report(frame, keep),
+        group_metrics=compute_group_metrics(cleaned), tops=tops, revenue_mean=cleaned['revenue'].mean(),
+    )
+
+
+def clean(data: LoadedData, params: CleanParams = CleanParams(), cache_dir: Optional[str] = None) -> CleanedData:
+    """
+    Ограничение выручки, очистка от выбросов и отсев малых отраслей, затем
+    метрики без оценки и топ-10. Результат запоминается по маркеру базы и
+    params; с cache_dir - еще и в файле, чтобы пережить перезапуск.
+    """
+    if params.method not in FILTERS:
+        raise ValueError(f"Неизвестный метод очистки: {params.method}")
+    if data.marker is None:
+        return _clean(data, params)
+
+    key = ('clean', _load_key(data.db_path, data.snapshot_path, data.marker), params)
+    cached = _recall(key)
+    source = 'memo'
+    if cached is None and cache_dir:
+        cached = _read_cached(_cache_file(cache_dir, key), key)
+        source = 'cache'
+    if cached is not None:
+        return replace(_remember(key, cached), source=source)
+
+    start = time.perf_counter()
+    cleaned = _clean(data, params)
+    logger.info(f"Очистка {params.method}: осталось {len(cleaned.frame)} из {cleaned.loaded_rows} строк "
+                f"за {time.perf_counter() - start:.2f} с")
+    if cache_dir:
+        _write_cached(_cache_file(cache_dir, key), key, cleaned)
+    return _remember(key, cleaned)
+
+
+def analyze(cleaned: CleanedData, weights: ScoreWeights = DEFAULT_WEIGHTS) -> AnalysisResult:
+    """Оценка perspective_score по готовым метрикам: данные не перечитываются"""
+    metrics = add_perspective_score(cleaned.group_metrics, cleaned.revenue_mean, weights)
+    return AnalysisResult(metrics=metrics, tops=cleaned.tops, cleaned=cleaned)
+
+
+def analyze_streaming(db_path: str = DB_PATH, chunk_size: int = 100_000, workers: int = 1,
+                      weights: ScoreWeights = DEFAULT_WEIGHTS) -> Tuple[AnalysisResult, int]:
+    """Потоковый расчет (streaming_metrics); возвращает и число строк до очистки"""
+    states, loaded = stream_industry_state(db_path, chunk_size=chunk_size, workers=workers)
+    result = AnalysisResult(
+        metrics=metrics_from_state(states, weights), tops=top_companies(states),
+        box_stats={column: state_box_stats(states, column) for column in ('revenue', 'growth_rate')},
+    )
+    return result, loaded
+
+
+def analyze_incremental(db_path: str = DB_PATH, params: CleanParams = CleanParams(),
+                        cache_path: str = DEFAULT_CACHE_PATH,
+                        weights: ScoreWeights = DEFAULT_WEIGHTS) -> Tuple[AnalysisResult, List[str]]:
+    """Пересчет только изменившихся отраслей (incremental_metrics); возвращает и их список"""
+    cnx = sqlite3.connect(db_path)
+    try:
+        metrics, tops, refreshed = incremental_industry_metrics(
+            cnx, partial(clean_by_group, method=params.method, threshold=params.threshold), cache_path,
+            clean_key=f'{params.method}:{params.threshold}', weights=weights,
+        )
+    finally:
+        cnx.close()
+    return AnalysisResult(metrics=metrics, tops=tops), refreshed
+
+
+def report(result: AnalysisResult, name: str = REPORT_NAME, formats: Sequence[str] = ('xlsx',),
+           plot_path: Optional[str] = PLOT_PATH) -> List[str]:
+    """Файлы отчета (report_writer) и график распределений; plot_path=None - без графика"""
+    paths = write_report(result.metrics, result.tops, name, formats)
+    if plot_path is None:
+        return paths
+    # Графики строятся по статистикам ящиков, а не по всем строкам
+    if result.cleaned is not None:
+        frame = result.cleaned.frame
+        box_stats = {column: frame_box_stats(frame, column) for column in ('revenue', 'growth_rate')}
+    else:
+        box_stats = result.box_stats
+    if not box_stats:
+        logger.info("Строки загружены не полностью, графики распределений не строятся")
+        return paths
+    plot_distributions(box_stats['revenue'], box_stats['growth_rate'], plot_path)
+    return paths + [plot_path]
+
+
+def _weights(text: str) -> ScoreWeights:
+    try:
+        values = [float(value) for value in text.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("веса - три числа через запятую")
+    if len(values) != len(ScoreWeights._fields):
+        raise argparse.ArgumentTypeError(f"нужно {len(ScoreWeights._fields)} веса: {', '.join(ScoreWeights._fields)}")
+    return ScoreWeights(*values)
+
+
+def _max_revenue(text: str) -> Optional[float]:
+    return None if text.lower() == 'none' else float(text)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Анализ отраслей по таблице companies")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--streaming', action='store_true',
+                        help="Читать таблицу порциями (память не зависит от размера таблицы, квантили приближенные)")
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=1, help="Процессов для потокового режима")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Пересчитывать только отрасли, изменившиеся по okved_summary, остальные брать из кэша")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help="Файл кэша для --incremental")
+    parser.add_argument('--snapshot', default=SNAPSHOT_PATH,
+                        help="Parquet-снимок companies (pars3.py --snapshot); читается, если не устарел")
+    parser.add_argument('--cache-dir', help="Каталог для очищенных данных между запусками")
+    parser.add_argument('--outliers', choices=sorted(FILTERS), default=DEFAULT_METHOD,
+                        help="Метод очистки от выбросов внутри ОКВЭД (см. outlier_filters.py)")
+    parser.add_argument('--threshold', type=float, help="Порог метода очистки (по умолчанию свой для каждого метода)")
+    parser.add_argument('--max-revenue', type=_max_revenue, default=MAX_ANALYSIS_REVENUE,
+                        help="Компании с выручкой от этого значения не анализируются (none - без ограничения)")
+    parser.add_argument('--min-companies', type=int, default=0, help="Минимум компаний в отрасли после очистки")
+    parser.add_argument('--weights', type=_weights, default=DEFAULT_WEIGHTS,
+                        help=f"Веса perspective_score: {','.join(ScoreWeights._fields)} "
+                             f"(по умолчанию {','.join(map(str, DEFAULT_WEIGHTS))})")
+    parser.add_argument('--report', default=REPORT_NAME, help="Имя файлов отчета без расширения")
+    parser.add_argument('--formats', default='xlsx',
+                        help=f"Форматы отчета через запятую: {', '.join(REPORT_FORMATS)}")
+    parser.add_argument('--plot', default=PLOT_PATH, help="Файл графика распределений")
+    parser.add_argument('--no-plots', action='store_true', help="Не строить график распределений")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    formats = [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()]
+    if set(formats) - set(REPORT_FORMATS):
+        parser.error(f"--formats: допустимы {', '.join(REPORT_FORMATS)}")
+    if args.streaming and (args.outliers != 'zscore' or args.threshold is not None):
+        parser.error("потоковый режим поддерживает только --outliers zscore с порогом 3")
+    if (args.streaming or args.incremental) and (args.max_revenue != MAX_ANALYSIS_REVENUE or args.min_companies):
+        parser.error("--max-revenue и --min-companies поддерживаются только при полной загрузке")
+    if not os.path.exists(args.db):
+        parser.error(f"нет базы {args.db}")
+    params = CleanParams(args.outliers, args.threshold, args.max_revenue, args.min_companies)
+
+    if args.streaming:
+        result, loaded = analyze_streaming(args.db, args.chunk_size, args.workers, args.weights)
+        print(f"Загружено {loaded} записей (потоковый режим)")
+        print(f"После удаления выбросов осталось {int(result.metrics['company_count'].sum())} записей")
+    elif args.incremental:
+        result, refreshed = analyze_incremental(args.db, params, args.cache, args.weights)
+        print(f"Пересчитаны отрасли: {', '.join(refreshed) or 'нет изменений'}")
+    else:
+        data = load(args.db, args.snapshot)
+        cleaned = clean(data, params, args.cache_dir)
+        if cleaned.source == 'memo':
+            source = 'очищенные данные из памяти'
+        elif cleaned.source == 'cache':
+            source = f'очищенные данные из {args.cache_dir}'
+        else:
+            source = 'снимок ' + args.snapshot if data.source == 'snapshot' else 'SQLite'
+        print(f"Загружено {cleaned.loaded_rows} записей ({source})")
+        kept = int(cleaned.losses['rows'].sum() - cleaned.losses['removed'].sum())
+        print(f"После удаления выбросов ({params.method}) осталось {kept} записей")
+        print("\nБольше всего строк удалено в ОКВЭД:")
+        print(cleaned.losses.head(10))
+        if params.min_companies:
+            print(f"После удаления ОКВЭД с малой выборкой осталось {len(cleaned.frame)} записей")
+        print("\nКоличество компаний по ОКВЭД после фильтрации:")
+        print(cleaned.frame['okved_1'].value_counts())
+        result = analyze(cleaned, args.weights)
+
+    report(result, args.report, formats, None if args.no_plots else args.plot)
+
+    print("\nТоп-5 перспективных отраслей:")
+    print(result.metrics[['okved', 'perspective_score', 'avg_revenue', 'avg_growth', 'company_count']].head())
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    raise SystemExit(main())
@@ -0,0 +1,73 @@
+"""
+Запись компаний воркерами pars3: каждая страница (20 компаний) своей
+транзакцией против общей очереди CompanyWriter с записью пакетами.
+
+    python benchmarks/bench_company_writer.py --pages 2000 --workers 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from company_writer import CompanyWriter  # noqa: E402
+from database import Database  # noqa: E402
+from synthetic import company_batches  # noqa: E402
+
+
+def make_pages(pages: int, per_page: int):
+    companies = next(company_batches(pages * per_page, seed=0, batch_size=pages * per_page))
+    return [companies[i:i + per_page] for i in range(0, len(companies), per_page)]
+
+
+async def run_workers(pages, workers: int, save) -> float:
+    async def worker(worker_id: int):
+        for page in pages[worker_id::workers]:
+            await save(page)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(workers)))
+    return time.perf_counter() - start
+
+
+async def inline(path: str, pages, workers: int):
+    async with Database(path, pool_size=workers) as db:
+        await db.create_table()
+        seconds = await run_workers(pages, workers, db.save_companies)
+        return seconds, len(pages), await db.get_total_companies()
+
+
+async def batched(path: str, pages, workers: int, batch_size: int):
+    async with Database(path, pool_size=workers) as db:
+        await db.create_table()
+        writer = CompanyWriter(db, batch_size=batch_size)
+        await writer.start()
+        start = time.perf_counter()
+        await run_workers(pages, workers, writer.submit)
+        await writer.close()
+        seconds = time.perf_counter() - start
+        return seconds, writer.commits, await db.get_total_companies()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--per-page", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages, args.per_page)
+    rows = args.pages * args.per_page
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, run in (
+            ('Транзакция на страницу', inline(os.path.join(tmp, 'inline.db'), pages, args.workers)),
+            ('CompanyWriter        ', batched(os.path.join(tmp, 'batched.db'), pages, args.workers,
+                                              args.batch_size)),
+        ):
+            seconds, commits, total = asyncio.run(run)
+            print(f"{label}: {seconds:6.2f} с, {commits:5d} коммитов, {rows / seconds:8.0f} строк/с, "
+                  f"в базе {total}")
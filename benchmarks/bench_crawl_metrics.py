@@ -0,0 +1,48 @@
+"""
+Накладные расходы crawl_metrics на один замеренный этап: без обертки,
+с выключенными метриками (по умолчанию в pars3) и с включенными.
+
+    python benchmarks/bench_crawl_metrics.py --calls 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crawl_metrics import SAVE, CrawlMetrics  # noqa: E402
+
+
+def bare(metrics: CrawlMetrics, calls: int):
+    for _ in range(calls):
+        pass
+
+
+def staged(metrics: CrawlMetrics, calls: int):
+    for _ in range(calls):
+        with metrics.stage(SAVE):
+            pass
+        metrics.inc('pages')
+
+
+def per_call(func, metrics: CrawlMetrics, calls: int) -> float:
+    start = time.perf_counter()
+    func(metrics, calls)
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    metrics = CrawlMetrics()
+    bare_ns = per_call(bare, metrics, args.calls)
+    disabled_ns = per_call(staged, metrics, args.calls) - bare_ns
+    metrics.enable()
+    enabled_ns = per_call(staged, metrics, args.calls) - bare_ns
+
+    print(f"Этап + счетчик, выключено: {disabled_ns:7.0f} нс")
+    print(f"Этап + счетчик, включено:  {enabled_ns:7.0f} нс")
+    print(f"Снимок Prometheus: {len(metrics.prometheus().splitlines())} строк")
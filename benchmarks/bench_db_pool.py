@@ -0,0 +1,77 @@
+"""
+Накладные расходы на один вызов Database: соединение на каждый вызов
+против пула долгоживущих соединений.
+
+    python benchmarks/bench_db_pool.py --ops 5000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Company, Database  # noqa: E402
+
+
+def make_companies(n: int):
+    return [Company(
+        name=f"ООО Компания {i}",
+        okved="07.10.1",
+        okved_1="07",
+        okved_2="10",
+        okved_3="1",
+        inn=f"{7700000000 + i}",
+        revenue=500000000.0 + i,
+        growth_rate=1.5,
+        owner="Иванов И.И."
+    ) for i in range(n)]
+
+
+async def run_ops(db: Database, inns, concurrency: int) -> float:
+    """Выполняет чередующиеся чтения и запись небольшими пачками, как воркеры pars3"""
+    queue = list(inns)
+
+    async def worker(worker_id: int):
+        for i in range(worker_id, len(queue), concurrency):
+            if i % 10 == 0:
+                await db.save_companies(make_companies(1))
+            elif i % 2:
+                await db.company_exists(queue[i])
+            else:
+                await db.get_company_by_inn(queue[i])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def bench(ops: int, concurrency: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        seed = make_companies(1000)
+        inns = [seed[i % len(seed)].inn for i in range(ops)]
+
+        db = Database(os.path.join(tmp, "per_call.db"))
+        await db.create_table()
+        await db.save_companies(seed)
+        per_call = await run_ops(db, inns, concurrency)
+
+        async with Database(os.path.join(tmp, "pooled.db"), pool_size=concurrency) as pooled:
+            await pooled.create_table()
+            await pooled.save_companies(seed)
+            pooled_time = await run_ops(pooled, inns, concurrency)
+
+    print(f"Операций: {ops}, параллельных воркеров: {concurrency}")
+    print(f"Соединение на вызов: {per_call:.2f} с, {per_call / ops * 1e6:.0f} мкс/операцию")
+    print(f"Пул соединений:      {pooled_time:.2f} с, {pooled_time / ops * 1e6:.0f} мкс/операцию")
+    print(f"Ускорение: {per_call / pooled_time:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(bench(args.ops, args.concurrency))
@@ -0,0 +1,96 @@
+"""
+Чтение всей таблицы companies: прежний get_all_companies (fetchall и список
+dataclass Company) против iter_companies (пакеты CompanyRecord) и
+iter_company_columns (numpy-колонки). Каждый режим запускается в отдельном
+процессе; печатаются время, задержка до первой записи и пиковая память.
+
+    python benchmarks/bench_db_reads.py --rows 1000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_snapshot import make_database  # noqa: E402
+from database import Company, Database  # noqa: E402
+
+MODES = ['fetchall', 'iter', 'columns']
+
+
+async def read_fetchall(db: Database, batch_size: int):
+    """Прежняя реализация get_all_companies"""
+    async with db.connection() as conn:
+        async with conn.execute('SELECT * FROM companies') as cursor:
+            rows = await cursor.fetchall()
+            companies = [Company(
+                inn=row[0], name=row[1], okved=row[2], okved_1=row[3], okved_2=row[4], okved_3=row[5],
+                revenue=row[6], growth_rate=row[7], owner=row[8]
+            ) for row in rows]
+    yield len(companies)
+
+
+async def read_iter(db: Database, batch_size: int):
+    async for batch in db.iter_company_batches(batch_size):
+        yield len(batch)
+
+
+async def read_columns(db: Database, batch_size: int):
+    async for batch in db.iter_company_columns(('okved_1', 'revenue', 'growth_rate'), batch_size):
+        yield len(batch['revenue'])
+
+
+READERS = {'fetchall': read_fetchall, 'iter': read_iter, 'columns': read_columns}
+
+
+async def child(args):
+    async with Database(args.db, pool_size=1) as db:
+        start = time.perf_counter()
+        first = None
+        rows = 0
+        async for count in READERS[args.mode](db, args.batch_size):
+            if first is None:
+                first = time.perf_counter() - start
+            rows += count
+        elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({'rows': rows, 'seconds': elapsed, 'first': first, 'peak_mb': peak}))
+
+
+def spawn(mode: str, args) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, '--child', mode, '--db', args.db, '--batch-size', str(args.batch_size)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--groups", type=int, default=80)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--db", help="Готовая база (по умолчанию создается синтетическая)")
+    parser.add_argument("--child", dest='mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        asyncio.run(child(args))
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.db is None:
+            args.db = os.path.join(tmp, 'companies.db')
+            make_database(args.db, args.rows, args.groups)
+        results = {mode: spawn(mode, args) for mode in MODES}
+
+    print(f"Строк: {results['fetchall']['rows']}, пакет: {args.batch_size}")
+    for mode, result in results.items():
+        print(f"{mode:9s}: {result['seconds']:6.2f} с, первая запись через {result['first']:6.3f} с, "
+              f"пик памяти {result['peak_mb']:6.0f} МБ")
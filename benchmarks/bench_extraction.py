@@ -0,0 +1,78 @@
+"""
+Скорость извлечения карточек в Selenium: dom (запрос WebDriver на каждое поле)
+против snapshot (один page_source) и js (один execute_script).
+Страницы из benchmarks/fixtures раздаются локальным сервером, загрузка
+страницы в замер не входит - измеряется только извлечение.
+
+    python benchmarks/bench_extraction.py --rounds 5
+    python benchmarks/bench_extraction.py --no-browser   # только разбор HTML
+
+Для режимов с браузером нужен Chrome, доступный для webdriver.Chrome().
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_http_backend import FIXTURES_DIR, okved_of_path  # noqa: E402
+from card_parser import parse_company_cards  # noqa: E402
+from fixture_server import serve_directory  # noqa: E402
+
+
+def load_expected() -> dict:
+    with open(os.path.join(FIXTURES_DIR, 'expected.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def bench_parser(expected: dict, rounds: int):
+    """Разбор сохраненного HTML без браузера - нижняя граница для snapshot"""
+    pages = []
+    for path in expected:
+        with open(os.path.join(FIXTURES_DIR, path.strip('/'), 'index.html'), encoding='utf-8') as f:
+            pages.append((f.read(), okved_of_path(path)))
+    cards = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for html, okved in pages:
+            cards += len(parse_company_cards(html, okved))
+    elapsed = time.perf_counter() - start
+    print(f"{'html parser':>12}: {cards / elapsed:8.0f} карточек/с")
+
+
+def bench_browser(expected: dict, rounds: int):
+    from pars3 import EXTRACTORS, _open_listing, setup_driver
+
+    driver = setup_driver()
+    try:
+        with serve_directory(FIXTURES_DIR) as base_url:
+            for mode, extract in EXTRACTORS.items():
+                cards = 0
+                elapsed = 0.0
+                mismatches = 0
+                for _ in range(rounds):
+                    for path, expected_cards in expected.items():
+                        elements = _open_listing(driver, f'{base_url}{path}')
+                        start = time.perf_counter()
+                        results = extract(driver, elements, okved_of_path(path))
+                        elapsed += time.perf_counter() - start
+                        cards += len(results)
+                        mismatches += results != expected_cards
+                status = "совпадает" if not mismatches else f"расхождений: {mismatches}"
+                print(f"{mode:>12}: {cards / elapsed:8.0f} карточек/с ({status})")
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--no-browser", action="store_true", help="Не запускать Chrome")
+    args = parser.parse_args()
+
+    expected = load_expected()
+    bench_parser(expected, args.rounds * 20)
+    if not args.no_browser:
+        bench_browser(expected, args.rounds)
@@ -0,0 +1,86 @@
+"""
+Проверка и замер HTTP-бэкенда на сохраненных страницах.
+Страницы из benchmarks/fixtures раздаются локальным сервером, результат
+разбора сравнивается с expected.json, затем страницы загружаются
+конкурентно для оценки пропускной способности.
+
+    python benchmarks/bench_http_backend.py --concurrency 32 --rounds 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_parser import okved_from_url  # noqa: E402
+from fixture_server import serve_directory  # noqa: E402
+from http_fetcher import HttpBackend, HttpFetcher  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def okved_of_path(path: str) -> str:
+    """ОКВЭД из пути страницы: /okved/07.10/2/ -> 07.10"""
+    return okved_from_url(path).split('/')[0]
+
+
+async def check(backend: HttpBackend, base_url: str, expected: dict) -> int:
+    failures = 0
+    sub_links = await backend.get_sub_okved_links(f'{base_url}/okved/07/')
+    expected_links = {f'{base_url}/okved/{okved_of_path(path)}/' for path in expected}
+    if sub_links != expected_links:
+        print(f"Ссылки на под-категории не совпали: {sorted(sub_links)}")
+        failures += 1
+    for path, cards in expected.items():
+        results = await backend.load_cards(f'{base_url}{path}', okved_of_path(path))
+        if results != cards:
+            print(f"Расхождение на странице {path}")
+            failures += 1
+    last_page = await backend.get_last_page(f'{base_url}/okved/07.10/')
+    if last_page != 3:
+        print(f"Неверная последняя страница: {last_page}")
+        failures += 1
+    return failures
+
+
+async def bench(concurrency: int, rounds: int):
+    with open(os.path.join(FIXTURES_DIR, 'expected.json'), encoding='utf-8') as f:
+        expected = json.load(f)
+
+    with serve_directory(FIXTURES_DIR) as base_url:
+        async with HttpFetcher(max_connections=concurrency) as fetcher:
+            backend = HttpBackend(fetcher)
+            failures = await check(backend, base_url, expected)
+            print("Результаты совпадают с expected.json" if not failures else f"Ошибок: {failures}")
+
+            urls = [(f'{base_url}{path}', okved_of_path(path)) for path in expected] * rounds
+            queue = asyncio.Queue()
+            for item in urls:
+                queue.put_nowait(item)
+            cards = 0
+
+            async def worker():
+                nonlocal cards
+                while not queue.empty():
+                    url, okved = queue.get_nowait()
+                    results = await backend.load_cards(url, okved)
+                    cards += len(results)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+
+    print(f"Страниц: {len(urls)}, конкурентных загрузок: {concurrency}")
+    print(f"{len(urls) / elapsed:.0f} страниц/с, {cards / elapsed:.0f} карточек/с")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+    sys.exit(1 if asyncio.run(bench(args.concurrency, args.rounds)) else 0)
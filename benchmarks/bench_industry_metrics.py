@@ -0,0 +1,85 @@
+"""
+Метрики по отраслям: прежний цикл analyze_outliers (фильтр всей таблицы
+и pd.concat на каждый ОКВЭД) против compute_industry_metrics (один groupby).
+Перед замером результаты сравниваются.
+
+    python benchmarks/bench_industry_metrics.py --rows 1000000 --groups 300
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from industry_metrics import compute_industry_metrics  # noqa: E402
+
+
+def make_frame(rows: int, groups: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'okved_1': np.char.zfill(rng.integers(0, groups, rows).astype(str), 2),
+        'revenue': rng.lognormal(21, 1, rows),
+        'growth_rate': rng.normal(10, 40, rows),
+    })
+
+
+def legacy_industry_metrics(df_cleaned: pd.DataFrame) -> pd.DataFrame:
+    """Цикл из analyze_outliers.py до перехода на compute_industry_metrics"""
+    okved_analysis = pd.DataFrame()
+    for okved in df_cleaned['okved_1'].unique():
+        okved_data = df_cleaned[df_cleaned['okved_1'] == okved]
+        analysis = {
+            'okved': okved,
+            'company_count': len(okved_data),
+            'avg_revenue': okved_data['revenue'].mean(),
+            'avg_growth': okved_data['growth_rate'].mean(),
+            'revenue_std': okved_data['revenue'].std(),
+            'growth_std': okved_data['growth_rate'].std(),
+            'revenue_cv': okved_data['revenue'].std() / okved_data['revenue'].mean() * 100,
+            'growth_cv': okved_data['growth_rate'].std() / okved_data['growth_rate'].mean() * 100,
+            'revenue_median': okved_data['revenue'].median(),
+            'growth_median': okved_data['growth_rate'].median(),
+            'revenue_q1': okved_data['revenue'].quantile(0.25),
+            'revenue_q3': okved_data['revenue'].quantile(0.75),
+            'growth_q1': okved_data['growth_rate'].quantile(0.25),
+            'growth_q3': okved_data['growth_rate'].quantile(0.75),
+            'revenue_iqr': okved_data['revenue'].quantile(0.75) - okved_data['revenue'].quantile(0.25),
+            'growth_iqr': okved_data['growth_rate'].quantile(0.75) - okved_data['growth_rate'].quantile(0.25),
+            'total_revenue': okved_data['revenue'].sum(),
+            'positive_growth_ratio': (okved_data['growth_rate'] > 0).mean() * 100,
+            'perspective_score': (
+                okved_data['growth_rate'].mean() * 0.4 +
+                (okved_data['revenue'].mean() / df_cleaned['revenue'].mean()) * 0.3 +
+                ((okved_data['growth_rate'] > 0).mean() * 100) * 0.3
+            )
+        }
+        okved_analysis = pd.concat([okved_analysis, pd.DataFrame([analysis])], ignore_index=True)
+    return okved_analysis.sort_values('perspective_score', ascending=False)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--groups", type=int, default=300)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.groups)
+    expected, legacy_time = timed(legacy_industry_metrics, df)
+    result, new_time = timed(compute_industry_metrics, df)
+
+    pd.testing.assert_frame_equal(
+        result.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False, rtol=1e-9
+    )
+    print(f"Строк: {args.rows}, ОКВЭД: {df['okved_1'].nunique()}, результаты совпадают")
+    print(f"цикл по ОКВЭД: {legacy_time:8.2f} с")
+    print(f"один groupby:  {new_time:8.2f} с ({legacy_time / new_time:.0f}x)")
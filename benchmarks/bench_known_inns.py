@@ -0,0 +1,86 @@
+"""
+Набор известных ИНН (known_inns.py): загрузка, память и проверка ИНН для
+массива int64 и фильтра Блума против множества строк, а также разбор
+листингов при повторном обходе, когда все ИНН уже в базе.
+
+    python benchmarks/bench_known_inns.py --rows 1000000 --site-rows 20000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_parser import parse_company_cards  # noqa: E402
+from database import Database  # noqa: E402
+from known_inns import load_known_inns  # noqa: E402
+from synthetic import listing_site, make_database  # noqa: E402
+from bench_http_backend import okved_of_path  # noqa: E402
+
+
+async def load(path: str, mode: str):
+    async with Database(path) as db:
+        start = time.perf_counter()
+        known = await load_known_inns(db, mode)
+        return known, time.perf_counter() - start
+
+
+async def load_set(path: str):
+    async with Database(path) as db:
+        start = time.perf_counter()
+        inns = {record.inn async for record in db.iter_companies(batch_size=100_000)}
+        seconds = time.perf_counter() - start
+        size = sys.getsizeof(inns) + sum(sys.getsizeof(inn) for inn in inns)
+        return inns, seconds, size
+
+
+def lookup_ns(known, probes) -> float:
+    start = time.perf_counter()
+    for inn in probes:
+        inn in known
+    return (time.perf_counter() - start) / len(probes) * 1e9
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--site-rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'companies.db')
+        make_database(path, args.rows, seed=0)
+        # Половина проб известна, половина нет
+        probes = [str(7700000000 + i * 2) for i in range(args.rows // 2, args.rows // 2 + 100_000)]
+
+        inns, set_time, set_size = asyncio.run(load_set(path))
+        print(f"Строк: {args.rows}")
+        print(f"set строк: загрузка {set_time:5.2f} с, {set_size / 2**20:7.1f} МБ, "
+              f"проверка {lookup_ns(inns, probes):5.0f} нс")
+        del inns
+        for mode in ('exact', 'bloom'):
+            known, seconds = asyncio.run(load(path, mode))
+            print(f"{mode:<11}: загрузка {seconds:5.2f} с, {known.nbytes / 2**20:7.1f} МБ, "
+                  f"проверка {lookup_ns(known, probes):5.0f} нс")
+            known.close()
+
+        # Листинги с теми же компаниями, что в базе (тот же seed)
+        known, _ = asyncio.run(load(path, 'exact'))
+        # Срабатывания фильтра Блума проверяются по базе одним запросом на страницу
+        bloom, _ = asyncio.run(load(path, 'bloom'))
+        root = os.path.join(tmp, 'site')
+        expected = listing_site(root, args.site_rows, seed=0)
+        pages = []
+        for page_path in expected:
+            with open(os.path.join(root, page_path.strip('/'), 'index.html'), encoding='utf-8') as f:
+                pages.append((page_path, f.read()))
+        for label, container in (('без набора', None), ('с набором', known), ('с bloom', bloom)):
+            start = time.perf_counter()
+            results = [parse_company_cards(html, okved_of_path(page_path), container) for page_path, html in pages]
+            seconds = time.perf_counter() - start
+            seen = sum(result == 'seen' for page in results for result in page)
+            print(f"Разбор {len(pages)} страниц {label}: {seconds:5.2f} с, пропущено {seen} карточек")
+        bloom.close()
@@ -0,0 +1,49 @@
+"""
+Очистка от выбросов: прежний groupby.apply(remove_outliers) со
+stats.zscore на каждый ОКВЭД против маски outlier_mask (groupby.transform).
+Перед замером сравнивается набор оставшихся строк; для mad и iqr печатается
+только время.
+
+    python benchmarks/bench_outlier_filters.py --rows 1000000 --groups 300
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+from scipy import stats
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_industry_metrics import make_frame, timed  # noqa: E402
+from outlier_filters import FILTERS, outlier_mask  # noqa: E402
+
+
+def remove_outliers(group):
+    """Прежняя очистка из analyze_outliers.py"""
+    z_scores = stats.zscore(group[['revenue', 'growth_rate']], nan_policy='omit')
+    return group[(abs(z_scores) < 3).all(axis=1)]
+
+
+def legacy_clean(df):
+    return df.groupby('okved_1', group_keys=False)[list(df.columns)].apply(remove_outliers).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--groups", type=int, default=300)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.groups)
+    df['row'] = np.arange(len(df))
+    expected, legacy_time = timed(legacy_clean, df)
+    mask, zscore_time = timed(outlier_mask, df)
+
+    assert np.array_equal(np.sort(expected['row'].to_numpy()), np.flatnonzero(mask))
+    print(f"Строк: {args.rows}, ОКВЭД: {df['okved_1'].nunique()}, осталось {int(mask.sum())}, результаты совпадают")
+    print(f"groupby.apply + stats.zscore: {legacy_time:6.2f} с")
+    print(f"outlier_mask zscore:          {zscore_time:6.2f} с ({legacy_time / zscore_time:.0f}x)")
+    for method in sorted(set(FILTERS) - {'zscore'}):
+        mask, seconds = timed(outlier_mask, df, method)
+        print(f"{'outlier_mask ' + method + ':':29s} {seconds:6.2f} с, осталось {int(mask.sum())}")
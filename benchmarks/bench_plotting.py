@@ -0,0 +1,83 @@
+"""
+График industry_distribution.png: прежний sns.boxplot по всем строкам
+против plot_distributions по статистикам frame_box_stats. Отдельно
+замеряется холодный старт - импорт модулей, нужных analyze_outliers.py
+до и после переноса matplotlib/seaborn/scipy в ленивые импорты.
+
+    python benchmarks/bench_plotting.py --rows 1000000 --groups 80
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_industry_metrics import make_frame, timed  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEGACY_IMPORTS = 'import pandas, numpy, sqlite3, matplotlib.pyplot, seaborn, scipy.stats'
+CURRENT_IMPORTS = ('import incremental_metrics, industry_metrics, outlier_filters, plotting, '
+                   'report_writer, snapshot, streaming_metrics')
+
+
+def import_time(statement: str, runs: int = 5) -> float:
+    """Медиана времени запуска интерпретатора с импортом statement"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], cwd=ROOT, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def legacy_plot(df, path: str):
+    """Прежний код analyze_outliers.py"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(15, 10))
+    plt.subplot(2, 1, 1)
+    sns.boxplot(data=df, x='okved_1', y='revenue')
+    plt.title('Распределение выручки по отраслям')
+    plt.xticks(rotation=45)
+    plt.subplot(2, 1, 2)
+    sns.boxplot(data=df, x='okved_1', y='growth_rate')
+    plt.title('Распределение темпов роста по отраслям')
+    plt.ylim(-100, 300)
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close('all')
+
+
+def box_plot(df, path: str):
+    from plotting import frame_box_stats, plot_distributions
+    plot_distributions(frame_box_stats(df, 'revenue'), frame_box_stats(df, 'growth_rate'), path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--groups", type=int, default=80)
+    args = parser.parse_args()
+
+    legacy_start = import_time(LEGACY_IMPORTS)
+    current_start = import_time(CURRENT_IMPORTS)
+
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    import matplotlib.pyplot  # noqa: E402,F401  импорт не входит в замер рисования
+    import seaborn  # noqa: E402,F401
+
+    df = make_frame(args.rows, args.groups)
+    with tempfile.TemporaryDirectory() as tmp:
+        _, legacy_time = timed(legacy_plot, df, os.path.join(tmp, 'legacy.png'))
+        _, box_time = timed(box_plot, df, os.path.join(tmp, 'box.png'))
+
+    print(f"Холодный старт (импорты): прежний {legacy_start:5.2f} с, сейчас {current_start:5.2f} с")
+    print(f"Строк: {args.rows}, ОКВЭД: {df['okved_1'].nunique()}")
+    print(f"sns.boxplot по строкам:      {legacy_time:6.2f} с")
+    print(f"bxp по статистикам ящиков:   {box_time:6.2f} с ({legacy_time / box_time:.0f}x)")
@@ -0,0 +1,107 @@
+"""
+Отчет industry_analysis_cleaned.xlsx: прежний вариант (nlargest по маске
+на каждый ОКВЭД и pd.ExcelWriter по умолчанию) против report_writer
+(top_by_group и xlsxwriter constant_memory), а также выгрузки CSV/Parquet.
+Каждый режим запускается в отдельном процессе; прирост памяти - пик RSS
+во время записи (VmHWM, сброшенный после построения данных) минус RSS до нее.
+
+    python benchmarks/bench_report_writer.py --rows 1000000 --groups 300
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_industry_metrics import make_frame  # noqa: E402
+from industry_metrics import compute_industry_metrics  # noqa: E402
+from report_writer import TOP_COLUMNS, top_by_group, write_report  # noqa: E402
+
+MODES = ['legacy', 'xlsx', 'csv', 'parquet']
+
+
+def make_companies(rows: int, groups: int) -> pd.DataFrame:
+    df = make_frame(rows, groups)
+    df['inn'] = (10 ** 9 + df.index).astype(str)
+    df['name'] = 'ООО Компания ' + df['inn']
+    df['okved'] = df['okved_1'] + '.10.1'
+    return df
+
+
+def legacy_report(path: str, metrics: pd.DataFrame, df: pd.DataFrame):
+    """Прежний код analyze_outliers.py"""
+    top_tables = {
+        okved: df[df['okved_1'] == okved].nlargest(10, 'revenue')[TOP_COLUMNS]
+        for okved in sorted(df['okved_1'].unique())
+    }
+    with pd.ExcelWriter(f'{path}.xlsx') as writer:
+        metrics.to_excel(writer, sheet_name='General_Analysis', index=False)
+        for okved, top in top_tables.items():
+            top.to_excel(writer, sheet_name=f'Top10_{okved}', index=False)
+
+
+def status_mb(field: str) -> float:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1]) / 1024
+    raise KeyError(field)
+
+
+def reset_peak():
+    """Сбрасывает VmHWM до текущего RSS (Linux)"""
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+
+def child(args):
+    df = make_companies(args.rows, args.groups)
+    metrics = compute_industry_metrics(df)
+    path = os.path.join(args.out, args.mode)
+    baseline = status_mb('VmRSS')
+    reset_peak()
+    start = time.perf_counter()
+    if args.mode == 'legacy':
+        legacy_report(path, metrics, df)
+    else:
+        write_report(metrics, top_by_group(df), path, [args.mode])
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'seconds': elapsed, 'extra_mb': max(status_mb('VmHWM') - baseline, 0.0)}))
+
+
+def spawn(mode: str, args, out: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, '--child', mode, '--out', out,
+         '--rows', str(args.rows), '--groups', str(args.groups)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--groups", type=int, default=300)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    parser.add_argument("--child", dest='mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        child(args)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {mode: spawn(mode, args, tmp) for mode in MODES}
+        legacy = pd.read_excel(os.path.join(tmp, 'legacy.xlsx'), sheet_name=None)
+        new = pd.read_excel(os.path.join(tmp, 'xlsx.xlsx'), sheet_name=None)
+        assert list(legacy) == list(new) and all(legacy[name].equals(new[name]) for name in legacy)
+
+    print(f"Строк: {args.rows}, ОКВЭД: {args.groups}, листы Excel совпадают")
+    for mode, result in results.items():
+        print(f"{mode:8s}: {result['seconds']:6.2f} с, прирост памяти {result['extra_mb']:6.0f} МБ")
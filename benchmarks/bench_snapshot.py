@@ -0,0 +1,82 @@
+"""
+Время загрузки данных для analyze_outliers.py: read_sql_query всей выборки
+из SQLite против чтения Parquet-снимка (только колонки для метрик).
+
+    python benchmarks/bench_snapshot.py --rows 1000000 --groups 80
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+from industry_metrics import COMPANIES_QUERY  # noqa: E402
+from snapshot import load_analysis_frame, write_snapshot  # noqa: E402
+
+
+def make_database(path: str, rows: int, groups: int, seed: int = 0, batch: int = 200_000):
+    """База последней схемы (со сводкой и индексами) с синтетическими компаниями"""
+    async def create():
+        async with Database(path) as db:
+            await db.create_table()
+    asyncio.run(create())
+
+    rng = np.random.default_rng(seed)
+    cnx = sqlite3.connect(path)
+    for start in range(0, rows, batch):
+        size = min(batch, rows - start)
+        okved_1 = rng.integers(1, groups + 1, size)
+        revenue = rng.lognormal(21, 1, size)
+        growth = rng.normal(10, 40, size)
+        cnx.executemany(
+            'INSERT INTO companies (inn, name, okved, okved_1, okved_2, okved_3, revenue, growth_rate, owner) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            ((str(10 ** 9 + start + i), f'ООО Компания {start + i}', f'{o:02d}.10.1', f'{o:02d}', '10', '1',
+              float(r), float(g), 'Иванов Иван Иванович') for i, (o, r, g) in enumerate(zip(okved_1, revenue, growth)))
+        )
+        cnx.commit()
+    cnx.close()
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def load_sqlite(db_path: str) -> pd.DataFrame:
+    cnx = sqlite3.connect(db_path)
+    try:
+        return pd.read_sql_query(COMPANIES_QUERY, cnx)
+    finally:
+        cnx.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--groups", type=int, default=80)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'companies.db')
+        snapshot_path = os.path.join(tmp, 'companies_snapshot')
+        make_database(db_path, args.rows, args.groups)
+        _, export_time = timed(write_snapshot, db_path, snapshot_path)
+
+        from_sqlite, sqlite_time = timed(load_sqlite, db_path)
+        (from_snapshot, source), snapshot_time = timed(load_analysis_frame, db_path, snapshot_path)
+
+    assert source == 'snapshot' and len(from_snapshot) == len(from_sqlite)
+    print(f"Строк: {args.rows}, в выборке: {len(from_sqlite)}")
+    print(f"экспорт снимка:      {export_time:6.2f} с")
+    print(f"SQLite (все колонки): {sqlite_time:6.2f} с")
+    print(f"снимок (4 колонки):  {snapshot_time:6.2f} с ({sqlite_time / snapshot_time:.0f}x)")
@@ -0,0 +1,128 @@
+"""
+Метрики по отраслям на синтетической таблице companies: загрузка всей
+таблицы (read_sql_query + compute_industry_metrics) против потокового
+режима. Каждый режим запускается в отдельном процессе, чтобы честно
+измерить пиковую память; для потокового режима печатается и наибольшая
+относительная ошибка квантилей.
+
+    python benchmarks/bench_streaming_metrics.py --rows 2000000 --groups 80
+"""
+import argparse
+import json
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from industry_metrics import COMPANIES_QUERY  # noqa: E402
+from streaming_metrics import metrics_from_state, stream_industry_state  # noqa: E402
+
+
+def make_database(path: str, rows: int, groups: int, seed: int = 0, batch: int = 200_000):
+    rng = np.random.default_rng(seed)
+    cnx = sqlite3.connect(path)
+    cnx.execute('''
+        CREATE TABLE companies (
+            id INTEGER PRIMARY KEY, name TEXT, okved TEXT, okved_1 TEXT, okved_2 TEXT, okved_3 TEXT,
+            inn TEXT UNIQUE, revenue REAL, growth_rate REAL, owner TEXT
+        )
+    ''')
+    for start in range(0, rows, batch):
+        size = min(batch, rows - start)
+        okved_1 = rng.integers(1, groups + 1, size)
+        revenue = rng.lognormal(21, 1, size)
+        growth = rng.normal(10, 40, size)
+        cnx.executemany(
+            'INSERT INTO companies (name, okved, okved_1, okved_2, okved_3, inn, revenue, growth_rate, owner) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            ((f'ООО {start + i}', f'{o:02d}.10', f'{o:02d}', '10', '', str(10 ** 9 + start + i),
+              float(r), float(g), '') for i, (o, r, g) in enumerate(zip(okved_1, revenue, growth)))
+        )
+    cnx.commit()
+    cnx.close()
+
+
+def run_full(db_path: str):
+    import pandas as pd
+    from scipy import stats
+    from industry_metrics import compute_industry_metrics
+
+    cnx = sqlite3.connect(db_path)
+    df = pd.read_sql_query(COMPANIES_QUERY, cnx)
+    cnx.close()
+
+    def remove_outliers(group):
+        z_scores = stats.zscore(group[['revenue', 'growth_rate']], nan_policy='omit')
+        return group[(abs(z_scores) < 3).all(axis=1)]
+
+    cleaned = df.groupby('okved_1', group_keys=False)[df.columns].apply(remove_outliers)
+    return compute_industry_metrics(cleaned)
+
+
+def run_streaming(db_path: str, chunk_size: int, workers: int):
+    states, _ = stream_industry_state(db_path, chunk_size=chunk_size, workers=workers)
+    return metrics_from_state(states)
+
+
+def child(args):
+    start = time.perf_counter()
+    if args.mode == 'full':
+        metrics = run_full(args.db)
+    else:
+        metrics = run_streaming(args.db, args.chunk_size, args.workers)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    if args.workers > 1:
+        peak += resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(json.dumps({'seconds': elapsed, 'peak_mb': peak,
+                      'metrics': metrics.set_index('okved').to_dict(orient='index')}))
+
+
+def spawn(mode: str, args) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, '--child', mode, '--db', args.db,
+         '--chunk-size', str(args.chunk_size), '--workers', str(args.workers)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--groups", type=int, default=80)
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--db", help="Готовая база (по умолчанию создается синтетическая)")
+    parser.add_argument("--child", dest='mode', choices=['full', 'streaming'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        child(args)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.db is None:
+            args.db = os.path.join(tmp, 'companies.db')
+            make_database(args.db, args.rows, args.groups)
+        full = spawn('full', args)
+        streaming = spawn('streaming', args)
+
+    worst = {}
+    for okved, expected in full['metrics'].items():
+        for column, value in expected.items():
+            if column.endswith(('median', 'q1', 'q3', 'iqr')) and value:
+                error = abs(streaming['metrics'][okved][column] - value) / abs(value)
+                worst[column] = max(worst.get(column, 0.0), error)
+    print(f"Строк: {args.rows}, ОКВЭД: {len(full['metrics'])}, порция: {args.chunk_size}")
+    print(f"вся таблица: {full['seconds']:7.2f} с, пик памяти {full['peak_mb']:7.0f} МБ")
+    print(f"потоково:    {streaming['seconds']:7.2f} с, пик памяти {streaming['peak_mb']:7.0f} МБ")
+    print("наибольшая относительная ошибка квантилей: " +
+          ", ".join(f"{column} {error:.2%}" for column, error in sorted(worst.items())))
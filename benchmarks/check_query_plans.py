@@ -0,0 +1,86 @@
+"""
+Проверка планов частых запросов к companies: каждый должен искать по
+индексу (SEARCH ... USING INDEX) или читать только индекс (COVERING INDEX),
+а не сканировать таблицу целиком. Без --db создается база последней схемы
+с синтетическими данными.
+
+    python benchmarks/check_query_plans.py
+    python benchmarks/check_query_plans.py --db companies.db
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Company, Database  # noqa: E402
+from industry_metrics import COMPANIES_WHERE  # noqa: E402
+
+# Полная выборка analyze_outliers.py (COMPANIES_QUERY) намеренно читает таблицу
+# целиком: она оставляет почти все строки
+HOT_QUERIES = {
+    'get_processed_okveds': '''
+        SELECT DISTINCT okved_1, okved_2 FROM companies
+        WHERE okved_1 IS NOT NULL AND okved_2 IS NOT NULL
+    ''',
+    'отрасли для --incremental': f"SELECT * FROM companies WHERE {COMPANIES_WHERE} AND okved_1 IN (?, ?)",
+    'компании под-ОКВЭД': "SELECT * FROM companies WHERE okved_1 = ? AND okved_2 = ?",
+    'компании полного ОКВЭД': "SELECT * FROM companies WHERE okved = ?",
+    'крупные компании': "SELECT * FROM companies WHERE revenue >= ? ORDER BY revenue DESC",
+    'поиск по ИНН': "SELECT * FROM companies WHERE inn = ?",
+}
+
+
+def query_plan(cnx: sqlite3.Connection, query: str) -> list:
+    params = [None] * query.count('?')
+    return [row[3] for row in cnx.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+def uses_index(plan: list) -> bool:
+    """Ни одного полного сканирования companies без индекса"""
+    return not any(step.startswith('SCAN companies') and 'INDEX' not in step for step in plan)
+
+
+async def make_database(path: str, rows: int = 20_000):
+    async with Database(path) as db:
+        await db.create_table()
+        await db.save_companies([Company(
+            name=f"ООО {i}", okved=f"{i % 90:02d}.{i % 7 + 10}.{i % 3}",
+            okved_1=f"{i % 90:02d}", okved_2=f"{i % 7 + 10}", okved_3=f"{i % 3}",
+            inn=str(7700000000 + i), revenue=5e8 + i * 1e5,
+            growth_rate=None if i % 11 == 0 else float(i % 50 - 10), owner=""
+        ) for i in range(rows)])
+        async with db.connection() as conn:
+            await conn.execute('ANALYZE')
+            await conn.commit()
+
+
+def check(path: str) -> int:
+    cnx = sqlite3.connect(path)
+    failures = 0
+    try:
+        print(f"Версия схемы: {cnx.execute('PRAGMA user_version').fetchone()[0]}")
+        for name, query in HOT_QUERIES.items():
+            plan = query_plan(cnx, query)
+            ok = uses_index(plan)
+            failures += not ok
+            print(f"{'OK ' if ok else 'ПОЛНЫЙ СКАН'} {name}: {'; '.join(plan)}")
+    finally:
+        cnx.close()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Проверить существующую базу")
+    args = parser.parse_args()
+
+    if args.db:
+        sys.exit(1 if check(args.db) else 0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'companies.db')
+        asyncio.run(make_database(path))
+        sys.exit(1 if check(path) else 0)
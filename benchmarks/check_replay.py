@@ -0,0 +1,89 @@
+"""
+Проверка pars3.py --replay на компании, которая есть в листингах двух
+под-ОКВЭД: при любом числе процессов и при повторных запусках ОКВЭД
+компании один и тот же (с первой по порядку обхода страницы), а в режиме
+refresh у уже сохраненной компании обновляется выручка, но не ОКВЭД.
+Страница первого ОКВЭД намеренно тяжелее, чтобы ее разбор заканчивался позже.
+
+    python benchmarks/check_replay.py
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Company, Database  # noqa: E402
+from listing_pages import CardSpec, render_listing_page  # noqa: E402
+from page_cache import PageCache  # noqa: E402
+
+SHARED_INN = '7799999999'
+FIRST_OKVED = '07.10'
+SECOND_OKVED = '07.20'
+BASE_URL = 'http://fixture'
+
+
+def card(inn: str, revenue: float) -> CardSpec:
+    return CardSpec(name=f'ООО Компания {inn}', inn=inn, owner='Иванов И.И.', revenue=revenue, growth_rate=5.0)
+
+
+def fill_cache(root: str, filler: int):
+    cache = PageCache(root, ttl=None, max_bytes=None)
+    shared = card(SHARED_INN, 2e9)
+    first = [shared] + [card(str(7700000000 + i), 1e9) for i in range(filler)]
+    cache.put(f'{BASE_URL}/okved/{FIRST_OKVED}/', render_listing_page(FIRST_OKVED, first, 1, 1))
+    cache.put(f'{BASE_URL}/okved/{SECOND_OKVED}/', render_listing_page(SECOND_OKVED, [shared], 1, 1))
+    cache.close()
+
+
+async def save_crawled():
+    """Компания, сохраненная обходом под первым ОКВЭД со старой выручкой"""
+    async with Database() as db:
+        await db.create_table()
+        await db.save_companies([Company(
+            name=f'ООО Компания {SHARED_INN}', okved=FIRST_OKVED, okved_1='07', okved_2='10', okved_3='',
+            inn=SHARED_INN, revenue=1e9, growth_rate=5.0, owner='Иванов И.И.'
+        )])
+
+
+def shared_row():
+    with sqlite3.connect('companies.db') as cnx:
+        return cnx.execute('SELECT okved, revenue FROM companies WHERE inn = ?', (SHARED_INN,)).fetchone()
+
+
+def reset_database():
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(f'companies.db{suffix}'):
+            os.remove(f'companies.db{suffix}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filler", type=int, default=2000, help="Карточек на странице первого ОКВЭД")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        import pars3  # noqa: E402 - создает logs/ в текущем каталоге
+
+        fill_cache('cache', args.filler)
+        failures = 0
+        for processes in (1, 2, 4):
+            for run in range(args.runs):
+                reset_database()
+                asyncio.run(pars3.replay('cache', processes=processes))
+                fresh = shared_row()
+                reset_database()
+                asyncio.run(save_crawled())
+                asyncio.run(pars3.replay('cache', processes=processes))
+                refreshed = shared_row()
+                ok = fresh == (FIRST_OKVED, 2e9) and refreshed == (FIRST_OKVED, 2e9)
+                failures += not ok
+                print(f"процессов {processes}, запуск {run + 1}: новая база {fresh}, "
+                      f"после обхода {refreshed} - {'OK' if ok else 'ОШИБКА'}")
+        os.chdir('/')
+    sys.exit(1 if failures else 0)
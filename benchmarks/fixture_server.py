@@ -0,0 +1,28 @@
+"""Локальный HTTP-сервер для сохраненных страниц (keep-alive, отдельный поток)"""
+import functools
+import threading
+from contextlib import contextmanager
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_directory(root: str, port: int = 0) -> Iterator[str]:
+    """Раздает каталог root и возвращает базовый адрес вида http://127.0.0.1:<port>"""
+    handler = functools.partial(_QuietHandler, directory=root)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
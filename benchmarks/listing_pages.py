@@ -0,0 +1,175 @@
+"""
+HTML-страницы листингов ОКВЭД в разметке companies.rbc.ru.
+Используются для сохраненных фикстур и синтетических бенчмарков:
+карточки устроены так, что селекторы pars3.extract_company_data
+и card_parser находят в них те же поля, что и на сайте.
+"""
+import json
+import os
+import sys
+from dataclasses import asdict, dataclass
+from html import escape
+from typing import Dict, List, Optional, Union
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_parser import ACTIVE_STATUS, MAX_REVENUE, MIN_REVENUE, split_okved  # noqa: E402
+
+
+@dataclass
+class CardSpec:
+    name: str
+    inn: str
+    owner: str
+    revenue: float
+    growth_rate: Union[float, str]  # '-' - прирост не указан
+    status: str = ACTIVE_STATUS
+
+
+def format_revenue(revenue: float) -> str:
+    return f"{int(revenue):,}".replace(',', ' ') + ' ₽'
+
+
+def format_growth(growth_rate: Union[float, str]) -> str:
+    if growth_rate == '-':
+        return '-%'
+    return f"{growth_rate:.1f}".replace('.', ',') + '%'
+
+
+def render_card(card: CardSpec) -> str:
+    # Позиции дочерних элементов важны: имя - p:nth-child(5),
+    # руководитель - p:nth-child(7), ИНН - div:nth-child(10) > p:nth-child(1)
+    return f'''<div class="company-card">
+  <a class="company-card__link" href="/id/{card.inn}/">{escape(card.name)}</a>
+  <span class="company-card__status">{escape(card.status)}</span>
+  <p class="company-card__info-item">Юридическое лицо</p>
+  <p class="company-card__info-item">Дата регистрации: 01.01.2010</p>
+  <p class="company-card__title">{escape(card.name)}</p>
+  <p class="company-card__info-item">Адрес: г. Москва</p>
+  <p class="company-card__info-item">Руководитель: {escape(card.owner)}</p>
+  <div class="company-card__block"><div class="company-card__finance">Выручка: {format_revenue(card.revenue)}</div></div>
+  <div class="company-card__block"><div class="company-card__finance">Темп прироста: {format_growth(card.growth_rate)}</div></div>
+  <div class="company-card__requisites"><p>ИНН: {card.inn}</p><p>ОГРН: 1{card.inn}</p></div>
+</div>'''
+
+
+def render_listing_page(okved: str, cards: List[CardSpec], page: int, last_page: int) -> str:
+    pagination = ''.join(
+        f'<li class="pagination__item"><a href="/okved/{okved}/{number}/">{number}</a></li>'
+        for number in range(max(1, page - 2), min(last_page, page + 2) + 1)
+    )
+    if last_page > page + 2:
+        pagination += (
+            '<li class="pagination__item">...</li>'
+            f'<li class="pagination__item"><a href="/okved/{okved}/{last_page}/">{last_page}</a></li>'
+        )
+    return f'''<!DOCTYPE html>
+<html lang="ru">
+<head><meta charset="utf-8"><title>ОКВЭД {okved} - страница {page}</title></head>
+<body>
+<div class="base-layout">
+<main>
+<div class="base-layout__grid">
+<div class="base-layout__content">
+<div>
+{"".join(render_card(card) for card in cards)}
+</div>
+<ul class="pagination">{pagination}</ul>
+</div>
+</div>
+</main>
+</div>
+</body>
+</html>
+'''
+
+
+def render_okved_index(okved: str, sub_okveds: List[str]) -> str:
+    links = ''.join(f'<li><a href="/okved/{code}/">ОКВЭД {code}</a></li>' for code in sub_okveds)
+    return f'''<!DOCTYPE html>
+<html lang="ru">
+<head><meta charset="utf-8"><title>ОКВЭД {okved}</title></head>
+<body>
+<a href="/okved/">Все ОКВЭД</a>
+<a href="/okved/{okved}/">ОКВЭД {okved}</a>
+<ul>{links}</ul>
+</body>
+</html>
+'''
+
+
+def expected_result(card: CardSpec, okved: str) -> Optional[Union[dict, str]]:
+    """Что должен вернуть разбор карточки"""
+    if card.status != ACTIVE_STATUS:
+        return None
+    if card.revenue < MIN_REVENUE:
+        return 'small'
+    if card.revenue > MAX_REVENUE:
+        return None
+    okved_1, okved_2, okved_3 = split_okved(okved)
+    return {
+        'name': card.name,
+        'okved': okved,
+        'okved_1': okved_1,
+        'okved_2': okved_2,
+        'okved_3': okved_3,
+        'inn': card.inn,
+        'owner': card.owner,
+        'revenue': float(int(card.revenue)),
+        'growth_rate': None if card.growth_rate == '-' else round(card.growth_rate, 1),
+    }
+
+
+def write_site(root: str, section: str, listings: Dict[str, List[List[CardSpec]]]) -> dict:
+    """
+    Записывает страницы в структуре URL сайта (/okved/<код>/<страница>/index.html)
+    и возвращает ожидаемые результаты разбора по URL-пути.
+    """
+    def write(path: str, html: str):
+        os.makedirs(os.path.join(root, path), exist_ok=True)
+        with open(os.path.join(root, path, 'index.html'), 'w', encoding='utf-8') as f:
+            f.write(html)
+
+    write(f'okved/{section}', render_okved_index(section, sorted(listings)))
+    expected = {}
+    for okved, pages in listings.items():
+        for page, cards in enumerate(pages, 1):
+            path = f'okved/{okved}' if page == 1 else f'okved/{okved}/{page}'
+            write(path, render_listing_page(okved, cards, page, len(pages)))
+            expected[f'/{path}/'] = [expected_result(card, okved) for card in cards]
+    return expected
+
+
+def fixture_listings() -> Dict[str, List[List[CardSpec]]]:
+    """Небольшой детерминированный набор: выручка убывает от страницы к странице"""
+    listings = {}
+    for okved, pages, start_revenue in (('07.10', 3, 20e9), ('07.29.4', 1, 2e9)):
+        revenue = start_revenue
+        okved_pages = []
+        for page in range(pages):
+            cards = []
+            for i in range(20):
+                number = len(listings) * 1000 + page * 20 + i
+                status = 'ЛИКВИДИРОВАНО' if number % 17 == 5 else ACTIVE_STATUS
+                growth = '-' if number % 7 == 3 else round((number * 37 % 400) / 3 - 40, 1)
+                cards.append(CardSpec(
+                    name=f'ООО "Рудник {okved}-{number}"',
+                    inn=f'{7700000000 + number}',
+                    owner=f'Петров П.{number % 10}.',
+                    revenue=int(revenue),
+                    growth_rate=growth,
+                    status=status,
+                ))
+                revenue *= 0.9
+            okved_pages.append(cards)
+        listings[okved] = okved_pages
+    return listings
+
+
+if __name__ == '__main__':
+    # Пересоздание сохраненных фикстур: python benchmarks/listing_pages.py
+    fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+    expected = write_site(fixtures_dir, '07', fixture_listings())
+    with open(os.path.join(fixtures_dir, 'expected.json'), 'w', encoding='utf-8') as f:
+        json.dump(expected, f, ensure_ascii=False, indent=1)
+    print(f"Записано {len(expected)} страниц в {fixtures_dir}")
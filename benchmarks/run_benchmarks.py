@@ -0,0 +1,258 @@
+"""
+Сквозной замер конвейера на синтетических данных (benchmarks/synthetic.py):
+
+- extraction: разбор карточек .company-card (card_parser) и загрузка
+  листингов HTTP-бэкендом с локального сервера, карточек/с;
+- save: Database.save_companies, строк/с (вставка и повторное сохранение
+  с on_conflict='update');
+- analysis: load -> clean -> analyze -> report (analysis.py) и потоковый
+  режим на базах разного размера - время и пиковая память процесса, а также
+  пересчет оценки с другими весами по запомненным данным.
+
+Результаты пишутся в JSON (--output) списком записей suite/metric/size/value/unit
+вместе с коммитом и параметрами машины; --compare печатает изменения
+относительно прошлого файла.
+
+    python benchmarks/run_benchmarks.py --sizes 10000,1000000,10000000 --output bench.json
+    python benchmarks/run_benchmarks.py --suites analysis --sizes 10000 --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import company_batches, listing_site, make_database  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUITES = ['extraction', 'save', 'analysis']
+ANALYSIS_MODES = ['full', 'streaming']
+DEFAULT_SIZES = '10000,1000000,10000000'
+
+
+def record(suite: str, metric: str, value: Optional[float], unit: str, size: Optional[int] = None, **extra) -> dict:
+    return {'suite': suite, 'metric': metric, 'size': size, 'value': value, 'unit': unit, **extra}
+
+
+def bench_extraction(rows: int, concurrency: int, seed: int) -> List[dict]:
+    from bench_http_backend import okved_of_path
+    from card_parser import parse_company_cards
+    from fixture_server import serve_directory
+    from http_fetcher import HttpBackend, HttpFetcher
+
+    with tempfile.TemporaryDirectory() as root:
+        expected = listing_site(root, rows, seed)
+        pages = []
+        for path in expected:
+            with open(os.path.join(root, path.strip('/'), 'index.html'), encoding='utf-8') as f:
+                pages.append((path, f.read()))
+        cards = sum(len(results) for results in expected.values())
+
+        start = time.perf_counter()
+        mismatches = sum(parse_company_cards(html, okved_of_path(path)) != expected[path] for path, html in pages)
+        parse_time = time.perf_counter() - start
+
+        async def fetch_all(base_url: str) -> float:
+            queue = asyncio.Queue()
+            for path in expected:
+                queue.put_nowait(path)
+
+            async def worker(backend):
+                while not queue.empty():
+                    path = queue.get_nowait()
+                    await backend.load_cards(f'{base_url}{path}', okved_of_path(path))
+
+            async with HttpFetcher(max_connections=concurrency) as fetcher:
+                backend = HttpBackend(fetcher)
+                started = time.perf_counter()
+                await asyncio.gather(*(worker(backend) for _ in range(concurrency)))
+                return time.perf_counter() - started
+
+        with serve_directory(root) as base_url:
+            http_time = asyncio.run(fetch_all(base_url))
+
+    if mismatches:
+        print(f"extraction: {mismatches} страниц разобраны не так, как ожидалось")
+    return [
+        record('extraction', 'parse_cards_per_second', cards / parse_time, 'cards/s', cards, mismatches=mismatches),
+        record('extraction', 'http_cards_per_second', cards / http_time, 'cards/s', cards, concurrency=concurrency),
+        record('extraction', 'http_pages_per_second', len(pages) / http_time, 'pages/s', cards, concurrency=concurrency),
+    ]
+
+
+def bench_save(rows: int, batch_size: int, seed: int) -> List[dict]:
+    from database import Database
+
+    async def run(path: str):
+        results = []
+        async with Database(path) as db:
+            await db.create_table()
+            for metric, on_conflict in (('insert_rows_per_second', 'ignore'), ('update_rows_per_second', 'update')):
+                elapsed = 0.0
+                for batch in company_batches(rows, seed, batch_size):
+                    start = time.perf_counter()
+                    await db.save_companies(batch, on_conflict=on_conflict)
+                    elapsed += time.perf_counter() - start
+                results.append(record('save', metric, rows / elapsed, 'rows/s', rows, batch_size=batch_size))
+        return results
+
+    with tempfile.TemporaryDirectory() as tmp:
+        return asyncio.run(run(os.path.join(tmp, 'companies.db')))
+
+
+def analysis_child(db_path: str, mode: str):
+    """Один прогон анализа в отдельном процессе: печатает JSON с временем и пиком памяти"""
+    import analysis
+    from industry_metrics import ScoreWeights
+
+    with tempfile.TemporaryDirectory() as out:
+        report_name = os.path.join(out, 'industry_analysis_cleaned')
+        plot_path = os.path.join(out, 'industry_distribution.png')
+        start = time.perf_counter()
+        if mode == 'full':
+            # Снимка нет: данные читаются из SQLite
+            data = analysis.load(db_path, os.path.join(out, 'no_snapshot'))
+            result = analysis.analyze(analysis.clean(data))
+        else:
+            result, _ = analysis.analyze_streaming(db_path)
+        analysis.report(result, report_name, ['xlsx'], plot_path)
+        seconds = time.perf_counter() - start
+
+        rescore = None
+        if mode == 'full':
+            start = time.perf_counter()
+            data = analysis.load(db_path, os.path.join(out, 'no_snapshot'))
+            analysis.analyze(analysis.clean(data), ScoreWeights(0.5, 0.2, 0.3))
+            rescore = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({'seconds': seconds, 'peak_mb': peak, 'rescore_seconds': rescore}))
+
+
+def bench_analysis(sizes: List[int], modes: List[str], data_dir: str, seed: int) -> List[dict]:
+    results = []
+    for size in sizes:
+        db_path = os.path.join(data_dir, f'synthetic-{size}-{seed}.db')
+        if not os.path.exists(db_path):
+            print(f"analysis: создается база на {size} строк")
+            tmp_path = f'{db_path}.tmp'
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(tmp_path + suffix):
+                    os.remove(tmp_path + suffix)
+            make_database(tmp_path, size, seed)
+            os.replace(tmp_path, db_path)
+        for mode in modes:
+            completed = subprocess.run(
+                [sys.executable, __file__, '--child-analysis', mode, '--db', db_path],
+                capture_output=True, text=True, cwd=ROOT,
+            )
+            if completed.returncode:
+                # Например, полный режим не поместился в память
+                error = (completed.stderr.strip().splitlines() or [f'код возврата {completed.returncode}'])[-1]
+                print(f"analysis {mode} {size}: ошибка - {error}")
+                results.append(record('analysis', f'{mode}_seconds', None, 's', size, error=error))
+                continue
+            child = json.loads(completed.stdout.splitlines()[-1])
+            results.append(record('analysis', f'{mode}_seconds', child['seconds'], 's', size))
+            results.append(record('analysis', f'{mode}_peak_rss', child['peak_mb'], 'MB', size))
+            if child['rescore_seconds'] is not None:
+                results.append(record('analysis', 'rescore_seconds', child['rescore_seconds'], 's', size))
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[dict], path: str):
+    """Изменение каждой метрики относительно прошлого файла результатов"""
+    with open(path, encoding='utf-8') as f:
+        previous = {(item['suite'], item['metric'], item['size']): item['value'] for item in json.load(f)['results']}
+    print(f"\nСравнение с {path}:")
+    for item in results:
+        old = previous.get((item['suite'], item['metric'], item['size']))
+        if old and item['value'] is not None:
+            print(f"  {item['suite']}/{item['metric']} [{item['size']}]: "
+                  f"{old:.4g} -> {item['value']:.4g} {item['unit']} ({item['value'] / old - 1:+.1%})")
+
+
+def print_results(results: List[dict]):
+    for item in results:
+        value = 'ошибка' if item['value'] is None else f"{item['value']:.4g} {item['unit']}"
+        print(f"{item['suite']:>10} {item['metric']:<26} {str(item['size'] or ''):>9}  {value}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suites', default=','.join(SUITES), help=f"Через запятую: {', '.join(SUITES)}")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Размеры баз для analysis через запятую")
+    parser.add_argument('--modes', default=','.join(ANALYSIS_MODES), help="Режимы анализа через запятую")
+    parser.add_argument('--extraction-rows', type=int, default=50_000, help="Компаний в HTML-листингах")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--save-rows', type=int, default=200_000)
+    parser.add_argument('--save-batch', type=int, default=20, help="Компаний в save_companies (страница листинга)")
+    parser.add_argument('--data-dir', help="Каталог для синтетических баз между запусками")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help="Прошлый файл результатов")
+    parser.add_argument('--child-analysis', choices=ANALYSIS_MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child_analysis:
+        analysis_child(args.db, args.child_analysis)
+        return 0
+
+    suites = [suite.strip() for suite in args.suites.split(',') if suite.strip()]
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    if set(suites) - set(SUITES) or set(modes) - set(ANALYSIS_MODES):
+        parser.error(f"--suites: {', '.join(SUITES)}; --modes: {', '.join(ANALYSIS_MODES)}")
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    results = []
+    started = time.perf_counter()
+    if 'extraction' in suites:
+        results += bench_extraction(args.extraction_rows, args.concurrency, args.seed)
+    if 'save' in suites:
+        results += bench_save(args.save_rows, args.save_batch, args.seed)
+    if 'analysis' in suites:
+        if args.data_dir:
+            os.makedirs(args.data_dir, exist_ok=True)
+            results += bench_analysis(sizes, modes, args.data_dir, args.seed)
+        else:
+            with tempfile.TemporaryDirectory() as data_dir:
+                results += bench_analysis(sizes, modes, data_dir, args.seed)
+
+    output = {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seed': args.seed,
+        'total_seconds': time.perf_counter() - started,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=1)
+    print_results(results)
+    print(f"\nРезультаты записаны в {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
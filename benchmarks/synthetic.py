@@ -0,0 +1,127 @@
+"""
+Синтетические данные для бенчмарков: компании с перекосом, как на сайте
+(размеры ОКВЭД по закону Ципфа, выручка с тяжелым хвостом, у части
+компаний темп прироста не указан - '-'), база companies из них и HTML-
+листинги .company-card для локального сервера (см. listing_pages.py).
+
+    python benchmarks/synthetic.py --rows 1000000 --db synthetic.db
+    python benchmarks/synthetic.py --rows 20000 --site site/
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_parser import ACTIVE_STATUS, MAX_REVENUE, MIN_REVENUE  # noqa: E402
+from database import Company, Database  # noqa: E402
+from listing_pages import CardSpec, write_site  # noqa: E402
+
+OKVED_1_CODES = [f'{code:02d}' for code in range(1, 100)]
+SUB_OKVEDS = 6  # вторых частей ОКВЭД в каждой отрасли
+THIRD_OKVEDS = 3  # третьих частей в каждой второй
+ZIPF_EXPONENT = 1.1
+PARETO_SHAPE = 1.2  # чем меньше, тем тяжелее хвост выручки
+MISSING_GROWTH_SHARE = 0.08
+LIQUIDATED_SHARE = 0.03
+OWNERS = ['Иванов И.И.', 'Петров П.П.', 'Сидорова А.В.', 'Кузнецов Д.С.', 'Смирнова Е.А.']
+FIRST_INN = 7700000000
+
+
+def company_batches(rows: int, seed: int = 0, batch_size: int = 100_000) -> Iterator[List[Company]]:
+    """Компании пачками по batch_size; при одном seed результат одинаковый"""
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, len(OKVED_1_CODES) + 1) ** ZIPF_EXPONENT
+    # Крупные отрасли не обязательно идут первыми по коду
+    weights = rng.permutation(weights / weights.sum())
+
+    for start in range(0, rows, batch_size):
+        size = min(batch_size, rows - start)
+        groups = rng.choice(len(OKVED_1_CODES), size, p=weights)
+        subs = rng.integers(0, SUB_OKVEDS, size)
+        thirds = rng.integers(0, THIRD_OKVEDS + 1, size)  # 0 - без третьей части
+        revenue = np.minimum(MIN_REVENUE * (1 + rng.pareto(PARETO_SHAPE, size)), MAX_REVENUE).round()
+        growth = np.round(8 + 25 * rng.standard_t(3, size), 1)
+        missing = rng.random(size) < MISSING_GROWTH_SHARE
+        owners = rng.integers(0, len(OWNERS), size)
+
+        batch = []
+        for i in range(size):
+            okved_1 = OKVED_1_CODES[groups[i]]
+            okved_2 = str(10 + subs[i] * 11)
+            okved_3 = str(thirds[i]) if thirds[i] else ''
+            number = start + i
+            batch.append(Company(
+                name=f'ООО "Компания {number}"',
+                okved='.'.join(part for part in (okved_1, okved_2, okved_3) if part),
+                okved_1=okved_1, okved_2=okved_2, okved_3=okved_3,
+                inn=str(FIRST_INN + number),
+                revenue=float(revenue[i]),
+                growth_rate='-' if missing[i] else float(growth[i]),
+                owner=OWNERS[owners[i]],
+            ))
+        yield batch
+
+
+async def fill_database(path: str, rows: int, seed: int = 0, batch_size: int = 10_000) -> float:
+    """Записывает компании через Database.save_companies и возвращает время записи"""
+    elapsed = 0.0
+    async with Database(path) as db:
+        await db.create_table()
+        for batch in company_batches(rows, seed, batch_size):
+            start = time.perf_counter()
+            await db.save_companies(batch)
+            elapsed += time.perf_counter() - start
+    return elapsed
+
+
+def make_database(path: str, rows: int, seed: int = 0) -> float:
+    return asyncio.run(fill_database(path, rows, seed))
+
+
+def listing_site(root: str, rows: int, seed: int = 0, cards_per_page: int = 20) -> dict:
+    """
+    Листинги по полному ОКВЭД (выручка по убыванию, как на сайте) в структуре
+    URL сайта. Возвращает ожидаемые результаты разбора по URL-пути.
+    """
+    rng = np.random.default_rng(seed + 1)
+    sections: Dict[str, Dict[str, List[CardSpec]]] = defaultdict(lambda: defaultdict(list))
+    for batch in company_batches(rows, seed):
+        liquidated = rng.random(len(batch)) < LIQUIDATED_SHARE
+        for company, closed in zip(batch, liquidated):
+            sections[company.okved_1][company.okved].append(CardSpec(
+                name=company.name, inn=company.inn, owner=company.owner,
+                revenue=company.revenue, growth_rate=company.growth_rate,
+                status='ЛИКВИДИРОВАНО' if closed else ACTIVE_STATUS,
+            ))
+
+    expected = {}
+    for section, listings in sections.items():
+        pages = {}
+        for okved, cards in listings.items():
+            cards.sort(key=lambda card: -card.revenue)
+            pages[okved] = [cards[i:i + cards_per_page] for i in range(0, len(cards), cards_per_page)]
+        expected.update(write_site(root, section, pages))
+    return expected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="Создать базу companies")
+    parser.add_argument("--site", help="Записать HTML-листинги в каталог")
+    args = parser.parse_args()
+
+    if args.db:
+        seconds = make_database(args.db, args.rows, args.seed)
+        print(f"{args.db}: {args.rows} компаний, запись {args.rows / seconds:.0f} строк/с")
+    if args.site:
+        pages = listing_site(args.site, args.rows, args.seed)
+        print(f"{args.site}: {len(pages)} страниц листингов")
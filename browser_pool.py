@@ -0,0 +1,286 @@
+"""
+Пул браузеров Selenium для pars3: облегченные профили Chrome (eager-загрузка,
+блокировка картинок, шрифтов и счетчиков, без расширений) и замена драйвера
+после N страниц, при росте памяти процессов Chrome или после нескольких
+таймаутов подряд. Замена готовится заранее в фоне, поэтому воркер не ждет
+холодного запуска браузера.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from crawl_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Причины замены драйвера
+PAGES_RECYCLE = 'pages'
+RSS_RECYCLE = 'rss'
+TIMEOUTS_RECYCLE = 'timeouts'
+BROKEN_RECYCLE = 'broken'
+
+# Результат вызова драйвера для release()
+TIMEOUT = 'timeout'
+BROKEN = 'broken'
+
+# Шаблоны Network.setBlockedURLs по типам ресурсов
+RESOURCE_PATTERNS = {
+    'image': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico'],
+    'font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+    'media': ['*.mp4', '*.webm', '*.mp3'],
+    'stylesheet': ['*.css'],
+    'tracker': ['*mc.yandex.ru*', '*google-analytics.com*', '*googletagmanager.com*',
+                '*top-fwz1.mail.ru*', '*doubleclick.net*'],
+}
+
+
+@dataclass(frozen=True)
+class BrowserProfile:
+    """Настройки запуска Chrome"""
+    page_load_strategy: str = 'normal'
+    blocked: Tuple[str, ...] = ()
+    disable_extensions: bool = False
+    headless: bool = True
+    page_load_timeout: float = 30.0  # таймаут driver.get, с
+
+    @property
+    def blocked_urls(self) -> List[str]:
+        return [pattern for kind in self.blocked for pattern in RESOURCE_PATTERNS[kind]]
+
+
+# Стили не блокируются: innerText карточек зависит от отображения элементов
+PROFILES: Dict[str, BrowserProfile] = {
+    'default': BrowserProfile(),
+    'lean': BrowserProfile(page_load_strategy='eager', blocked=('image', 'font', 'media', 'tracker'),
+                           disable_extensions=True),
+}
+
+
+def apply_profile(options, profile: BrowserProfile):
+    """Переносит профиль в ChromeOptions"""
+    if profile.headless:
+        options.add_argument('--headless')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.page_load_strategy = profile.page_load_strategy
+    if profile.disable_extensions:
+        options.add_argument('--disable-extensions')
+        options.add_argument('--disable-component-extensions-with-background-pages')
+    if 'image' in profile.blocked:
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+    return options
+
+
+def block_resources(driver, profile: BrowserProfile):
+    """Блокирует загрузку ресурсов профиля через DevTools"""
+    urls = profile.blocked_urls
+    if urls:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': urls})
+
+
+def process_tree_rss(pid: int) -> Optional[int]:
+    """RSS процесса и всех его потомков в байтах (Linux, иначе None)"""
+    children: Dict[int, List[int]] = {}
+    rss: Dict[int, int] = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return None
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Имя процесса в скобках может содержать пробелы
+        fields = stat[stat.rfind(b')') + 2:].split()
+        child = int(entry)
+        children.setdefault(int(fields[1]), []).append(child)
+        rss[child] = int(fields[21]) * page_size
+    if pid not in rss:
+        return None
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += rss.get(current, 0)
+        stack.extend(children.get(current, ()))
+    return total
+
+
+def _driver_pid(driver) -> Optional[int]:
+    service = getattr(driver, 'service', None)
+    process = getattr(service, 'process', None)
+    return getattr(process, 'pid', None)
+
+
+class PooledDriver:
+    """Драйвер пула и его счетчики"""
+    __slots__ = ('driver', 'pages', 'timeouts', 'started')
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.timeouts = 0  # подряд
+        self.started = time.monotonic()
+
+
+class DriverPool:
+    """
+    size драйверов для воркеров и spares заранее запущенных на замену.
+    Драйвер заменяется после max_pages страниц, когда RSS Chrome (проверяется
+    раз в rss_check_pages страниц) превышает max_rss_mb, после max_timeouts
+    таймаутов подряд и сразу, если сессия браузера потеряна.
+    Без start() драйверы запускаются при первом acquire().
+    Команды драйверам (run) выполняются в собственных потоках пула, по потоку
+    на драйвер; запуск и закрытие браузеров - в потоках по умолчанию, поэтому
+    фоновая замена не занимает поток воркера.
+    """
+
+    def __init__(self, factory: Callable[[], object], size: int = 1, spares: int = 1,
+                 max_pages: int = 200, max_rss_mb: Optional[float] = 1500, max_timeouts: int = 3,
+                 rss_check_pages: int = 10):
+        self.factory = factory
+        self.size = size
+        self.spares = spares
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.max_timeouts = max_timeouts
+        self.rss_check_pages = rss_check_pages
+        self.recycled: Dict[str, int] = {}
+        self._idle = asyncio.Queue()
+        self._ready = asyncio.Queue()
+        self._starting: Optional[asyncio.Task] = None
+        self._tasks = set()
+        # Устанавливается в close(): прерывает паузы между повторами запуска
+        self._closed = asyncio.Event()
+        # Одновременно в работе не больше size драйверов
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='driver')
+
+    async def _launch(self) -> PooledDriver:
+        start = time.monotonic()
+        driver = await asyncio.to_thread(self.factory)
+        logger.info(f"Браузер запущен за {time.monotonic() - start:.1f} с")
+        return PooledDriver(driver)
+
+    def _background(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _prewarm(self, queue: asyncio.Queue):
+        """Запускает браузер (с повторами при ошибке) и кладет его в queue"""
+        delay = 1.0
+        while not self._closed.is_set():
+            try:
+                driver = await self._launch()
+            except Exception as e:
+                logger.error(f"Не удалось запустить браузер, повтор через {delay:.0f} с: {e}")
+                try:
+                    await asyncio.wait_for(self._closed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(delay * 2, 60.0)
+                continue
+            if self._closed.is_set():
+                await self._quit(driver)
+            else:
+                queue.put_nowait(driver)
+            return
+
+    async def _start(self):
+        results = await asyncio.gather(*(self._launch() for _ in range(self.size)), return_exceptions=True)
+        drivers = [result for result in results if isinstance(result, PooledDriver)]
+        if len(drivers) < self.size:
+            await asyncio.gather(*(self._quit(driver) for driver in drivers))
+            raise next(result for result in results if isinstance(result, BaseException))
+        for driver in drivers:
+            self._idle.put_nowait(driver)
+        for _ in range(self.spares):
+            self._background(self._prewarm(self._ready))
+
+    async def start(self):
+        """Запускает size браузеров; при ошибке следующий вызов пробует снова"""
+        if self._starting is None:
+            self._starting = asyncio.create_task(self._start())
+        try:
+            await asyncio.shield(self._starting)
+        except Exception:
+            self._starting = None
+            raise
+
+    async def run(self, func, *args):
+        """Блокирующий вызов драйвера в потоке пула (с контекстом воркера для метрик, как to_thread)"""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(context.run, func, *args))
+
+    async def acquire(self) -> PooledDriver:
+        await self.start()
+        return await self._idle.get()
+
+    def _recycle_reason(self, driver: PooledDriver, failure: Optional[str]) -> Optional[str]:
+        if failure == BROKEN:
+            return BROKEN_RECYCLE
+        if driver.timeouts >= self.max_timeouts:
+            return TIMEOUTS_RECYCLE
+        if self.max_pages and driver.pages >= self.max_pages:
+            return PAGES_RECYCLE
+        if self.max_rss_mb and driver.pages % self.rss_check_pages == 0:
+            pid = _driver_pid(driver.driver)
+            rss = process_tree_rss(pid) if pid else None
+            if rss is not None and rss > self.max_rss_mb * 1024 * 1024:
+                return RSS_RECYCLE
+        return None
+
+    async def release(self, driver: PooledDriver, failure: Optional[str] = None):
+        """Возвращает драйвер в пул; failure - TIMEOUT, BROKEN или None при успехе"""
+        driver.pages += 1
+        driver.timeouts = driver.timeouts + 1 if failure == TIMEOUT else 0
+        reason = self._recycle_reason(driver, failure)
+        if reason is None:
+            self._idle.put_nowait(driver)
+            return
+
+        self.recycled[reason] = self.recycled.get(reason, 0) + 1
+        metrics.inc('driver_recycles', reason=reason)
+        logger.info(f"Замена браузера ({reason}) после {driver.pages} страниц, "
+                    f"{time.monotonic() - driver.started:.0f} с работы")
+        self._background(self._quit(driver))
+        if self._ready.empty():
+            # Запасной еще не готов: браузер запускается прямо в пул,
+            # воркер подождет его в acquire()
+            metrics.inc('driver_cold_starts')
+            self._background(self._prewarm(self._idle))
+        else:
+            self._idle.put_nowait(self._ready.get_nowait())
+            self._background(self._prewarm(self._ready))
+
+    async def _quit(self, driver: PooledDriver):
+        try:
+            await asyncio.to_thread(driver.driver.quit)
+        except Exception as e:
+            logger.warning(f"Ошибка при закрытии браузера: {e}")
+
+    async def close(self):
+        # Паузы между повторами прерываются сразу, а запускаемые сейчас
+        # браузеры закрываются в _prewarm по готовности (отмена запуска в
+        # потоке оставила бы браузер открытым)
+        self._closed.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        drivers = []
+        for queue in (self._idle, self._ready):
+            while not queue.empty():
+                drivers.append(queue.get_nowait())
+        await asyncio.gather(*(self._quit(driver) for driver in drivers))
+        self._executor.shutdown(wait=False)
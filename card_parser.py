@@ -0,0 +1,288 @@
+import logging
+from typing import Container, Iterable, List, Optional, Set, Tuple, Union
+from urllib.parse import urljoin
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUS = 'ДЕЙСТВУЕТ'
+
+# Диапазон выручки, который сохраняется в базу
+MIN_REVENUE = 500000000
+MAX_REVENUE = 15000000000
+
+# Сколько страниц листинга обходится для одного ОКВЭД
+MAX_PAGES = 20
+
+# Результат разбора карточки: словарь с данными компании,
+# 'small' для выручки ниже MIN_REVENUE, 'seen' для уже известного ИНН
+# (остальные поля не разбираются) или None, если карточка не подходит
+CardResult = Union[dict, str, None]
+SEEN = 'seen'
+
+_CARD_XPATH = "//*[contains(concat(' ', normalize-space(@class), ' '), ' company-card ')]"
+_PAGINATION_XPATH = "//*[contains(concat(' ', normalize-space(@class), ' '), ' pagination__item ')]"
+
+
+def page_url(url: str, page: int) -> str:
+    """Адрес страницы листинга ОКВЭД"""
+    return url if page == 1 else f"{url}{page}/"
+
+
+def parse_revenue_text(text: str) -> float:
+    """Выручка из текста вида 'Выручка: 1 234 567 ₽' (ValueError, если числа нет)"""
+    return float(text.split(':', 1)[1].strip().split('₽')[0].replace(' ', '').replace(',', '.'))
+
+
+def split_okved(okved: str):
+    """Разбивает код ОКВЭД на три части"""
+    okved_parts = okved.split('.')
+    okved_1 = okved_parts[0] if len(okved_parts) > 0 else ''
+    okved_2 = okved_parts[1] if len(okved_parts) > 1 else ''
+    okved_3 = okved_parts[2] if len(okved_parts) > 2 else ''
+    return okved_1, okved_2, okved_3
+
+
+def okved_from_url(url: str) -> str:
+    """Код ОКВЭД из адреса листинга, в том числе страницы с номером (page_url)"""
+    return url.split('/okved/')[-1].strip('/').split('/')[0]
+
+
+def page_from_url(url: str) -> int:
+    """Номер страницы листинга из адреса page_url"""
+    parts = url.split('/okved/')[-1].strip('/').split('/')
+    return int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 1
+
+
+def inn_from_text(inn_text: str) -> str:
+    """ИНН из текста вида 'ИНН: 7700000000'"""
+    return inn_text.strip().split(':')[1].strip()
+
+
+def _safe_inn(inn_text: str) -> str:
+    try:
+        return inn_from_text(inn_text)
+    except IndexError:
+        return ''
+
+
+def company_data_from_texts(name: str, inn_text: str, owner_text: str,
+                            info_texts: Iterable[str], okved: str) -> CardResult:
+    """
+    Собирает данные компании из текстов полей карточки.
+    Общая часть для Selenium и для разбора сохраненного HTML,
+    поэтому оба способа возвращают одинаковый результат.
+    info_texts читается лениво и только до решения по выручке.
+    """
+    inn = inn_from_text(inn_text)
+    owner = owner_text.strip().split(':')[1].strip()
+
+    okved_1, okved_2, okved_3 = split_okved(okved)
+
+    company_data = {
+        'name': name,
+        'okved': okved,
+        'okved_1': okved_1,
+        'okved_2': okved_2,
+        'okved_3': okved_3,
+        'inn': inn,
+        'owner': owner,
+        'revenue': 0,
+        'growth_rate': 0
+    }
+
+    for text in info_texts:
+        if 'Выручка:' in text:
+            try:
+                revenue = parse_revenue_text(text)
+                if MIN_REVENUE <= revenue <= MAX_REVENUE:
+                    company_data['revenue'] = revenue
+                elif MIN_REVENUE > revenue:
+                    return 'small'
+                else:
+                    return None
+
+            except:
+                return None
+        if 'Темп прироста:' in text:
+            try:
+                growth_text = text.split(':')[-1].strip()[:-1].replace(',', '.')
+                # '-' - прирост не указан
+                company_data['growth_rate'] = float(growth_text) if growth_text != '-' else None
+            except:
+                return None
+
+    return company_data
+
+
+def _required(fields: dict, key: str) -> str:
+    value = fields.get(key)
+    if value is None:
+        raise LookupError(f"нет поля {key}")
+    # innerText сохраняет неразрывные пробелы, а .text в Selenium - нет
+    return value.replace('\xa0', ' ').strip()
+
+
+def card_result_from_fields(fields: dict, okved: str, known: Optional[Container[str]] = None) -> CardResult:
+    """
+    Разбор карточки по текстам полей, собранным одним вызовом JavaScript
+    (ключи name, status, inn, owner, info).
+    """
+    try:
+        inn_text = _required(fields, 'inn')
+        if known is not None and inn_from_text(inn_text) in known:
+            return SEEN
+        name = _required(fields, 'name')
+        if _required(fields, 'status') != ACTIVE_STATUS:
+            return None
+        owner_text = _required(fields, 'owner')
+        info_texts = (text.replace('\xa0', ' ').strip() for text in fields.get('info') or [])
+        return company_data_from_texts(name, inn_text, owner_text, info_texts, okved)
+    except Exception as e:
+        logger.error(f"Error extracting company data: {e}")
+        return None
+
+
+def cards_from_fields(rows: List[dict], okved: str, known: Optional[Container[str]] = None) -> List[CardResult]:
+    """Разбор всех карточек страницы по текстам полей (см. card_result_from_fields)"""
+    known = page_known(known, (_safe_inn(fields['inn']) for fields in rows if fields.get('inn')))
+    return [card_result_from_fields(fields, okved, known) for fields in rows]
+
+
+def _text(element) -> str:
+    """Видимый текст элемента с нормализованными пробелами, как .text в Selenium"""
+    return ' '.join(element.text_content().split())
+
+
+def _child(element, position: int, tag: str):
+    """Аналог CSS 'tag:nth-child(position)' для прямого потомка"""
+    found = element.xpath(f'./*[{position}][self::{tag}]')
+    if not found:
+        raise LookupError(f"нет элемента {tag}:nth-child({position})")
+    return found[0]
+
+
+def _card_inn_text(card) -> str:
+    return _text(_child(_child(card, 10, 'div'), 1, 'p'))
+
+
+def page_known(known: Optional[Container[str]], inns: Iterable[str]) -> Optional[Container[str]]:
+    """
+    Известные ИНН карточек одной страницы, если KnownInns проверяет срабатывания
+    фильтра Блума по базе: один запрос на страницу вместо запроса на срабатывание.
+    """
+    if not getattr(known, 'confirms', False):
+        return known
+    return known.among(inns)
+
+
+def parse_card(card, okved: str, known: Optional[Container[str]] = None,
+               inn_text: Optional[str] = None) -> CardResult:
+    """
+    Разбор одной карточки .company-card (элемент lxml); ИНН из known - SEEN.
+    inn_text - уже извлеченный текст поля ИНН.
+    """
+    try:
+        if inn_text is None:
+            inn_text = _card_inn_text(card)
+        if known is not None and inn_from_text(inn_text) in known:
+            return SEEN
+        name = _text(_child(card, 5, 'p'))
+
+        status_elements = card.xpath('./span')
+        if not status_elements:
+            raise LookupError("нет элемента span")
+        if _text(status_elements[0]) != ACTIVE_STATUS:
+            return None
+
+        owner_text = _text(_child(card, 7, 'p'))
+        info_texts = (_text(element) for element in card.iter('div') if element is not card)
+        return company_data_from_texts(name, inn_text, owner_text, info_texts, okved)
+    except Exception as e:
+        logger.error(f"Error extracting company data: {e}")
+        return None
+
+
+def parse_html(html: str):
+    import lxml.html
+    return lxml.html.fromstring(html)
+
+
+def parse_company_cards(html: str, okved: str, known: Optional[Container[str]] = None) -> List[CardResult]:
+    """
+    Разбирает все карточки компаний страницы листинга.
+    Поля ищутся относительно карточки по тем же позициям, что и CSS-селекторы
+    в pars3.extract_company_data. Карточки с ИНН из known - SEEN.
+    """
+    cards = parse_html(html).xpath(_CARD_XPATH)
+    if not getattr(known, 'confirms', False):
+        return [parse_card(card, okved, known) for card in cards]
+    inn_texts = []
+    for card in cards:
+        try:
+            inn_texts.append(_card_inn_text(card))
+        except LookupError:
+            # Ошибку запишет parse_card
+            inn_texts.append(None)
+    known = page_known(known, (_safe_inn(text) for text in inn_texts if text is not None))
+    return [parse_card(card, okved, known, inn_text) for card, inn_text in zip(cards, inn_texts)]
+
+
+def has_company_cards(html: str) -> bool:
+    return bool(parse_html(html).xpath(_CARD_XPATH))
+
+
+def card_revenues(document) -> List[Optional[float]]:
+    """
+    Выручка всех карточек страницы по порядку, без фильтра по диапазону
+    и статусу (None - выручка не указана). Нужна планировщику страниц.
+    """
+    revenues = []
+    for card in document.xpath(_CARD_XPATH):
+        revenue = None
+        for element in card.iter('div'):
+            text = _text(element)
+            if element is not card and 'Выручка:' in text:
+                try:
+                    revenue = parse_revenue_text(text)
+                except (ValueError, IndexError):
+                    pass
+                break
+        revenues.append(revenue)
+    return revenues
+
+
+def parse_listing_probe(html: str) -> Tuple[List[Optional[float]], int]:
+    """Выручка карточек и номер последней страницы из HTML листинга"""
+    document = parse_html(html)
+    return card_revenues(document), _last_page(document)
+
+
+def parse_last_page(html: str) -> int:
+    """Наибольший номер страницы в блоке пагинации (1, если пагинации нет)"""
+    return _last_page(parse_html(html))
+
+
+def _last_page(document) -> int:
+    last_page = 1
+    for item in document.xpath(_PAGINATION_XPATH):
+        try:
+            last_page = max(last_page, int(_text(item)))
+        except ValueError:
+            continue
+    return last_page
+
+
+def parse_okved_links(html: str, page_url: str) -> Set[str]:
+    """Абсолютные ссылки на страницы ОКВЭД"""
+    document = parse_html(html)
+    links = set()
+    for href in document.xpath("//a[contains(@href, '/okved/')]/@href"):
+        links.add(urljoin(page_url, href))
+    return links
+
+
+
+def filter_sub_okved_hrefs(links: Iterable[str], okved_url: str) -> Set[str]:
+    """Ссылки на под-категории: без самой страницы ОКВЭД и корня каталога"""
+    okved_root = okved_url.split('/okved/')[0] + '/okved/'
+    return {href for href in links if '/okved/' in href and href != okved_url and href != okved_root}
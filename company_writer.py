@@ -0,0 +1,248 @@
+"""
+Отложенная запись компаний: воркеры кладут страницы в ограниченную очередь,
+а одна задача-писатель сохраняет их крупными транзакциями - по размеру
+пакета или по интервалу, что наступит раньше. Воркеры не ждут коммита и не
+борются за блокировку записи SQLite; при полной очереди submit() ждет места.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, List, Optional
+
+import aiosqlite
+
+from crawl_metrics import SAVE, metrics
+from database import Company, Database
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 2000
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_QUEUE = 10_000
+
+
+@dataclass
+class _Pending:
+    companies: List[Company]
+    token: Any
+    future: asyncio.Future
+    enqueued: float
+
+
+class CompanyWriter:
+    """
+    Единственный писатель companies.
+    submit(companies, token) ставит страницу в очередь и возвращает future
+    с ее SaveResult. before_commit(conn, tokens) выполняется в транзакции
+    пакета (например, закрывает страницы crawl_frontier вместе с их
+    компаниями), after_commit(tokens, batches) - после ее фиксации,
+    on_failure(tokens, error) - если пакет записать не удалось.
+    """
+
+    def __init__(self, db: Database, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, max_queue: int = DEFAULT_MAX_QUEUE,
+                 on_conflict: str = 'ignore',
+                 before_commit: Optional[Callable[[aiosqlite.Connection, List[Any]], Awaitable]] = None,
+                 after_commit: Optional[Callable[[List[Any], List[List[Company]]], Awaitable]] = None,
+                 on_failure: Optional[Callable[[List[Any], Exception], Awaitable]] = None):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.on_conflict = on_conflict
+        self.before_commit = before_commit
+        self.after_commit = after_commit
+        self.on_failure = on_failure
+        self._pending: Deque[_Pending] = deque()
+        self._queued = 0  # компаний в очереди
+        self._space = asyncio.Condition()
+        self._wake = asyncio.Event()
+        self._flush_requested = False
+        self._closing = False
+        self._closed = False
+        self._task: Optional[asyncio.Task] = None
+        # Статистика
+        self.started = time.monotonic()
+        self.commits = 0
+        self.rows = 0
+        self.pages = 0
+        self.commit_seconds = 0.0
+        self.max_lag = 0.0
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, companies: List[Company], token: Any = None) -> asyncio.Future:
+        """Ставит страницу в очередь; ждет, пока в очереди не освободится место"""
+        if self._closing:
+            raise RuntimeError("Запись уже остановлена")
+        size = len(companies)
+        async with self._space:
+            # Страница больше всей очереди проходит, когда очередь пуста
+            await self._space.wait_for(lambda: not self._queued or self._queued + size <= self.max_queue)
+            future = asyncio.get_running_loop().create_future()
+            self._pending.append(_Pending(companies, token, future, time.monotonic()))
+            self._queued += size
+        metrics.set_gauge('writer_queue', self._queued)
+        if self._queued >= self.batch_size:
+            self._wake.set()
+        return future
+
+    async def flush(self):
+        """Записывает все, что уже в очереди, не дожидаясь интервала"""
+        futures = [pending.future for pending in self._pending]
+        if not futures:
+            return
+        self._flush_requested = True
+        self._wake.set()
+        await asyncio.gather(*futures, return_exceptions=True)
+
+    async def wait(self, future: asyncio.Future):
+        """Ждет коммита страницы future; если она еще в очереди, очередь записывается сразу"""
+        if future.done():
+            return
+        if any(pending.future is future for pending in self._pending):
+            self._flush_requested = True
+            self._wake.set()
+        await asyncio.wait([future])
+
+    async def close(self):
+        """
+        Останавливает писателя после записи всей очереди. Ошибка писателя
+        поднимается один раз, повторный вызов ничего не делает.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._closing = True
+        self._wake.set()
+        try:
+            if self._task is not None:
+                await self._task
+            else:
+                await self._write_all()
+        finally:
+            logger.info(f"Запись компаний: {self.stats()}")
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            'commits': self.commits,
+            'rows': self.rows,
+            'pages': self.pages,
+            'commits_per_second': round(self.commits / elapsed, 2) if elapsed else 0.0,
+            'rows_per_commit': round(self.rows / self.commits, 1) if self.commits else 0.0,
+            'commit_seconds': round(self.commit_seconds, 2),
+            'max_lag_seconds': round(self.max_lag, 2),
+            'queued': self._queued,
+        }
+
+    async def _run(self):
+        try:
+            while True:
+                if not self._pending:
+                    if self._closing:
+                        return
+                    self._wake.clear()
+                    await self._wake.wait()
+                    continue
+                # Ждем полного пакета или истечения интервала с первой страницы очереди
+                deadline = self._pending[0].enqueued + self.flush_interval
+                while (self._queued < self.batch_size and not self._flush_requested
+                       and not self._closing and time.monotonic() < deadline):
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), deadline - time.monotonic())
+                    except asyncio.TimeoutError:
+                        break
+                await self._write_queued()
+        except asyncio.CancelledError:
+            # Отмена не должна терять уже собранные страницы
+            await self._write_all()
+            raise
+
+    async def _write_all(self):
+        while self._pending:
+            batch = list(self._pending)
+            self._pending.clear()
+            await self._write(batch)
+
+    async def _write_queued(self):
+        batch = []
+        size = 0
+        while self._pending and (not batch or size < self.batch_size):
+            pending = self._pending[0]
+            if batch and size + len(pending.companies) > self.batch_size:
+                break
+            batch.append(self._pending.popleft())
+            size += len(pending.companies)
+        if not self._pending:
+            self._flush_requested = False
+        await self._write(batch)
+
+    async def _write(self, batch: List[_Pending]):
+        if not batch:
+            return
+        tokens = [pending.token for pending in batch]
+        rows = sum(len(pending.companies) for pending in batch)
+        lag = time.monotonic() - batch[0].enqueued
+        self.max_lag = max(self.max_lag, lag)
+
+        async def in_transaction(conn):
+            if self.before_commit is not None:
+                await self.before_commit(conn, tokens)
+
+        start = time.perf_counter()
+        try:
+            with metrics.stage(SAVE):
+                results = await self.db.save_company_batches(
+                    [pending.companies for pending in batch], self.on_conflict, in_transaction
+                )
+        except asyncio.CancelledError:
+            # Транзакция откатывается; пакет возвращается в начало очереди и
+            # записывается при остановке (повторная запись безопасна)
+            self._pending.extendleft(reversed(batch))
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка записи {rows} компаний с {len(batch)} страниц: {e}")
+            metrics.inc('errors', reason=f'write_{type(e).__name__}')
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+                    # Ошибка передана on_failure: future может никто не ждать
+                    pending.future.exception()
+            await self._release(rows)
+            if self.on_failure is not None:
+                await self.on_failure(tokens, e)
+            return
+
+        await self._release(rows)
+        if self.after_commit is not None:
+            try:
+                await self.after_commit(tokens, [pending.companies for pending in batch])
+            except Exception as e:
+                logger.error(f"Ошибка обработки записанного пакета: {e}")
+        self.commit_seconds += time.perf_counter() - start
+        self.commits += 1
+        self.rows += rows
+        self.pages += len(batch)
+        for pending, result in zip(batch, results):
+            if not pending.future.done():
+                pending.future.set_result(result)
+        inserted = sum(result.inserted for result in results)
+        updated = sum(result.updated for result in results)
+        metrics.inc('writer_commits')
+        metrics.inc('companies', inserted + updated)
+        metrics.set_gauge('writer_lag_seconds', lag)
+        logger.info(f"Записано {inserted} новых компаний с {len(batch)} страниц одной транзакцией "
+                    f"(обновлено {updated}, пропущено {rows - inserted - updated}, задержка очереди {lag:.1f} с)")
+
+    async def _release(self, rows: int):
+        async with self._space:
+            self._queued -= rows
+            self._space.notify_all()
+        metrics.set_gauge('writer_queue', self._queued)
+
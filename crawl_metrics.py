@@ -0,0 +1,314 @@
+"""
+Метрики обхода pars3: время этапов (гистограммы по этапу и воркеру),
+счетчики страниц, компаний, досрочных остановок и ошибок по причинам,
+датчики темпа и глубины очереди. Снимки периодически дописываются в JSON
+Lines и в текстовый файл Prometheus для textfile collector node_exporter.
+
+Пока метрики не включены (metrics.enable()), stage() возвращает общий
+пустой контекстный менеджер, а inc() и observe() сразу выходят.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = 'pars3'
+# Границы корзин гистограмм времени этапов, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DEFAULT_INTERVAL = 15.0
+
+# Этапы обхода
+DRIVER_GET = 'driver_get'
+WAIT = 'wait'
+EXTRACT = 'extract'
+RATE_WAIT = 'rate_wait'
+HTTP_FETCH = 'http_fetch'
+PARSE = 'parse'
+SAVE = 'save'
+DISCOVERY = 'discovery'
+CACHE_WRITE = 'cache_write'
+
+# Воркер текущей задачи; asyncio.to_thread копирует контекст, поэтому
+# вызовы драйвера в пуле потоков учитываются за своим воркером
+_worker = contextvars.ContextVar('crawl_worker', default='main')
+_NOOP = nullcontext()
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def set_worker(worker: str):
+    _worker.set(worker)
+
+
+def _labels(labels: dict) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # последняя - +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'worker', 'start')
+
+    def __init__(self, metrics: 'CrawlMetrics', stage: str):
+        self.metrics = metrics
+        self.stage = stage
+        self.worker = _worker.get()
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, self.worker)
+        return False
+
+
+class CrawlMetrics:
+    """Реестр метрик одного процесса pars3 (обновляется из цикла событий и пула потоков)"""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.counters: Dict[Tuple[str, LabelKey], float] = {}
+        self.gauges: Dict[Tuple[str, LabelKey], float] = {}
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._last_rates = (self.started, 0.0, 0.0)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def stage(self, stage: str):
+        """Контекстный менеджер для замера этапа текущего воркера"""
+        if not self.enabled:
+            return _NOOP
+        return _StageTimer(self, stage)
+
+    def observe(self, stage: str, seconds: float, worker: Optional[str] = None):
+        if not self.enabled:
+            return
+        key = (stage, worker or _worker.get())
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[(name, _labels(labels))] = value
+
+    def total(self, name: str) -> float:
+        """Сумма счетчика по всем меткам"""
+        with self._lock:
+            return sum(value for (counter, _), value in self.counters.items() if counter == name)
+
+    def update_rates(self, overall: bool = False):
+        """Страниц и компаний в минуту с прошлого вызова (overall - с начала обхода)"""
+        now = time.monotonic()
+        pages, companies = self.total('pages'), self.total('companies')
+        last_time, last_pages, last_companies = (self.started, 0.0, 0.0) if overall else self._last_rates
+        minutes = (now - last_time) / 60
+        if minutes > 0:
+            self.set_gauge('pages_per_minute', (pages - last_pages) / minutes)
+            self.set_gauge('companies_per_minute', (companies - last_companies) / minutes)
+        self._last_rates = (now, pages, companies)
+
+    def snapshot(self) -> dict:
+        def named(items):
+            return [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in items]
+
+        with self._lock:
+            return {
+                'time': time.time(),
+                'uptime': time.monotonic() - self.started,
+                'counters': named(self.counters.items()),
+                'gauges': named(self.gauges.items()),
+                'stages': [
+                    {'stage': stage, 'worker': worker, 'count': histogram.count, 'sum': histogram.sum,
+                     'buckets': histogram.counts}
+                    for (stage, worker), histogram in self.histograms.items()
+                ],
+                'buckets': list(LATENCY_BUCKETS),
+            }
+
+    def prometheus(self) -> str:
+        """Текстовый формат экспозиции Prometheus"""
+        def label_text(labels) -> str:
+            if not labels:
+                return ''
+            return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+        lines = []
+        with self._lock:
+            for kind, items, suffix in (('counter', self.counters, '_total'), ('gauge', self.gauges, '')):
+                typed = set()
+                for (name, labels), value in sorted(items.items()):
+                    metric = f'{METRIC_PREFIX}_{name}{suffix}'
+                    if metric not in typed:
+                        typed.add(metric)
+                        lines.append(f'# TYPE {metric} {kind}')
+                    lines.append(f'{metric}{label_text(labels)} {value:g}')
+
+            metric = f'{METRIC_PREFIX}_stage_seconds'
+            if self.histograms:
+                lines.append(f'# TYPE {metric} histogram')
+            for (stage, worker), histogram in sorted(self.histograms.items()):
+                labels = (('stage', stage), ('worker', worker))
+                for bound, count in histogram.cumulative():
+                    le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                    lines.append(f'{metric}_bucket{label_text(labels + (("le", le),))} {count}')
+                lines.append(f'{metric}_sum{label_text(labels)} {histogram.sum:.6f}')
+                lines.append(f'{metric}_count{label_text(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_path: Optional[str] = None, prom_path: Optional[str] = None, overall: bool = False):
+        """Дописывает снимок в JSON Lines и атомарно заменяет файл Prometheus"""
+        self.update_rates(overall)
+        if json_path:
+            with open(json_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(self.snapshot(), ensure_ascii=False) + '\n')
+        if prom_path:
+            # node_exporter не должен прочитать файл наполовину записанным
+            tmp_path = f'{prom_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.prometheus())
+            os.replace(tmp_path, prom_path)
+
+
+metrics = CrawlMetrics()
+
+
+async def report_periodically(json_path: Optional[str], prom_path: Optional[str],
+                              interval: float = DEFAULT_INTERVAL,
+                              refresh: Optional[Callable[[], Awaitable[None]]] = None):
+    """
+    Каждые interval секунд обновляет датчики (refresh - например, глубина
+    очереди) и записывает снимок. Останавливается отменой задачи.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if refresh is not None:
+                await refresh()
+            await asyncio.to_thread(metrics.write, json_path, prom_path)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при записи метрик: {e}")
+
+
+class OkvedProfiler:
+    """
+    Профилирование задач одного ОКВЭД (префикс кода, например 07.10).
+    Пересекающиеся задачи (подкатегории префикса) образуют один сеанс;
+    профиль охватывает поток цикла событий, то есть и других воркеров,
+    пока задача ждет. cprofile пишет pstats, pyinstrument - HTML с учетом await.
+    """
+
+    def __init__(self, okved: str, path: str, tool: str = 'cprofile'):
+        self.okved = okved
+        self.path = path
+        self.tool = tool
+        self._profiler = None
+        self._active = 0
+
+    def matches(self, okved: str) -> bool:
+        return okved == self.okved or okved.startswith(f'{self.okved}.')
+
+    def _start(self):
+        self._active += 1
+        if self._active > 1:
+            return
+        if self._profiler is None:
+            if self.tool == 'pyinstrument':
+                from pyinstrument import Profiler
+                self._profiler = Profiler(async_mode='enabled')
+            else:
+                import cProfile
+                self._profiler = cProfile.Profile()
+        if self.tool == 'pyinstrument':
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def _stop(self):
+        self._active -= 1
+        if self._active:
+            return
+        if self.tool == 'pyinstrument':
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def profile(self, okved: str):
+        if not self.matches(okved):
+            return _NOOP
+        return _ProfileSession(self)
+
+    def save(self):
+        if self._profiler is None:
+            logger.info(f"Задач ОКВЭД {self.okved} для профилирования не было")
+            return
+        if self.tool == 'pyinstrument':
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(self._profiler.output_html())
+        else:
+            self._profiler.dump_stats(self.path)
+        logger.info(f"Профиль ОКВЭД {self.okved} записан в {self.path}")
+
+
+class _ProfileSession:
+    __slots__ = ('profiler',)
+
+    def __init__(self, profiler: OkvedProfiler):
+        self.profiler = profiler
+
+    def __enter__(self):
+        self.profiler._start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._stop()
+        return False
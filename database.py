@@ -1,68 +1,522 @@
+import asyncio
 import aiosqlite
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence
 import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)    
 @dataclass
 class Company:
+    __slots__ = ('name', 'okved', 'okved_1', 'okved_2', 'okved_3', 'inn', 'revenue', 'growth_rate', 'owner')
+
     name: str
     okved: str  # Полный ОКВЭД
     okved_1: str  # Первая часть
     okved_2: str  # Вторая часть
     okved_3: str  # Третья часть
     inn: str
-    revenue: float
-    growth_rate: float
+    revenue: Optional[float]
+    growth_rate: Optional[float]  # None - прирост не указан
+    owner: str
+
+
+# Порядок колонок таблицы companies (SELECT *)
+COMPANY_COLUMNS = ('inn', 'name', 'okved', 'okved_1', 'okved_2', 'okved_3', 'revenue', 'growth_rate', 'owner')
+NUMERIC_COLUMNS = ('revenue', 'growth_rate')
+
+
+class CompanyRecord(NamedTuple):
+    """Строка companies при чтении: кортеж без __dict__, поля в порядке колонок таблицы"""
+    inn: str
+    name: str
+    okved: str
+    okved_1: str
+    okved_2: str
+    okved_3: str
+    revenue: Optional[float]
+    growth_rate: Optional[float]
     owner: str
 
+    def to_company(self) -> Company:
+        return Company(**self._asdict())
+
+
+@dataclass
+class SaveResult:
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+
+_INSERT_SQL = '''
+    INSERT INTO companies (
+        inn, name, okved, okved_1, okved_2, okved_3,
+        revenue, growth_rate, owner
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(inn) DO
+'''
+
+UPSERT_SQL = {
+    'ignore': _INSERT_SQL + ' NOTHING',
+    # Строка без изменений не обновляется и считается пропущенной
+    'update': _INSERT_SQL + ''' UPDATE SET
+        revenue = excluded.revenue,
+        growth_rate = excluded.growth_rate,
+        okved = excluded.okved,
+        okved_1 = excluded.okved_1,
+        okved_2 = excluded.okved_2,
+        okved_3 = excluded.okved_3
+    WHERE revenue IS NOT excluded.revenue
+        OR growth_rate IS NOT excluded.growth_rate
+        OR okved IS NOT excluded.okved
+    ''',
+    # Только показатели: ОКВЭД остается от первой записи компании, даже если
+    # она есть в листингах нескольких под-ОКВЭД (так сохраняет обход)
+    'refresh': _INSERT_SQL + ''' UPDATE SET
+        revenue = excluded.revenue,
+        growth_rate = excluded.growth_rate
+    WHERE revenue IS NOT excluded.revenue
+        OR growth_rate IS NOT excluded.growth_rate
+    ''',
+}
+
+# Ограничение SQLite на число параметров в одном запросе (для старых версий)
+SQL_VARIABLES_LIMIT = 999
+
+# Настройки соединения: WAL позволяет читать во время записи, а NORMAL
+# в режиме WAL безопасен и не делает fsync на каждый коммит
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,  # 64 МБ (отрицательное значение - в КиБ)
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,  # мс ожидания блокировки вместо "database is locked"
+}
+
+
+# Сводка по okved_1 (level 1, okved_2 = '') и по паре okved_1/okved_2 (level 2).
+# Поддерживается триггерами в той же транзакции, что и запись в companies;
+# version растет при каждом изменении группы
+SUMMARY_LEVELS = {1: "''", 2: "COALESCE({row}.okved_2, '')"}
+
+_SUMMARY_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS okved_summary (
+        level INTEGER NOT NULL,
+        okved_1 TEXT NOT NULL,
+        okved_2 TEXT NOT NULL,
+        companies INTEGER NOT NULL DEFAULT 0,
+        revenue_count INTEGER NOT NULL DEFAULT 0,
+        revenue_sum REAL NOT NULL DEFAULT 0,
+        revenue_sumsq REAL NOT NULL DEFAULT 0,
+        growth_count INTEGER NOT NULL DEFAULT 0,
+        growth_sum REAL NOT NULL DEFAULT 0,
+        growth_sumsq REAL NOT NULL DEFAULT 0,
+        positive_growth INTEGER NOT NULL DEFAULT 0,
+        version INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (level, okved_1, okved_2)
+    )
+'''
+
+SUMMARY_COUNTERS = [
+    'companies', 'revenue_count', 'revenue_sum', 'revenue_sumsq',
+    'growth_count', 'growth_sum', 'growth_sumsq', 'positive_growth',
+]
+
+
+def _numeric(expression: str) -> str:
+    """Значение только для чисел: строка '-' в growth_rate не попадает в суммы"""
+    return f"(CASE WHEN typeof({expression}) IN ('integer', 'real') THEN {expression} END)"
+
+
+def _number(value) -> Optional[float]:
+    """Число для REAL-колонки; строки вроде '-' сохраняются как NULL (CHECK схемы v2)"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _summary_values(row: str) -> List[str]:
+    """Вклад строки NEW/OLD в счетчики сводки (в порядке SUMMARY_COUNTERS)"""
+    revenue = _numeric(f'{row}.revenue')
+    growth = _numeric(f'{row}.growth_rate')
+    return [
+        '1',
+        f'({revenue} IS NOT NULL)', f'COALESCE({revenue}, 0)', f'COALESCE({revenue} * {revenue}, 0)',
+        f'({growth} IS NOT NULL)', f'COALESCE({growth}, 0)', f'COALESCE({growth} * {growth}, 0)',
+        f'COALESCE({growth} > 0, 0)',
+    ]
+
+
+def _summary_statements(row: str, sign: str) -> str:
+    """UPSERT в сводку обоих уровней: sign '+' для NEW, '-' для OLD"""
+    values = _summary_values(row)
+    statements = []
+    for level, okved_2 in SUMMARY_LEVELS.items():
+        okved_2 = okved_2.format(row=row)
+        signed = values if sign == '+' else [f'-{value}' for value in values]
+        statements.append(f'''
+            INSERT INTO okved_summary (level, okved_1, okved_2, {', '.join(SUMMARY_COUNTERS)}, version)
+            VALUES ({level}, COALESCE({row}.okved_1, ''), {okved_2}, {', '.join(signed)}, 1)
+            ON CONFLICT (level, okved_1, okved_2) DO UPDATE SET
+                {', '.join(f'{column} = {column} + excluded.{column}' for column in SUMMARY_COUNTERS)},
+                version = version + 1;
+        ''')
+    return ''.join(statements)
+
+
+SUMMARY_TRIGGERS = {
+    'companies_summary_insert': f'''
+        CREATE TRIGGER IF NOT EXISTS companies_summary_insert AFTER INSERT ON companies
+        BEGIN {_summary_statements('NEW', '+')} END
+    ''',
+    'companies_summary_delete': f'''
+        CREATE TRIGGER IF NOT EXISTS companies_summary_delete AFTER DELETE ON companies
+        BEGIN {_summary_statements('OLD', '-')} END
+    ''',
+    'companies_summary_update': f'''
+        CREATE TRIGGER IF NOT EXISTS companies_summary_update AFTER UPDATE ON companies
+        BEGIN {_summary_statements('OLD', '-')} {_summary_statements('NEW', '+')} END
+    ''',
+}
+
+# Сводка, посчитанная заново по companies (для перестроения и проверки)
+_SUMMARY_FROM_COMPANIES_SQL = ' UNION ALL '.join(f'''
+    SELECT {level} AS level, COALESCE(okved_1, '') AS okved_1, {okved_2} AS okved_2,
+        {', '.join(f'SUM({value}) AS {column}' for value, column in zip(_summary_values('companies'), SUMMARY_COUNTERS))}
+    FROM companies
+    GROUP BY 1, 2, 3
+''' for level, okved_2 in ((level, okved_2.format(row='companies')) for level, okved_2 in SUMMARY_LEVELS.items()))
+
+# Допустимое относительное расхождение сумм: вычитание при UPDATE/DELETE
+# накапливает ошибку округления
+SUMMARY_TOLERANCE = 1e-9
+
+
+async def _create_summary(db: aiosqlite.Connection):
+    await db.execute(_SUMMARY_TABLE_SQL)
+    for trigger in SUMMARY_TRIGGERS.values():
+        await db.execute(trigger)
+    async with db.execute(
+        'SELECT EXISTS(SELECT 1 FROM companies) AND NOT EXISTS(SELECT 1 FROM okved_summary)'
+    ) as cursor:
+        missing = (await cursor.fetchone())[0]
+    if missing:
+        await _rebuild_summary(db)
+
+
+async def _rebuild_summary(db: aiosqlite.Connection):
+    async with db.execute('SELECT COALESCE(MAX(version), 0) FROM okved_summary') as cursor:
+        version = (await cursor.fetchone())[0] + 1
+    await db.execute('DELETE FROM okved_summary')
+    await db.execute(f'''
+        INSERT INTO okved_summary (level, okved_1, okved_2, {', '.join(SUMMARY_COUNTERS)}, version)
+        SELECT level, okved_1, okved_2, {', '.join(SUMMARY_COUNTERS)}, ? FROM ({_SUMMARY_FROM_COMPANIES_SQL})
+    ''', (version,))
+    logger.info("Сводка okved_summary перестроена")
+
+
+def _companies_table_sql(name: str, strict: bool, without_rowid: bool = False) -> str:
+    """strict - в числовых колонках только числа или NULL (схема v2)"""
+    def numeric(column: str) -> str:
+        if not strict:
+            return f'{column} REAL'
+        return f"{column} REAL CHECK ({column} IS NULL OR typeof({column}) IN ('real', 'integer'))"
+
+    return f'''
+        CREATE TABLE IF NOT EXISTS {name} (
+            inn TEXT {'NOT NULL ' if without_rowid else ''}PRIMARY KEY,
+            name TEXT,
+            okved TEXT,
+            okved_1 TEXT,
+            okved_2 TEXT,
+            okved_3 TEXT,
+            {numeric('revenue')},
+            {numeric('growth_rate')},
+            owner TEXT
+        ){' WITHOUT ROWID' if without_rowid else ''}
+    '''
+
+
+# Индексы схемы v2: выборки по ОКВЭД (get_processed_okveds, анализ по
+# отраслям, перестроение сводки) и фильтр по выручке в analyze_outliers.py
+COMPANIES_INDEXES = {
+    'idx_companies_okved_1_2': 'CREATE INDEX IF NOT EXISTS idx_companies_okved_1_2 ON companies (okved_1, okved_2)',
+    'idx_companies_revenue': 'CREATE INDEX IF NOT EXISTS idx_companies_revenue ON companies (revenue)',
+    'idx_companies_okved': 'CREATE INDEX IF NOT EXISTS idx_companies_okved ON companies (okved)',
+}
+
+
+async def _migrate_v1(db: aiosqlite.Connection, database: 'Database'):
+    """Исходная схема: companies и сводка okved_summary"""
+    await db.execute(_companies_table_sql('companies', strict=False))
+    await _create_summary(db)
+
+
+async def _migrate_v2(db: aiosqlite.Connection, database: 'Database'):
+    """
+    Пересоздание companies: строки вместо чисел ('-' в growth_rate)
+    становятся NULL и дальше запрещены CHECK, добавляются индексы.
+    """
+    await db.execute('DROP TABLE IF EXISTS companies_v2')
+    await db.execute(_companies_table_sql('companies_v2', strict=True, without_rowid=database.without_rowid))
+    await db.execute(f'''
+        INSERT INTO companies_v2 (inn, name, okved, okved_1, okved_2, okved_3, revenue, growth_rate, owner)
+        SELECT inn, name, okved, okved_1, okved_2, okved_3,
+            {_numeric('revenue')}, {_numeric('growth_rate')}, owner
+        FROM companies WHERE inn IS NOT NULL
+    ''')
+    # Вместе с таблицей удаляются и триггеры сводки
+    await db.execute('DROP TABLE companies')
+    await db.execute('ALTER TABLE companies_v2 RENAME TO companies')
+    for index in COMPANIES_INDEXES.values():
+        await db.execute(index)
+    for trigger in SUMMARY_TRIGGERS.values():
+        await db.execute(trigger)
+    await _rebuild_summary(db)
+    await db.execute('ANALYZE companies')
+
+
+MIGRATIONS = {
+    1: _migrate_v1,
+    2: _migrate_v2,
+}
+SCHEMA_VERSION = max(MIGRATIONS)
+
+
 class Database:
-    def __init__(self, db_name: str = "companies.db"):
+    def __init__(self, db_name: str = "companies.db", pool_size: int = 3, without_rowid: bool = False):
         self.db_name = db_name
+        self.pool_size = pool_size
+        # Для новой схемы: таблица companies без rowid с ключом inn
+        self.without_rowid = without_rowid
+        self._pool: Optional[asyncio.Queue] = None
+        self._connections: List[aiosqlite.Connection] = []
+
+    async def open(self):
+        """Открывает пул долгоживущих соединений"""
+        if self._pool is not None:
+            return
+        self._pool = asyncio.Queue()
+        try:
+            for _ in range(self.pool_size):
+                conn = await aiosqlite.connect(self.db_name)
+                await self._configure(conn)
+                self._connections.append(conn)
+                self._pool.put_nowait(conn)
+        except Exception:
+            await self.close()
+            raise
+        logger.info(f"Открыт пул из {self.pool_size} соединений к {self.db_name}")
+
+    async def close(self):
+        """Закрывает все соединения пула"""
+        for conn in self._connections:
+            await conn.close()
+        self._connections = []
+        self._pool = None
+
+    async def __aenter__(self) -> 'Database':
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @staticmethod
+    async def _configure(conn: aiosqlite.Connection):
+        for name, value in PRAGMAS.items():
+            await conn.execute(f'PRAGMA {name} = {value}')
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Выдает соединение из пула.
+        Если пул не открыт, соединение создается на время вызова, как раньше.
+        """
+        if self._pool is None:
+            async with aiosqlite.connect(self.db_name) as conn:
+                yield conn
+            return
+
+        conn = await self._pool.get()
+        try:
+            yield conn
+        finally:
+            # Незавершенная транзакция не должна достаться следующему вызову
+            if conn.in_transaction:
+                await conn.rollback()
+            self._pool.put_nowait(conn)
 
     async def create_table(self):
-        async with aiosqlite.connect(self.db_name) as db:
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS companies (
-                    inn TEXT PRIMARY KEY,
-                    name TEXT,
-                    okved TEXT,
-                    okved_1 TEXT,
-                    okved_2 TEXT,
-                    okved_3 TEXT,
-                    revenue REAL,
-                    growth_rate REAL,
-                    owner TEXT
-                )
-            ''')
-            logger.info("Таблица companies создана")
+        """Создает или обновляет схему базы до SCHEMA_VERSION"""
+        await self.migrate()
+
+    async def migrate(self) -> int:
+        """
+        Применяет недостающие миграции по PRAGMA user_version. Каждая миграция -
+        отдельная транзакция вместе с новым номером версии, поэтому прерванная
+        миграция откатывается целиком, а процессы, стартующие одновременно,
+        не применяют ее дважды.
+        """
+        async with self.connection() as db:
+            for version, migration in MIGRATIONS.items():
+                await db.execute('BEGIN IMMEDIATE')
+                async with db.execute('PRAGMA user_version') as cursor:
+                    current = (await cursor.fetchone())[0]
+                if current >= version:
+                    await db.rollback()
+                    continue
+                await migration(db, self)
+                await db.execute(f'PRAGMA user_version = {version}')
+                await db.commit()
+                logger.info(f"Схема базы обновлена до версии {version}")
+            async with db.execute('PRAGMA user_version') as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def create_summary(self):
+        """Таблица okved_summary и триггеры; для уже заполненной companies сводка строится сразу"""
+        async with self.connection() as db:
+            await db.execute('BEGIN IMMEDIATE')
+            await _create_summary(db)
             await db.commit()
 
+    async def rebuild_summary(self):
+        """
+        Пересчитывает okved_summary по companies. Версии всех групп становятся
+        больше прежних, поэтому закэшированные по ним результаты устаревают.
+        """
+        async with self.connection() as db:
+            await db.execute('BEGIN IMMEDIATE')
+            await _rebuild_summary(db)
+            await db.commit()
+
+    async def check_summary(self, rebuild: bool = False) -> List[str]:
+        """
+        Сравнивает okved_summary с пересчетом по companies. Возвращает описания
+        расхождений; rebuild=True перестраивает сводку, если они есть.
+        """
+        columns = ', '.join(SUMMARY_COUNTERS)
+        async with self.connection() as db:
+            async with db.execute(f'SELECT level, okved_1, okved_2, {columns} FROM okved_summary') as cursor:
+                stored = {tuple(row[:3]): row[3:] for row in await cursor.fetchall()}
+            async with db.execute(f'SELECT level, okved_1, okved_2, {columns} FROM ({_SUMMARY_FROM_COMPANIES_SQL})') as cursor:
+                actual = {tuple(row[:3]): row[3:] for row in await cursor.fetchall()}
+
+        problems = []
+        empty = (0,) * len(SUMMARY_COUNTERS)
+        for key in sorted(set(stored) | set(actual)):
+            # Группа, из которой удалили все строки, остается в сводке с нулями
+            stored_row, actual_row = stored.get(key, empty), actual.get(key, empty)
+            for column, stored_value, actual_value in zip(SUMMARY_COUNTERS, stored_row, actual_row):
+                if abs(stored_value - actual_value) > SUMMARY_TOLERANCE * max(abs(actual_value), 1):
+                    problems.append(f"{key}: {column} = {stored_value}, по companies {actual_value}")
+        if problems:
+            logger.warning(f"Сводка okved_summary расходится с companies: {len(problems)} значений")
+            if rebuild:
+                await self.rebuild_summary()
+        return problems
+
+    async def get_okved_summary(self, level: int = 1) -> List[dict]:
+        """Строки сводки уровня level (1 - okved_1, 2 - okved_1/okved_2) с непустыми группами"""
+        async with self.connection() as db:
+            async with db.execute(
+                'SELECT * FROM okved_summary WHERE level = ? AND companies > 0 ORDER BY okved_1, okved_2', (level,)
+            ) as cursor:
+                names = [description[0] for description in cursor.description]
+                return [dict(zip(names, row)) for row in await cursor.fetchall()]
+
+    async def export_snapshot(self, path: str = 'companies_snapshot') -> dict:
+        """Колоночный снимок companies для быстрого старта анализа (см. snapshot.py)"""
+        from snapshot import write_snapshot
+        return await asyncio.to_thread(write_snapshot, self.db_name, path)
+
     async def company_exists(self, inn: str) -> bool:
         """Проверяет, существует ли компания с данным ИНН в базе"""
-        async with aiosqlite.connect(self.db_name) as db:
+        async with self.connection() as db:
             async with db.execute('SELECT 1 FROM companies WHERE inn = ?', (inn,)) as cursor:
                 return await cursor.fetchone() is not None
 
-    async def save_companies(self, companies: List[Company]):
-        async with aiosqlite.connect(self.db_name) as db:
-            for company in companies:
-                if not await self.company_exists(company.inn):
-                    await db.execute('''
-                        INSERT INTO companies (
-                            inn, name, okved, okved_1, okved_2, okved_3,
-                            revenue, growth_rate, owner
-                        )
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        company.inn, company.name, company.okved,
-                        company.okved_1, company.okved_2, company.okved_3,
-                        company.revenue, company.growth_rate, company.owner
-                    ))
+    async def save_companies(self, companies: List[Company], on_conflict: str = 'ignore') -> SaveResult:
+        """
+        Сохраняет компании одним пакетным UPSERT.
+        on_conflict='ignore' - уже известные ИНН пропускаются,
+        on_conflict='update' - у них обновляются revenue, growth_rate и ОКВЭД,
+        on_conflict='refresh' - только revenue и growth_rate.
+        """
+        if on_conflict not in UPSERT_SQL:
+            raise ValueError(f"Неизвестный режим on_conflict: {on_conflict}")
+        if not companies:
+            return SaveResult()
+
+        async with self.connection() as db:
+            result = await self._upsert(db, companies, on_conflict)
+            await db.commit()
+        return result
+
+    async def save_company_batches(self, batches: List[List[Company]], on_conflict: str = 'ignore',
+                                   before_commit: Optional[Callable[[aiosqlite.Connection], Awaitable]] = None
+                                   ) -> List[SaveResult]:
+        """
+        Сохраняет несколько пакетов (например, страниц) в одной транзакции,
+        результат - по каждому пакету. before_commit(conn) выполняется в той же
+        транзакции, так что его изменения фиксируются только вместе с компаниями.
+        """
+        if on_conflict not in UPSERT_SQL:
+            raise ValueError(f"Неизвестный режим on_conflict: {on_conflict}")
+        async with self.connection() as db:
+            results = []
+            for companies in batches:
+                results.append(await self._upsert(db, companies, on_conflict) if companies else SaveResult())
+            if before_commit is not None:
+                await before_commit(db)
             await db.commit()
+        return results
+
+    async def _upsert(self, db: aiosqlite.Connection, companies: List[Company], on_conflict: str) -> SaveResult:
+        """UPSERT пакета без фиксации транзакции"""
+        rows = companies
+        if on_conflict != 'ignore':
+            # Повтор ИНН в пакете иначе считался бы и вставкой, и обновлением;
+            # остается последняя строка, повторы считаются пропущенными
+            rows = list({company.inn: company for company in companies}.values())
+        params = [(
+            company.inn, company.name, company.okved,
+            company.okved_1, company.okved_2, company.okved_3,
+            _number(company.revenue), _number(company.growth_rate), company.owner
+        ) for company in rows]
+        unique_inns = list({company.inn for company in rows})
+
+        existing = 0
+        if on_conflict != 'ignore':
+            # Чтобы отличить вставки от обновлений, один раз считаем уже известные ИНН
+            for i in range(0, len(unique_inns), SQL_VARIABLES_LIMIT):
+                chunk = unique_inns[i:i + SQL_VARIABLES_LIMIT]
+                placeholders = ', '.join('?' * len(chunk))
+                async with db.execute(
+                    f'SELECT COUNT(*) FROM companies WHERE inn IN ({placeholders})', chunk
+                ) as cursor:
+                    existing += (await cursor.fetchone())[0]
+
+        # rowcount, в отличие от total_changes, не включает изменения okved_summary из триггеров
+        cursor = await db.executemany(UPSERT_SQL[on_conflict], params)
+        changes = cursor.rowcount
+
+        if on_conflict != 'ignore':
+            inserted = len(unique_inns) - existing
+            updated = changes - inserted
+        else:
+            inserted = changes
+            updated = 0
+        return SaveResult(inserted=inserted, updated=updated, skipped=len(companies) - inserted - updated)
 
     async def get_company_by_inn(self, inn: str) -> Optional[Company]:
-        async with aiosqlite.connect(self.db_name) as db:
+        async with self.connection() as db:
             async with db.execute(
                 'SELECT * FROM companies WHERE inn = ?', 
                 (inn,)
@@ -82,39 +536,75 @@ class Database:
                     )
                 return None
 
+    async def _iter_rows(self, columns: Sequence[str], batch_size: int,
+                         where: Optional[str], params: Sequence) -> AsyncIterator[list]:
+        """Строки SELECT columns FROM companies [WHERE where] пакетами по batch_size"""
+        unknown = set(columns) - set(COMPANY_COLUMNS)
+        if unknown:
+            raise ValueError(f"Неизвестные колонки companies: {sorted(unknown)}")
+        query = f"SELECT {', '.join(columns)} FROM companies"
+        if where:
+            query += f" WHERE {where}"
+        # Соединение занято, пока генератор не дочитан или не закрыт
+        async with self.connection() as db:
+            async with db.execute(query, params) as cursor:
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    yield rows
+
+    async def iter_company_batches(self, batch_size: int = 1000, where: Optional[str] = None,
+                                   params: Sequence = ()) -> AsyncIterator[List[CompanyRecord]]:
+        """
+        Компании пакетами CompanyRecord. where - условие SQL с плейсхолдерами
+        для params, например 'okved_1 = ?'. При досрочном выходе из цикла
+        генератор стоит закрыть (contextlib.aclosing), чтобы вернуть соединение в пул.
+        """
+        async for rows in self._iter_rows(COMPANY_COLUMNS, batch_size, where, params):
+            yield [CompanyRecord._make(row) for row in rows]
+
+    async def iter_companies(self, batch_size: int = 1000, where: Optional[str] = None,
+                             params: Sequence = ()) -> AsyncIterator[CompanyRecord]:
+        """Компании по одной; из базы читаются пакетами по batch_size (см. iter_company_batches)"""
+        async for batch in self.iter_company_batches(batch_size, where, params):
+            for record in batch:
+                yield record
+
+    async def iter_company_columns(self, columns: Sequence[str] = COMPANY_COLUMNS, batch_size: int = 100_000,
+                                   where: Optional[str] = None, params: Sequence = ()) -> AsyncIterator[Dict]:
+        """
+        Пакеты в виде колонок для анализа: {колонка: numpy-массив}. revenue и
+        growth_rate - float64 с NaN вместо NULL, остальные - массивы объектов.
+        """
+        import numpy as np
+        async for rows in self._iter_rows(columns, batch_size, where, params):
+            batch = {}
+            for column, values in zip(columns, zip(*rows)):
+                if column in NUMERIC_COLUMNS:
+                    batch[column] = np.array(values, dtype=np.float64)
+                else:
+                    batch[column] = np.array(values, dtype=object)
+            yield batch
+
     async def get_all_companies(self) -> List[Company]:
-        async with aiosqlite.connect(self.db_name) as db:
-            async with db.execute('SELECT * FROM companies') as cursor:
-                rows = await cursor.fetchall()
-                return [Company(
-                    inn=row[0],
-                    name=row[1],
-                    okved=row[2],
-                    okved_1=row[3],
-                    okved_2=row[4],
-                    okved_3=row[5],
-                    revenue=row[6],
-                    growth_rate=row[7],
-                    owner=row[8]
-                ) for row in rows]
-
-    async def show_results(self):
-        async with aiosqlite.connect(self.db_name) as db:
-            async with db.execute('SELECT * FROM companies') as cursor:
-                rows = await cursor.fetchall()
-                for row in rows:
-                    print("=== Company {} ===".format(row[1]))
-                    print(f"INN:", row[0])
-                    print(f"Name:", row[1])
-                    print(f"OKVED:", row[2])
-                    print(f"Revenue:", row[6])
-                    print(f"Growth Rate:", row[7])
-                    print(f"Owner:", row[8])
-                    print()
+        """Все компании списком; для больших таблиц лучше iter_companies"""
+        return [record.to_company() async for record in self.iter_companies()]
+
+    async def show_results(self, batch_size: int = 1000):
+        async for record in self.iter_companies(batch_size):
+            print("=== Company {} ===".format(record.name))
+            print(f"INN:", record.inn)
+            print(f"Name:", record.name)
+            print(f"OKVED:", record.okved)
+            print(f"Revenue:", record.revenue)
+            print(f"Growth Rate:", record.growth_rate)
+            print(f"Owner:", record.owner)
+            print()
 
     async def get_total_companies(self) -> int:
         """Возвращает общее количество компаний в базе"""
-        async with aiosqlite.connect(self.db_name) as db:
+        async with self.connection() as db:
             async with db.execute('SELECT COUNT(*) FROM companies') as cursor:
                 row = await cursor.fetchone()
                 return row[0] if row else 0 
\ No newline at end of file
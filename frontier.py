@@ -0,0 +1,219 @@
+import logging
+import os
+import socket
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiosqlite
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+# Страница 0 - служебная задача ОКВЭД: определить число страниц
+DISCOVERY_PAGE = 0
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+STOPPED = 'stopped'
+FAILED = 'failed'
+
+
+@dataclass
+class FrontierTask:
+    url: str
+    page: int
+    attempts: int
+    lease_owner: str
+    last_page: Optional[int] = None
+
+
+class CrawlFrontier:
+    """
+    Очередь страниц обхода в таблице crawl_frontier.
+    Воркеры берут страницы в аренду на lease_seconds; аренда, не закрытая
+    за это время (процесс упал), снова становится доступной. Страницы одного
+    ОКВЭД выдаются по порядку и не более одной одновременно, чтобы
+    досрочная остановка по низкой выручке работала как при обычном обходе.
+    Таблица общая для всех процессов pars3 на одной базе.
+    """
+
+    def __init__(self, db: Database, owner: Optional[str] = None,
+                 lease_seconds: float = 300, max_attempts: int = 3):
+        self.db = db
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    async def create_table(self):
+        async with self.db.connection() as conn:
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS crawl_frontier (
+                    url TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_page INTEGER,
+                    stop_reason TEXT,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    updated_at REAL,
+                    PRIMARY KEY (url, page)
+                )
+            ''')
+            await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_crawl_frontier_status
+                ON crawl_frontier (status, url, page)
+            ''')
+            await conn.commit()
+
+    async def seed(self, urls: Iterable[str]) -> int:
+        """Добавляет ОКВЭД, которых еще нет в очереди. Возвращает число новых"""
+        now = time.time()
+        async with self.db.connection() as conn:
+            changes_before = conn.total_changes
+            await conn.executemany(
+                'INSERT OR IGNORE INTO crawl_frontier (url, page, updated_at) VALUES (?, ?, ?)',
+                [(url, DISCOVERY_PAGE, now) for url in urls]
+            )
+            await conn.commit()
+            return conn.total_changes - changes_before
+
+    async def reset(self, urls: Iterable[str]):
+        """Забывает прогресс по ОКВЭД, чтобы обойти их заново"""
+        async with self.db.connection() as conn:
+            await conn.executemany('DELETE FROM crawl_frontier WHERE url = ?', [(url,) for url in urls])
+            await conn.commit()
+
+    async def claim(self, worker: str = '', prefer_url: Optional[str] = None) -> Optional[FrontierTask]:
+        """
+        Берет в аренду следующую страницу. Предпочитает prefer_url, чтобы воркер
+        дорабатывал свой ОКВЭД. None - свободных страниц сейчас нет.
+        """
+        now = time.time()
+        async with self.db.connection() as conn:
+            # IMMEDIATE сразу берет блокировку записи: выбор и аренда атомарны
+            # и для других процессов
+            await conn.execute('BEGIN IMMEDIATE')
+            # Аренда истекла на последней попытке: страница, вероятно, роняет
+            # или вешает процесс - больше не выдается
+            cursor = await conn.execute('''
+                UPDATE crawl_frontier
+                SET status = 'failed', stop_reason = 'lease expired',
+                    lease_owner = NULL, lease_expires = NULL, updated_at = :now
+                WHERE status = 'leased' AND lease_expires < :now AND attempts >= :max_attempts
+            ''', {'now': now, 'max_attempts': self.max_attempts})
+            if cursor.rowcount:
+                logger.warning(f"Страниц с истекшей арендой после {self.max_attempts} попыток: {cursor.rowcount}, "
+                               f"помечены неудачными")
+            async with conn.execute('''
+                SELECT url, page, attempts, last_page FROM crawl_frontier AS f
+                WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < :now
+                                              AND attempts < :max_attempts))
+                AND NOT EXISTS (
+                    SELECT 1 FROM crawl_frontier AS g
+                    WHERE g.url = f.url AND g.page != f.page
+                    AND g.status = 'leased' AND g.lease_expires >= :now
+                )
+                ORDER BY (url = :prefer) DESC, url, page
+                LIMIT 1
+            ''', {'now': now, 'prefer': prefer_url, 'max_attempts': self.max_attempts}) as cursor:
+                row = await cursor.fetchone()
+            if row is None:
+                await conn.commit()
+                return None
+            url, page, attempts, last_page = row
+            lease_owner = f"{self.owner}:{worker}"
+            await conn.execute('''
+                UPDATE crawl_frontier
+                SET status = 'leased', attempts = attempts + 1,
+                    lease_owner = ?, lease_expires = ?, updated_at = ?
+                WHERE url = ? AND page = ?
+            ''', (lease_owner, now + self.lease_seconds, now, url, page))
+            await conn.commit()
+        return FrontierTask(url=url, page=page, attempts=attempts + 1, lease_owner=lease_owner, last_page=last_page)
+
+    async def _finish(self, task: FrontierTask, status: str,
+                      stop_reason: Optional[str] = None, last_page: Optional[int] = None):
+        async with self.db.connection() as conn:
+            cursor = await conn.execute('''
+                UPDATE crawl_frontier
+                SET status = ?, stop_reason = ?, last_page = COALESCE(?, last_page),
+                    lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                WHERE url = ? AND page = ? AND lease_owner = ?
+            ''', (status, stop_reason, last_page, time.time(), task.url, task.page, task.lease_owner))
+            if cursor.rowcount == 0:
+                # Аренда истекла и страницу забрал другой воркер - результат
+                # уже сохранен, повторная запись в базу безопасна
+                logger.warning(f"Аренда страницы {task.page} {task.url} потеряна")
+            await conn.commit()
+
+    async def expand(self, task: FrontierTask, last_page: int, first_page: int = 1,
+                     stop_reason: Optional[str] = None):
+        """
+        Закрывает задачу определения страниц и ставит в очередь страницы first_page..last_page.
+        stop_reason - почему обходятся не все страницы ОКВЭД.
+        """
+        now = time.time()
+        async with self.db.connection() as conn:
+            await conn.executemany('''
+                INSERT OR IGNORE INTO crawl_frontier (url, page, last_page, updated_at)
+                VALUES (?, ?, ?, ?)
+            ''', [(task.url, page, last_page, now) for page in range(first_page, last_page + 1)])
+            await conn.commit()
+        await self._finish(task, DONE, stop_reason=stop_reason, last_page=last_page)
+
+    async def complete(self, task: FrontierTask):
+        await self._finish(task, DONE)
+
+    async def stop(self, task: FrontierTask, reason: str):
+        """Досрочная остановка ОКВЭД: оставшиеся страницы не обходятся"""
+        await self._finish(task, DONE, stop_reason=reason)
+        async with self.db.connection() as conn:
+            await conn.execute('''
+                UPDATE crawl_frontier
+                SET status = 'stopped', stop_reason = ?, updated_at = ?
+                WHERE url = ? AND page > ? AND status = 'pending'
+            ''', (reason, time.time(), task.url, task.page))
+            await conn.commit()
+
+    async def finish_saved(self, conn: aiosqlite.Connection, pages: List[Tuple[FrontierTask, Optional[str]]]):
+        """
+        Закрывает страницы (задача, причина остановки или None) в транзакции
+        conn, в которой записываются их компании: страница считается пройденной
+        только вместе с сохраненными данными. Без фиксации транзакции.
+        """
+        now = time.time()
+        await conn.executemany('''
+            UPDATE crawl_frontier
+            SET status = ?, stop_reason = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?
+            WHERE url = ? AND page = ? AND lease_owner = ?
+        ''', [(DONE, reason, now, task.url, task.page, task.lease_owner) for task, reason in pages])
+        await conn.executemany('''
+            UPDATE crawl_frontier
+            SET status = 'stopped', stop_reason = ?, updated_at = ?
+            WHERE url = ? AND page > ? AND status = 'pending'
+        ''', [(reason, now, task.url, task.page) for task, reason in pages if reason])
+
+    async def fail(self, task: FrontierTask, error: str):
+        """Возвращает страницу в очередь или помечает ее неудачной после max_attempts попыток"""
+        status = FAILED if task.attempts >= self.max_attempts else PENDING
+        await self._finish(task, status, stop_reason=error[:200])
+
+    async def has_work(self) -> bool:
+        """Есть ли страницы в очереди или в чужой аренде (она может добавить новые)"""
+        async with self.db.connection() as conn:
+            async with conn.execute(
+                "SELECT 1 FROM crawl_frontier WHERE status IN ('pending', 'leased') LIMIT 1"
+            ) as cursor:
+                return await cursor.fetchone() is not None
+
+    async def stats(self) -> Dict[str, int]:
+        async with self.db.connection() as conn:
+            async with conn.execute(
+                'SELECT status, COUNT(*) FROM crawl_frontier WHERE page != ? GROUP BY status',
+                (DISCOVERY_PAGE,)
+            ) as cursor:
+                return {status: count for status, count in await cursor.fetchall()}
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from typing import List, Optional, Set, Tuple
+
+from card_parser import (
+    MAX_PAGES, CardResult, filter_sub_okved_hrefs, has_company_cards,
+    parse_company_cards, parse_last_page, parse_listing_probe, parse_okved_links
+)
+from crawl_metrics import CACHE_WRITE, HTTP_FETCH, PARSE, metrics
+from page_cache import LISTING, OKVED, PageCache
+from rate_limiter import HostRateLimiter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'User-Agent': (
+        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+        '(KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+    ),
+    'Accept': 'text/html,application/xhtml+xml',
+    'Accept-Language': 'ru-RU,ru;q=0.9',
+}
+
+
+class HttpFetcher:
+    """
+    Асинхронный HTTP-клиент с ограниченным пулом keep-alive соединений.
+    С limiter каждый запрос ждет своей очереди в лимитере хоста.
+    С cache загруженные страницы сохраняются в кэш страниц (kind - вид страницы).
+    """
+
+    def __init__(self, max_connections: int = 20, timeout: float = 30.0, headers: Optional[dict] = None,
+                 limiter: Optional[HostRateLimiter] = None, cache: Optional[PageCache] = None):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.headers = headers or DEFAULT_HEADERS
+        self.limiter = limiter
+        self.cache = cache
+        self._session = None
+
+    async def open(self):
+        import aiohttp
+
+        if self._session is not None:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_connections,
+            keepalive_timeout=30,
+            ttl_dns_cache=300,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers=self.headers,
+        )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> 'HttpFetcher':
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def fetch(self, url: str, kind: str = LISTING) -> str:
+        """HTML страницы; ответы с кодом 4xx/5xx поднимают исключение"""
+        if self.limiter is None:
+            html = await self._get(url)
+        else:
+            async with self.limiter.request(url):
+                html = await self._get(url)
+        if self.cache is not None:
+            # Сжатие и запись на диск - в потоке
+            with metrics.stage(CACHE_WRITE):
+                await asyncio.to_thread(self.cache.put, url, html, kind)
+        return html
+
+    async def _get(self, url: str) -> str:
+        with metrics.stage(HTTP_FETCH):
+            async with self._session.get(url) as response:
+                response.raise_for_status()
+                return await response.text()
+
+
+class HttpBackend:
+    """
+    Загрузка листингов ОКВЭД по HTTP без браузера.
+    Возвращает те же результаты, что и Selenium: карточки разбираются
+    card_parser'ом. Страницы, где карточки строятся JavaScript'ом
+    (в HTML их нет), передаются запасному бэкенду. Карточки с ИНН из known
+    не разбираются дальше поля ИНН (кроме разбора в пуле процессов).
+    """
+
+    def __init__(self, fetcher: HttpFetcher, fallback=None, parse_executor=None, known=None):
+        self.fetcher = fetcher
+        self.fallback = fallback
+        self.parse_executor = parse_executor
+        # В другой процесс набор ИНН не передается
+        self.known = known if parse_executor is None else None
+
+    async def get_sub_okved_links(self, okved_url: str) -> Set[str]:
+        try:
+            html = await self.fetcher.fetch(okved_url, OKVED)
+            sub_links = filter_sub_okved_hrefs(parse_okved_links(html, okved_url), okved_url)
+        except Exception as e:
+            logger.error(f"Ошибка при получении под-категорий ОКВЭД: {e}")
+            return set()
+        if not sub_links and self.fallback is not None:
+            return await self.fallback.get_sub_okved_links(okved_url)
+        return sub_links
+
+    async def get_last_page(self, url: str) -> int:
+        try:
+            html = await self.fetcher.fetch(url)
+            if self.fallback is not None and not has_company_cards(html):
+                return await self.fallback.get_last_page(url)
+            last_page = parse_last_page(html)
+        except Exception as e:
+            logger.error(f"Error getting last page: {e}")
+            return 1
+        logger.info(f"Найдена последняя страница: {last_page}, будут парситься только первые {min(MAX_PAGES, last_page)} страниц")
+        return min(MAX_PAGES, last_page)
+
+    async def probe_listing(self, full_url: str) -> Tuple[List[Optional[float]], int]:
+        """Выручка карточек страницы и номер последней страницы (для PagePlanner)"""
+        html = await self.fetcher.fetch(full_url)
+        if self.fallback is not None and not has_company_cards(html):
+            return await self.fallback.probe_listing(full_url)
+        return await asyncio.get_running_loop().run_in_executor(self.parse_executor, parse_listing_probe, html)
+
+    async def load_cards(self, full_url: str, okved: str) -> List[CardResult]:
+        html = await self.fetcher.fetch(full_url)
+        logger.info(f"Парсинг страницы: {full_url}")
+        # Разбор HTML нагружает процессор, выносим его из цикла событий
+        # (в пул процессов, если он задан, иначе в поток)
+        with metrics.stage(PARSE):
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.parse_executor, parse_company_cards, html, okved, self.known
+            )
+        if not results and self.fallback is not None:
+            logger.info(f"В HTML нет карточек, страница загружается браузером: {full_url}")
+            return await self.fallback.load_cards(full_url, okved)
+        return results
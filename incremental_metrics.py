@@ -0,0 +1,134 @@
+"""
+Инкрементальный расчет метрик по отраслям. Таблица okved_summary (ее ведут
+триггеры Database) говорит, какие okved_1 изменились с прошлого расчета:
+из companies загружаются только их строки, метрики и топ-10 остальных
+отраслей берутся из файла кэша.
+"""
+import logging
+import os
+import pickle
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from database import SQL_VARIABLES_LIMIT
+from industry_metrics import (
+    COMPANIES_QUERY, COMPANIES_WHERE, DEFAULT_WEIGHTS, METRIC_COLUMNS, ScoreWeights, add_perspective_score,
+    compute_group_metrics,
+)
+from report_writer import TOP_COLUMNS, top_by_group
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = 'industry_metrics_cache.pkl'
+
+# Ключ группы: версия из сводки и счетчики на случай, если сводку создали заново
+GroupKey = Tuple[int, int, float, float]
+
+
+@dataclass
+class MetricsCache:
+    keys: Dict[str, GroupKey] = field(default_factory=dict)
+    metrics: Dict[str, dict] = field(default_factory=dict)  # строки compute_group_metrics
+    tops: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    clean_key: str = ''  # параметры очистки, с которыми посчитан кэш
+
+
+def summary_keys(cnx: sqlite3.Connection) -> Optional[Dict[str, GroupKey]]:
+    """Ключи непустых групп okved_1 из okved_summary; None, если сводки в базе нет"""
+    try:
+        rows = cnx.execute('''
+            SELECT okved_1, version, companies, revenue_sum, growth_sum
+            FROM okved_summary WHERE level = 1 AND companies > 0
+        ''').fetchall()
+    except sqlite3.OperationalError:
+        return None
+    return {okved: tuple(key) for okved, *key in rows}
+
+
+def load_cache(path: str) -> MetricsCache:
+    if not os.path.exists(path):
+        return MetricsCache()
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        logger.warning(f"Кэш метрик {path} не прочитан, считаем заново: {e}")
+        return MetricsCache()
+
+
+def save_cache(path: str, cache: MetricsCache):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_companies(cnx: sqlite3.Connection, okveds: Optional[List[str]] = None) -> pd.DataFrame:
+    """Строки companies для анализа; okveds - только эти okved_1"""
+    if okveds is None:
+        return pd.read_sql_query(COMPANIES_QUERY, cnx)
+    query = f"SELECT * FROM companies WHERE {COMPANIES_WHERE}"
+    parts = []
+    for i in range(0, len(okveds), SQL_VARIABLES_LIMIT):
+        chunk = okveds[i:i + SQL_VARIABLES_LIMIT]
+        parts.append(pd.read_sql_query(
+            f"{query} AND okved_1 IN ({', '.join('?' * len(chunk))})", cnx, params=chunk
+        ))
+    return pd.concat(parts, ignore_index=True)
+
+
+def incremental_industry_metrics(
+    cnx: sqlite3.Connection,
+    clean: Callable[[pd.DataFrame], pd.DataFrame],
+    cache_path: str = DEFAULT_CACHE_PATH,
+    clean_key: str = '',
+    weights: ScoreWeights = DEFAULT_WEIGHTS,
+) -> Tuple[pd.DataFrame, Dict[str, pd.DataFrame], List[str]]:
+    """
+    Метрики в формате compute_industry_metrics и топ-10 по отраслям.
+    clean - очистка от выбросов внутри каждого okved_1. Возвращает также
+    список пересчитанных отраслей. clean_key описывает параметры clean:
+    кэш, посчитанный с другими, не используется.
+    """
+    keys = summary_keys(cnx)
+    cache = load_cache(cache_path) if keys is not None else MetricsCache()
+    if cache.clean_key != clean_key:
+        cache = MetricsCache()
+    if keys is None:
+        logger.info("В базе нет okved_summary, метрики считаются по всей таблице")
+        changed = None
+    else:
+        changed = sorted(okved for okved, key in keys.items() if cache.keys.get(okved) != key)
+
+    fresh_metrics, fresh_tops = [], {}
+    if changed is None or changed:
+        df_cleaned = clean(load_companies(cnx, changed))
+        if len(df_cleaned):
+            fresh_metrics = compute_group_metrics(df_cleaned).to_dict(orient='records')
+            fresh_tops = top_by_group(df_cleaned, TOP_COLUMNS)
+    refreshed = sorted(fresh_tops)
+
+    if keys is None:
+        keys = {okved: None for okved in refreshed}
+    # Отрасли, которых больше нет в сводке, выпадают из кэша
+    metrics = {okved: row for okved, row in cache.metrics.items() if okved in keys}
+    tops = {okved: top for okved, top in cache.tops.items() if okved in keys}
+    for okved in changed or []:
+        metrics.pop(okved, None)
+        tops.pop(okved, None)
+    for row in fresh_metrics:
+        metrics[row['okved']] = row
+    tops.update(fresh_tops)
+
+    if changed is not None:
+        save_cache(cache_path, MetricsCache(keys=keys, metrics=metrics, tops=tops, clean_key=clean_key))
+
+    # Порядок отраслей как у groupby по всей таблице - по возрастанию кода
+    table = pd.DataFrame([metrics[okved] for okved in sorted(metrics)], columns=METRIC_COLUMNS[:-1])
+    companies = table['company_count'].sum()
+    overall_revenue_mean = table['total_revenue'].sum() / companies if companies else float('nan')
+    logger.info(f"Пересчитано отраслей: {len(refreshed)}, из кэша: {len(table) - len(refreshed)}")
+    return add_perspective_score(table, overall_revenue_mean, weights), {okved: tops[okved] for okved in sorted(tops)}, refreshed
@@ -0,0 +1,119 @@
+from typing import NamedTuple, Optional
+
+import pandas as pd
+
+# Компании, попадающие в анализ
+MAX_ANALYSIS_REVENUE = 15000000000
+
+
+def companies_where(max_revenue: Optional[float] = MAX_ANALYSIS_REVENUE) -> str:
+    """Условие отбора компаний для анализа; max_revenue=None - без ограничения выручки"""
+    where = "revenue IS NOT NULL AND growth_rate IS NOT NULL"
+    return where if max_revenue is None else f"{where} AND revenue < {max_revenue}"
+
+
+COMPANIES_WHERE = companies_where()
+# Выборка оставляет почти все строки, поэтому полное чтение таблицы быстрее
+# поиска по idx_companies_revenue
+COMPANIES_QUERY = f"SELECT * FROM companies NOT INDEXED WHERE {COMPANIES_WHERE}"
+
+# Порядок колонок отчета General_Analysis
+METRIC_COLUMNS = [
+    'okved', 'company_count', 'avg_revenue', 'avg_growth', 'revenue_std', 'growth_std',
+    'revenue_cv', 'growth_cv', 'revenue_median', 'growth_median',
+    'revenue_q1', 'revenue_q3', 'growth_q1', 'growth_q3',
+    'revenue_iqr', 'growth_iqr', 'total_revenue', 'positive_growth_ratio', 'perspective_score',
+]
+
+# Веса оценки перспективности: средний рост, относительная выручка, доля растущих компаний
+GROWTH_WEIGHT = 0.4
+REVENUE_WEIGHT = 0.3
+POSITIVE_GROWTH_WEIGHT = 0.3
+
+
+class ScoreWeights(NamedTuple):
+    growth: float = GROWTH_WEIGHT
+    revenue: float = REVENUE_WEIGHT
+    positive_growth: float = POSITIVE_GROWTH_WEIGHT
+
+
+DEFAULT_WEIGHTS = ScoreWeights()
+
+
+def perspective_score(avg_growth, avg_revenue, positive_growth_ratio, overall_revenue_mean,
+                      weights: ScoreWeights = DEFAULT_WEIGHTS):
+    """Оценка перспективности отрасли"""
+    return (
+        avg_growth * weights.growth +
+        (avg_revenue / overall_revenue_mean) * weights.revenue +
+        positive_growth_ratio * weights.positive_growth
+    )
+
+
+def compute_group_metrics(df: pd.DataFrame, group_column: str = 'okved_1') -> pd.DataFrame:
+    """
+    Метрики по отраслям за один проход groupby, без perspective_score.
+    Отрасли идут в порядке первого появления в df.
+    """
+    frame = pd.DataFrame({
+        group_column: df[group_column],
+        'revenue': df['revenue'],
+        'growth_rate': df['growth_rate'],
+        'positive_growth': (df['growth_rate'] > 0).astype(float),
+    })
+    grouped = frame.groupby(group_column, sort=False)
+
+    stats = grouped.agg(
+        company_count=('revenue', 'size'),
+        avg_revenue=('revenue', 'mean'),
+        avg_growth=('growth_rate', 'mean'),
+        revenue_std=('revenue', 'std'),
+        growth_std=('growth_rate', 'std'),
+        total_revenue=('revenue', 'sum'),
+        positive_growth_ratio=('positive_growth', 'mean'),
+    )
+    # Все квантили обеих колонок одним вызовом
+    quantiles = grouped[['revenue', 'growth_rate']].quantile([0.25, 0.5, 0.75]).unstack()
+
+    metrics = pd.DataFrame({
+        'okved': stats.index,
+        'company_count': stats['company_count'].to_numpy(),
+        'avg_revenue': stats['avg_revenue'].to_numpy(),
+        'avg_growth': stats['avg_growth'].to_numpy(),
+        'revenue_std': stats['revenue_std'].to_numpy(),
+        'growth_std': stats['growth_std'].to_numpy(),
+        'revenue_cv': (stats['revenue_std'] / stats['avg_revenue'] * 100).to_numpy(),
+        'growth_cv': (stats['growth_std'] / stats['avg_growth'] * 100).to_numpy(),
+        'revenue_median': quantiles[('revenue', 0.5)].to_numpy(),
+        'growth_median': quantiles[('growth_rate', 0.5)].to_numpy(),
+        'revenue_q1': quantiles[('revenue', 0.25)].to_numpy(),
+        'revenue_q3': quantiles[('revenue', 0.75)].to_numpy(),
+        'growth_q1': quantiles[('growth_rate', 0.25)].to_numpy(),
+        'growth_q3': quantiles[('growth_rate', 0.75)].to_numpy(),
+        'revenue_iqr': (quantiles[('revenue', 0.75)] - quantiles[('revenue', 0.25)]).to_numpy(),
+        'growth_iqr': (quantiles[('growth_rate', 0.75)] - quantiles[('growth_rate', 0.25)]).to_numpy(),
+        'total_revenue': stats['total_revenue'].to_numpy(),
+        'positive_growth_ratio': (stats['positive_growth_ratio'] * 100).to_numpy(),
+    }, columns=METRIC_COLUMNS[:-1])
+    return metrics
+
+
+def add_perspective_score(metrics: pd.DataFrame, overall_revenue_mean: float,
+                          weights: ScoreWeights = DEFAULT_WEIGHTS) -> pd.DataFrame:
+    """Добавляет perspective_score и сортирует отрасли по нему по убыванию"""
+    metrics = metrics.copy()
+    metrics['perspective_score'] = perspective_score(
+        metrics['avg_growth'], metrics['avg_revenue'], metrics['positive_growth_ratio'], overall_revenue_mean,
+        weights
+    )
+    return metrics.sort_values('perspective_score', ascending=False)
+
+
+def compute_industry_metrics(df: pd.DataFrame, group_column: str = 'okved_1',
+                             weights: ScoreWeights = DEFAULT_WEIGHTS) -> pd.DataFrame:
+    """
+    Метрики по отраслям за один проход groupby.
+    Отрасли идут в порядке первого появления в df, результат отсортирован
+    по perspective_score по убыванию.
+    """
+    return add_perspective_score(compute_group_metrics(df, group_column), df['revenue'].mean(), weights)
@@ -0,0 +1,247 @@
+"""
+ИНН компаний, уже сохраненных в базе, для пропуска известных карточек при
+извлечении: карточка с известным ИНН не разбирается дальше поля ИНН.
+Набор загружается при запуске и пополняется после каждого сохранения,
+один объект на всех воркеров.
+
+ИНН хранятся числами в отсортированном массиве int64 (8 байт на ИНН против
+~70 у множества строк). Для больших таблиц - фильтр Блума (около 2 байт на
+ИНН при 0.1% ложных срабатываний); его срабатывания проверяются по базе,
+чтобы ложное срабатывание не стоило потерянной компании. Проверка нужна
+для каждого срабатывания, то есть почти для каждой известной карточки
+(подтвержденные ИНН запоминаются), поэтому разбор страницы целиком
+проверяет все срабатывания страницы одним запросом (among).
+"""
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Iterable, List, Optional, Set
+
+import numpy as np
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+KNOWN_INNS_MODES = ('auto', 'exact', 'bloom', 'off')
+# С какого размера таблицы в режиме auto используется фильтр Блума
+BLOOM_THRESHOLD = 5_000_000
+BLOOM_ERROR_RATE = 0.001
+LOAD_BATCH = 100_000
+# ИНН в одном запросе проверки срабатываний
+CONFIRM_BATCH = 500
+_MASK64 = (1 << 64) - 1
+
+
+def inn_key(inn: str) -> Optional[int]:
+    """
+    Число для ИНН из цифр; длина входит в число, чтобы 10- и 12-значные ИНН
+    с ведущими нулями не совпадали. None для ИНН не из цифр.
+    """
+    if not inn.isdigit() or len(inn) > 15:
+        return None
+    return int(inn) * 16 + len(inn)
+
+
+def _mix(keys: np.ndarray) -> np.ndarray:
+    """splitmix64: перемешивание ключей для хешей фильтра Блума"""
+    with np.errstate(over='ignore'):
+        z = keys.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def _mix_one(z: int) -> int:
+    """_mix для одного ключа без накладных расходов numpy"""
+    z = (z + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+class BloomFilter:
+    """Фильтр Блума по целым ключам (двойное хеширование, биты в numpy-массиве)"""
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.bits = max(int(-capacity * np.log(error_rate) / np.log(2) ** 2), 64)
+        self.hashes = max(int(round(self.bits / capacity * np.log(2))), 1)
+        self.array = np.zeros((self.bits + 7) // 8, dtype=np.uint8)
+        self._view = memoryview(self.array)
+
+    def _positions(self, keys: np.ndarray) -> np.ndarray:
+        h1 = _mix(keys)
+        h2 = _mix(h1) | np.uint64(1)
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.bits)
+
+    def add_many(self, keys: np.ndarray):
+        positions = self._positions(keys).ravel()
+        np.bitwise_or.at(self.array, (positions >> np.uint64(3)).astype(np.int64),
+                         (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+
+    def __contains__(self, key: int) -> bool:
+        # Те же позиции, что в _positions, но на целых Python: одна проверка
+        # через numpy стоит десятки микросекунд
+        h1 = _mix_one(key & _MASK64)
+        h2 = _mix_one(h1) | 1
+        data = self._view
+        for step in range(self.hashes):
+            position = ((h1 + step * h2) & _MASK64) % self.bits
+            if not data[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        return self.array.nbytes
+
+
+class KnownInns:
+    """
+    Множество известных ИНН (поддерживает `inn in known`).
+    keys - отсортированные уникальные inn_key загруженных ИНН (array('q')), либо bloom
+    с confirm для проверки срабатываний; ИНН, сохраненные после загрузки,
+    хранятся в обычном множестве. skipped - сколько карточек пропущено.
+    """
+
+    def __init__(self, keys: Optional[array] = None, bloom: Optional[BloomFilter] = None,
+                 confirm=None, other: Optional[Set[str]] = None, loaded: int = 0):
+        self.keys = keys if keys is not None or bloom is not None else array('q')
+        self.bloom = bloom
+        self.confirm = confirm
+        self.loaded = loaded
+        self.skipped = 0
+        self._other = other or set()
+        self._added: Set[str] = set()
+
+    def __contains__(self, inn: str) -> bool:
+        if inn in self._added:
+            return True
+        key = inn_key(inn)
+        if key is None:
+            return inn in self._other
+        if self.keys is not None:
+            # bisect по array('q') быстрее скалярного np.searchsorted
+            i = bisect_left(self.keys, key)
+            return i < len(self.keys) and self.keys[i] == key
+        if key not in self.bloom:
+            return False
+        if self.confirm is None or self.confirm(inn):
+            self._added.add(inn)
+            return True
+        return False
+
+    @property
+    def confirms(self) -> bool:
+        """Срабатывания проверяются по базе: ИНН страницы выгоднее проверять вместе (among)"""
+        return self.bloom is not None and self.confirm is not None
+
+    def among(self, inns: Iterable[str]) -> Set[str]:
+        """Известные ИНН из inns (ИНН одной страницы); срабатывания фильтра Блума - одним запросом"""
+        if self.keys is not None:
+            return {inn for inn in inns if inn in self}
+        known = set()
+        hits = []
+        for inn in inns:
+            key = inn_key(inn)
+            if inn in self._added or (key is None and inn in self._other):
+                known.add(inn)
+            elif key is not None and key in self.bloom:
+                hits.append(inn)
+        if hits:
+            if self.confirm is None:
+                confirmed = set(hits)
+            elif hasattr(self.confirm, 'many'):
+                confirmed = self.confirm.many(hits)
+            else:
+                confirmed = {inn for inn in hits if self.confirm(inn)}
+            self._added.update(confirmed)
+            known.update(confirmed)
+        return known
+
+    def add(self, inns: Iterable[str]):
+        """ИНН, сохраненные в базу после загрузки"""
+        self._added.update(inns)
+
+    def __len__(self) -> int:
+        return self.loaded + len(self._added)
+
+    @property
+    def nbytes(self) -> int:
+        if self.keys is not None:
+            return self.keys.itemsize * len(self.keys)
+        return self.bloom.nbytes
+
+    def close(self):
+        if hasattr(self.confirm, 'close'):
+            self.confirm.close()
+
+
+class _SqliteConfirm:
+    """Проверка ИНН по базе отдельным соединением только для чтения (вызывается из потоков)"""
+
+    def __init__(self, db_name: str):
+        self._conn = sqlite3.connect(f'file:{db_name}?mode=ro', uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def __call__(self, inn: str) -> bool:
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM companies WHERE inn = ?', (inn,)).fetchone() is not None
+
+    def many(self, inns: List[str]) -> Set[str]:
+        """ИНН из inns, которые есть в базе"""
+        found = set()
+        with self._lock:
+            for start in range(0, len(inns), CONFIRM_BATCH):
+                chunk = inns[start:start + CONFIRM_BATCH]
+                found.update(inn for inn, in self._conn.execute(
+                    f'SELECT inn FROM companies WHERE inn IN ({",".join("?" * len(chunk))})', chunk
+                ))
+        return found
+
+    def close(self):
+        self._conn.close()
+
+
+async def load_known_inns(db: Database, mode: str = 'auto') -> Optional[KnownInns]:
+    """ИНН из таблицы companies; None в режиме off"""
+    if mode not in KNOWN_INNS_MODES:
+        raise ValueError(f"Неизвестный режим: {mode}")
+    if mode == 'off':
+        return None
+    start = time.perf_counter()
+    total = await db.get_total_companies()
+    if mode == 'auto':
+        mode = 'bloom' if total > BLOOM_THRESHOLD else 'exact'
+
+    bloom = BloomFilter(total) if mode == 'bloom' else None
+    parts = []
+    other = set()
+    async for batch in db.iter_company_columns(('inn',), batch_size=LOAD_BATCH):
+        keys = []
+        for inn in batch['inn']:
+            key = inn_key(inn)
+            if key is None:
+                other.add(inn)
+            else:
+                keys.append(key)
+        keys = np.array(keys, dtype=np.int64)
+        if bloom is not None:
+            bloom.add_many(keys)
+        else:
+            parts.append(keys)
+
+    if bloom is not None:
+        known = KnownInns(bloom=bloom, confirm=_SqliteConfirm(db.db_name), other=other, loaded=total)
+    else:
+        keys = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+        known = KnownInns(keys=array('q', keys.tobytes()), other=other, loaded=total)
+    logger.info(f"Загружено {total} известных ИНН ({mode}, {known.nbytes / 2**20:.1f} МБ) "
+                f"за {time.perf_counter() - start:.1f} с")
+    return known
@@ -0,0 +1,91 @@
+"""
+Очистка от выбросов внутри групп (по умолчанию okved_1) векторными
+groupby.transform: статистики считаются сразу для всех групп, результат -
+булева маска строк, которые остаются. Методы:
+
+- zscore: |x - mean| / std < threshold (std с ddof=0, как stats.zscore);
+- mad: модифицированный z-score 0.6745 * |x - median| / MAD < threshold;
+- iqr: x внутри [Q1 - threshold * IQR, Q3 + threshold * IQR].
+
+Строка остается, только если проходит по всем колонкам; NaN не проходит.
+"""
+import logging
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+VALUE_COLUMNS = ('revenue', 'growth_rate')
+GROUP_COLUMN = 'okved_1'
+DEFAULT_METHOD = 'zscore'
+DEFAULT_THRESHOLDS = {'zscore': 3.0, 'mad': 3.5, 'iqr': 1.5}
+# Для нормального распределения MAD * 1.4826 = std, 1 / 1.4826 = 0.6745
+MAD_SCALE = 0.6745
+
+
+def _zscore_keep(values: pd.DataFrame, codes: np.ndarray, threshold: float) -> pd.DataFrame:
+    grouped = values.groupby(codes, sort=False)
+    mean = grouped.transform('mean')
+    std = grouped.transform('std', ddof=0)
+    # Группы с нулевым разбросом дают NaN и отбрасываются целиком, как у stats.zscore
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return ((values - mean) / std.where(std > 0)).abs() < threshold
+
+
+def _mad_keep(values: pd.DataFrame, codes: np.ndarray, threshold: float) -> pd.DataFrame:
+    median = values.groupby(codes, sort=False).transform('median')
+    deviation = (values - median).abs()
+    mad = deviation.groupby(codes, sort=False).transform('median')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        keep = MAD_SCALE * deviation / mad < threshold
+    # При MAD = 0 больше половины группы равно медиане: остаются только эти значения
+    return keep.where(mad > 0, deviation == 0)
+
+
+def _iqr_keep(values: pd.DataFrame, codes: np.ndarray, threshold: float) -> pd.DataFrame:
+    grouped = values.groupby(codes, sort=False)
+    q1 = grouped.transform('quantile', 0.25)
+    q3 = grouped.transform('quantile', 0.75)
+    iqr = q3 - q1
+    return (values >= q1 - threshold * iqr) & (values <= q3 + threshold * iqr)
+
+
+FILTERS: Dict[str, Callable] = {
+    'zscore': _zscore_keep,
+    'mad': _mad_keep,
+    'iqr': _iqr_keep,
+}
+
+
+def outlier_mask(df: pd.DataFrame, method: str = DEFAULT_METHOD, threshold: Optional[float] = None,
+                 columns: Sequence[str] = VALUE_COLUMNS, group_column: str = GROUP_COLUMN) -> np.ndarray:
+    """Булева маска строк df без выбросов; threshold по умолчанию из DEFAULT_THRESHOLDS"""
+    if method not in FILTERS:
+        raise ValueError(f"Неизвестный метод очистки: {method}")
+    if threshold is None:
+        threshold = DEFAULT_THRESHOLDS[method]
+    if not len(df):
+        return np.zeros(0, dtype=bool)
+    values = df[list(columns)].astype(float)
+    codes, _ = pd.factorize(df[group_column])
+    keep = FILTERS[method](values, codes, threshold)
+    # Строки без группы (NaN в group_column) не анализируются
+    return keep.all(axis=1).to_numpy() & (codes >= 0)
+
+
+def loss_report(df: pd.DataFrame, mask: np.ndarray, group_column: str = GROUP_COLUMN) -> pd.DataFrame:
+    """Сколько строк потеряла каждая группа: rows, removed, removed_share; по убыванию removed"""
+    frame = pd.DataFrame({group_column: df[group_column].to_numpy(), 'removed': ~mask})
+    report = frame.groupby(group_column).agg(rows=('removed', 'size'), removed=('removed', 'sum'))
+    report['removed_share'] = report['removed'] / report['rows']
+    return report.sort_values(['removed', 'rows'], ascending=False, kind='stable')
+
+
+def clean_by_group(df: pd.DataFrame, method: str = DEFAULT_METHOD, threshold: Optional[float] = None,
+                   columns: Sequence[str] = VALUE_COLUMNS, group_column: str = GROUP_COLUMN) -> pd.DataFrame:
+    """Строки df без выбросов в исходном порядке (для потребителей, которым нужен кадр)"""
+    mask = outlier_mask(df, method, threshold, columns, group_column)
+    logger.info(f"Очистка {method}: удалено {len(mask) - int(mask.sum())} из {len(mask)} строк")
+    return df[mask].reset_index(drop=True)
@@ -0,0 +1,210 @@
+"""
+Кэш загруженных страниц на диске. HTML сжимается gzip и хранится по хешу
+содержимого (одинаковые страницы - один файл), индекс в SQLite связывает
+URL и время загрузки с хешем. Записи старше ttl удаляются, а при превышении
+max_bytes удаляются самые старые записи. По кэшу компании извлекаются
+заново без браузера и сети (pars3.py --replay), например после исправления
+селектора или изменения диапазона выручки.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from card_parser import CardResult, parse_company_cards
+
+logger = logging.getLogger(__name__)
+
+# Виды страниц
+LISTING = 'listing'  # листинг ОКВЭД с карточками компаний
+OKVED = 'okved'      # страница раздела со ссылками на под-категории
+
+DEFAULT_TTL_DAYS = 30.0
+DEFAULT_MAX_MB = 2048.0
+# Размер кэша проверяется раз в столько записей
+EVICT_EVERY = 500
+# Вытеснение по размеру освобождает место с запасом
+EVICT_TARGET = 0.9
+
+_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS objects (
+        digest TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        raw_size INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS pages (
+        url TEXT NOT NULL,
+        fetched_at REAL NOT NULL,
+        kind TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        PRIMARY KEY (url, fetched_at)
+    );
+    CREATE INDEX IF NOT EXISTS idx_pages_fetched ON pages(fetched_at);
+    CREATE INDEX IF NOT EXISTS idx_pages_digest ON pages(digest);
+'''
+
+
+def read_page(path: str) -> str:
+    with open(path, 'rb') as f:
+        return gzip.decompress(f.read()).decode('utf-8')
+
+
+def parse_cached_page(path: str, okved: str) -> List[CardResult]:
+    """Карточки сохраненной страницы (выполняется в пуле процессов при --replay)"""
+    return parse_company_cards(read_page(path), okved)
+
+
+class PageCache:
+    """
+    Кэш страниц в каталоге root: objects/ со сжатым HTML и index.db.
+    put() вызывается из потоков (драйверы Selenium, asyncio.to_thread),
+    поэтому соединение с индексом общее под блокировкой.
+    ttl=None - записи не устаревают, max_bytes=None - размер не ограничен
+    (так кэш открывается для --replay: старые страницы и нужны).
+    """
+
+    def __init__(self, root: str, ttl: Optional[float] = DEFAULT_TTL_DAYS * 86400,
+                 max_bytes: Optional[int] = int(DEFAULT_MAX_MB * 2**20), compress_level: int = 6):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.evict()
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, 'objects', digest[:2], f'{digest}.html.gz')
+
+    def put(self, url: str, html: str, kind: str = LISTING, fetched_at: Optional[float] = None) -> str:
+        """Сохраняет страницу и возвращает хеш ее содержимого"""
+        raw = html.encode('utf-8')
+        digest = hashlib.sha256(raw).hexdigest()
+        fetched_at = fetched_at or time.time()
+        with self._lock:
+            stored = self._conn.execute('SELECT 1 FROM objects WHERE digest = ?', (digest,)).fetchone()
+            if stored:
+                # Содержимое уже в кэше: только новая запись индекса
+                with self._conn:
+                    self._add_page(url, fetched_at, kind, digest)
+        if not stored:
+            # Сжатие вне блокировки; файл без записи в objects вытеснение не трогает
+            data = gzip.compress(raw, self.compress_level, mtime=0)
+            path = self.path(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+            with self._lock, self._conn:
+                self._conn.execute('INSERT OR IGNORE INTO objects (digest, size, raw_size) VALUES (?, ?, ?)',
+                                   (digest, len(data), len(raw)))
+                self._add_page(url, fetched_at, kind, digest)
+        self._puts += 1
+        if self._puts % EVICT_EVERY == 0:
+            self.evict()
+        return digest
+
+    def _add_page(self, url: str, fetched_at: float, kind: str, digest: str):
+        self._conn.execute('INSERT OR REPLACE INTO pages (url, fetched_at, kind, digest) VALUES (?, ?, ?, ?)',
+                           (url, fetched_at, kind, digest))
+
+    def get(self, url: str) -> Optional[str]:
+        """Последняя не устаревшая версия страницы или None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT digest FROM pages WHERE url = ? AND fetched_at >= ? ORDER BY fetched_at DESC LIMIT 1',
+                (url, self._cutoff())
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return read_page(self.path(row[0]))
+        except FileNotFoundError:
+            return None
+
+    def latest(self, kind: str = LISTING) -> List[Tuple[str, str]]:
+        """(URL, путь к файлу) последней не устаревшей версии каждой страницы вида kind"""
+        with self._lock:
+            # В SQLite столбцы рядом с MAX() берутся из строки с максимумом
+            rows = self._conn.execute('''
+                SELECT url, digest, MAX(fetched_at) FROM pages
+                WHERE kind = ? AND fetched_at >= ?
+                GROUP BY url ORDER BY url
+            ''', (kind, self._cutoff())).fetchall()
+        return [(url, self.path(digest)) for url, digest, _ in rows]
+
+    def _cutoff(self, now: Optional[float] = None) -> float:
+        """Время загрузки, раньше которого записи устарели"""
+        if self.ttl is None:
+            return 0.0
+        return (now or time.time()) - self.ttl
+
+    def evict(self, now: Optional[float] = None):
+        """Удаляет устаревшие записи, затем самые старые сверх max_bytes, и файлы без записей"""
+        with self._lock:
+            with self._conn:
+                expired = self._conn.execute('DELETE FROM pages WHERE fetched_at < ?', (self._cutoff(now),)).rowcount
+                evicted = self._evict_size()
+                orphans = [digest for digest, in self._conn.execute(
+                    'SELECT digest FROM objects WHERE digest NOT IN (SELECT digest FROM pages)'
+                )]
+                self._conn.execute('DELETE FROM objects WHERE digest NOT IN (SELECT digest FROM pages)')
+            # Файлы удаляются под блокировкой: put() не вернет их в индекс
+            for digest in orphans:
+                try:
+                    os.remove(self.path(digest))
+                except FileNotFoundError:
+                    pass
+        if expired or evicted:
+            logger.info(f"Кэш страниц: удалено устаревших записей {expired}, вытеснено {evicted}, "
+                        f"файлов {len(orphans)}")
+
+    def _evict_size(self) -> int:
+        if self.max_bytes is None:
+            return 0
+        # Файлы устаревших записей удаляются отдельно и в размер не входят
+        total = self._conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM objects WHERE digest IN (SELECT digest FROM pages)'
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        target = self.max_bytes * EVICT_TARGET
+        sizes = dict(self._conn.execute('SELECT digest, size FROM objects'))
+        refs = dict(self._conn.execute('SELECT digest, COUNT(*) FROM pages GROUP BY digest'))
+        victims = []
+        for url, fetched_at, digest in self._conn.execute('SELECT url, fetched_at, digest FROM pages ORDER BY fetched_at'):
+            if total <= target:
+                break
+            victims.append((url, fetched_at))
+            refs[digest] -= 1
+            if not refs[digest]:
+                # Файл освобождается с последней ссылкой на него
+                total -= sizes.get(digest, 0)
+        self._conn.executemany('DELETE FROM pages WHERE url = ? AND fetched_at = ?', victims)
+        return len(victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pages, urls = self._conn.execute('SELECT COUNT(*), COUNT(DISTINCT url) FROM pages').fetchone()
+            objects, size, raw_size = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(raw_size), 0) FROM objects'
+            ).fetchone()
+        return {
+            'pages': pages,
+            'urls': urls,
+            'objects': objects,
+            'mb': round(size / 2**20, 1),
+            'raw_mb': round(raw_size / 2**20, 1),
+        }
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,167 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from card_parser import MAX_PAGES, MAX_REVENUE, MIN_REVENUE, okved_from_url, page_url
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+# Верхняя граница страниц на ОКВЭД, когда диапазон найден планировщиком
+PLANNED_MAX_PAGES = 200
+
+
+@dataclass
+class PagePlan:
+    first_page: int
+    last_page: int  # включительно; first_page > last_page - обходить нечего
+    total_pages: int
+    ordered: bool
+    probes: int = 0
+
+    @property
+    def pages(self) -> int:
+        return max(0, self.last_page - self.first_page + 1)
+
+
+@dataclass
+class _Probes:
+    """Выручка карточек уже загруженных страниц (каждая страница загружается один раз)"""
+    load: Callable[[str], Awaitable[Tuple[List[Optional[float]], int]]]
+    url: str
+    revenues: Dict[int, List[float]] = field(default_factory=dict)
+    ordered: bool = True
+
+    async def get(self, page: int) -> List[float]:
+        if page not in self.revenues:
+            revenues, _ = await self.load(page_url(self.url, page))
+            known = [revenue for revenue in revenues if revenue is not None]
+            if any(a < b for a, b in zip(known, known[1:])):
+                self.ordered = False
+            self.revenues[page] = known
+        return self.revenues[page]
+
+
+async def prefix_length(predicate: Callable[[int], Awaitable[bool]], pages: int, hint: int) -> int:
+    """
+    Длина префикса страниц 1..pages, на котором монотонный predicate истинен.
+    Галоп от hint (прогноз по прошлому обходу) и бинарный поиск: при точном
+    прогнозе хватает двух проверок.
+    """
+    hint = min(max(hint, 1), pages)
+    step = 1
+    if await predicate(hint):
+        low = hint
+        while low + step <= pages and await predicate(low + step):
+            low += step
+            step *= 2
+        high = min(low + step, pages + 1)
+    else:
+        high = hint
+        while high - step >= 1 and not await predicate(high - step):
+            high -= step
+            step *= 2
+        low = max(high - step, 0)
+    # predicate(low) истинен (или low == 0), predicate(high) ложен (или high == pages + 1)
+    while high - low > 1:
+        middle = (low + high) // 2
+        if await predicate(middle):
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+class PagePlanner:
+    """
+    Выбор страниц листинга ОКВЭД, попадающих в диапазон выручки.
+    Листинги отсортированы по убыванию выручки, поэтому страницы выше
+    диапазона (все карточки дороже max_revenue) образуют префикс, а страницы
+    ниже (все дешевле min_revenue) - суффикс. Границы ищутся пробами по
+    выручке первой и последней карточки. Если на какой-то из проб порядок
+    нарушен, планировщик возвращает обычный план: первые MAX_PAGES страниц
+    с досрочной остановкой по низкой выручке.
+    Найденные границы сохраняются в okved_page_stats и служат прогнозом
+    для следующего обхода.
+    """
+
+    def __init__(self, db: Database, min_revenue: float = MIN_REVENUE,
+                 max_revenue: float = MAX_REVENUE, max_pages: int = PLANNED_MAX_PAGES):
+        self.db = db
+        self.min_revenue = min_revenue
+        self.max_revenue = max_revenue
+        self.max_pages = max_pages
+
+    async def create_table(self):
+        async with self.db.connection() as conn:
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS okved_page_stats (
+                    url TEXT PRIMARY KEY,
+                    total_pages INTEGER,
+                    first_page INTEGER,
+                    last_page INTEGER,
+                    ordered INTEGER,
+                    probes INTEGER,
+                    updated_at REAL
+                )
+            ''')
+            await conn.commit()
+
+    async def _previous(self, url: str) -> Optional[Tuple[int, int]]:
+        async with self.db.connection() as conn:
+            async with conn.execute(
+                'SELECT first_page, last_page FROM okved_page_stats WHERE url = ? AND ordered = 1', (url,)
+            ) as cursor:
+                return await cursor.fetchone()
+
+    async def _save(self, url: str, plan: PagePlan):
+        async with self.db.connection() as conn:
+            await conn.execute('''
+                INSERT OR REPLACE INTO okved_page_stats
+                (url, total_pages, first_page, last_page, ordered, probes, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (url, plan.total_pages, plan.first_page, plan.last_page,
+                  int(plan.ordered), plan.probes, time.time()))
+            await conn.commit()
+
+    async def plan(self, backend, url: str) -> PagePlan:
+        """
+        Страницы ОКВЭД для обхода.
+        backend.probe_listing(url) возвращает выручку карточек и номер последней страницы.
+        """
+        first_revenues, total_pages = await backend.probe_listing(url)
+        probes = _Probes(backend.probe_listing, url)
+        probes.revenues[1] = [revenue for revenue in first_revenues if revenue is not None]
+        probes.ordered = all(a >= b for a, b in zip(probes.revenues[1], probes.revenues[1][1:]))
+
+        if probes.ordered:
+            previous = await self._previous(url)
+            hint_above, hint_end = (previous[0] - 1, previous[1]) if previous else (1, min(total_pages, MAX_PAGES))
+
+            async def above_band(page: int) -> bool:
+                # Все карточки страницы дороже диапазона (страница без выручки считается в диапазоне)
+                revenues = await probes.get(page)
+                return bool(revenues) and revenues[-1] > self.max_revenue
+
+            async def reaches_band(page: int) -> bool:
+                revenues = await probes.get(page)
+                return not revenues or revenues[0] >= self.min_revenue
+
+            pages_above = await prefix_length(above_band, total_pages, hint_above)
+            last_page = await prefix_length(reaches_band, total_pages, hint_end)
+            first_page = pages_above + 1
+            last_page = min(last_page, first_page + self.max_pages - 1)
+
+        if not probes.ordered:
+            first_page, last_page = 1, min(MAX_PAGES, total_pages)
+            logger.info(f"Листинг ОКВЭД {okved_from_url(url)} не упорядочен по выручке, обычный обход")
+
+        plan = PagePlan(first_page=first_page, last_page=last_page, total_pages=total_pages,
+                        ordered=probes.ordered, probes=len(probes.revenues))
+        logger.info(
+            f"План для ОКВЭД {okved_from_url(url)}: страницы {first_page}-{last_page} из {total_pages} "
+            f"(проб: {plan.probes})"
+        )
+        await self._save(url, plan)
+        return plan
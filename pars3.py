@@ -1,17 +1,38 @@
+import argparse
 import asyncio
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import (
+    InvalidSessionIdException, TimeoutException, NoSuchElementException, WebDriverException
+)
+from company_writer import CompanyWriter
+from browser_pool import BROKEN, PROFILES, TIMEOUT, BrowserProfile, DriverPool, apply_profile, block_resources
 from database import Database, Company
+from crawl_metrics import (
+    CACHE_WRITE, DISCOVERY, DRIVER_GET, EXTRACT, PARSE, SAVE, WAIT, OkvedProfiler, metrics, report_periodically, set_worker
+)
+from card_parser import (
+    ACTIVE_STATUS, MAX_PAGES, SEEN, CardResult, cards_from_fields, company_data_from_texts,
+    filter_sub_okved_hrefs, inn_from_text, okved_from_url, page_from_url, page_known, page_url,
+    parse_company_cards, parse_listing_probe
+)
+from frontier import DISCOVERY_PAGE, CrawlFrontier, FrontierTask
+from http_fetcher import HttpBackend, HttpFetcher
+from known_inns import KNOWN_INNS_MODES, KnownInns, load_known_inns
+from page_cache import DEFAULT_MAX_MB, DEFAULT_TTL_DAYS, LISTING, OKVED, PageCache, parse_cached_page
+from pagination import PagePlanner
+from rate_limiter import HostRateLimiter
 import logging
 from logging.handlers import RotatingFileHandler
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 import os
 from datetime import datetime
 import time
-from typing import List, Optional, Set
-import aiosqlite
+from typing import Container, List, Optional, Set, Tuple
 
 
 log_dir = 'logs'
@@ -43,19 +64,36 @@ file_handler.setFormatter(formatter)
 
 logger.addHandler(file_handler)
 
-def setup_driver():
+BASE_URL = 'https://companies.rbc.ru'
+
+def setup_driver(profile: BrowserProfile = PROFILES['default']):
     """Настройка драйвера Selenium"""
-    options = webdriver.ChromeOptions()
-    options.add_argument('--headless')
-    options.add_argument('--disable-gpu')
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    return webdriver.Chrome(options=options)
+    driver = webdriver.Chrome(options=apply_profile(webdriver.ChromeOptions(), profile))
+    driver.set_page_load_timeout(profile.page_load_timeout)
+    block_resources(driver, profile)
+    return driver
+
+# Сообщения WebDriver о потерянной сессии браузера
+BROKEN_DRIVER_MARKERS = ('chrome not reachable', 'session deleted', 'disconnected', 'no such window',
+                         'target window already closed', 'tab crashed')
+
+def driver_failure(error: Exception) -> Optional[str]:
+    """Как ошибка вызова сказывается на драйвере: TIMEOUT, BROKEN или None"""
+    if isinstance(error, TimeoutException):
+        return TIMEOUT
+    if isinstance(error, InvalidSessionIdException):
+        return BROKEN
+    if isinstance(error, WebDriverException) and any(marker in str(error) for marker in BROKEN_DRIVER_MARKERS):
+        return BROKEN
+    return None
 
 async def get_okved_links(driver) -> Set[str]:
     """Получение основных ссылок ОКВЭД"""
+    return await asyncio.to_thread(_get_okved_links, driver)
+
+def _get_okved_links(driver) -> Set[str]:
     try:
-        driver.get('https://companies.rbc.ru/okved/')
+        driver.get(f'{BASE_URL}/okved/')
         wait = WebDriverWait(driver, 10)
         okved_elements = wait.until(
             EC.presence_of_all_elements_located((By.XPATH, "//a[contains(@href, '/okved/')]"))
@@ -74,6 +112,9 @@ async def get_okved_links(driver) -> Set[str]:
 
 async def get_sub_okved_links(driver, okved_url: str) -> Set[str]:
     """Получение под-категорий ОКВЭД"""
+    return await asyncio.to_thread(_get_sub_okved_links, driver, okved_url)
+
+def _get_sub_okved_links(driver, okved_url: str) -> Set[str]:
     try:
         driver.get(okved_url)
         wait = WebDriverWait(driver, 10)
@@ -84,9 +125,9 @@ async def get_sub_okved_links(driver, okved_url: str) -> Set[str]:
         sub_links = set()
         for element in sub_elements:
             href = element.get_attribute('href')
-            if href and '/okved/' in href and href != okved_url and href != 'https://companies.rbc.ru/okved/':  
-                    sub_links.add(href)
-        return sub_links
+            if href:
+                sub_links.add(href)
+        return filter_sub_okved_hrefs(sub_links, okved_url)
     except Exception as e:
         logger.error(f"Ошибка при получении под-категорий ОКВЭД: {e}")
         return set()
@@ -106,15 +147,23 @@ def get_last_page(driver, url: str) -> int:
                 last_page = max(last_page, page_num)
             except ValueError:
                 continue
-        logger.info(f"Найдена последняя страница: {last_page}, будут парситься только первые {min(20,last_page)} страниц")
-        return min(20,last_page)
+        logger.info(f"Найдена последняя страница: {last_page}, будут парситься только первые {min(MAX_PAGES, last_page)} страниц")
+        return min(MAX_PAGES, last_page)
     except Exception as e:
         logger.error(f"Error getting last page: {e}")
         return 1
 
-def extract_company_data(company_element, cnt: int, okved: str) -> Optional[dict]:
-    """Извлечение данных компании"""
+def extract_company_data(company_element, cnt: int, okved: str,
+                         known: Optional[Container[str]] = None) -> CardResult:
+    """Извлечение данных компании; по известному ИНН остальные поля не запрашиваются"""
     try:
+        inn_text = company_element.find_element(
+            By.CSS_SELECTOR, 
+            f'body > div.base-layout > main > div.base-layout__grid > div.base-layout__content > div > div:nth-child({cnt}) > div:nth-child(10) > p:nth-child(1)'
+        ).text
+        if known is not None and inn_from_text(inn_text) in known:
+            return SEEN
+
         name = company_element.find_element(
             By.CSS_SELECTOR, 
             f'body > div.base-layout > main > div.base-layout__grid > div.base-layout__content > div > div:nth-child({cnt}) > p:nth-child(5)'
@@ -125,150 +174,317 @@ def extract_company_data(company_element, cnt: int, okved: str) -> Optional[dict
             f'body > div.base-layout > main > div.base-layout__grid > div.base-layout__content > div > div:nth-child({cnt}) > span'
         ).text.strip()
         
-        if status != 'ДЕЙСТВУЕТ':
+        if status != ACTIVE_STATUS:
             return None
 
-        inn = company_element.find_element(
-            By.CSS_SELECTOR, 
-            f'body > div.base-layout > main > div.base-layout__grid > div.base-layout__content > div > div:nth-child({cnt}) > div:nth-child(10) > p:nth-child(1)'
-        ).text.strip().split(':')[1].strip()
-        
-        owner = company_element.find_element(
+        owner_text = company_element.find_element(
             By.CSS_SELECTOR, 
             f'body > div.base-layout > main > div.base-layout__grid > div.base-layout__content > div > div:nth-child({cnt}) > p:nth-child(7)'
-        ).text.strip().split(':')[1].strip()
-
-
-        okved_parts = okved.split('.')
-        okved_1 = okved_parts[0] if len(okved_parts) > 0 else ''
-        okved_2 = okved_parts[1] if len(okved_parts) > 1 else ''
-        okved_3 = okved_parts[2] if len(okved_parts) > 2 else ''
-
-        company_data = {
-            'name': name,
-            'okved': okved,
-            'okved_1': okved_1,
-            'okved_2': okved_2,
-            'okved_3': okved_3,
-            'inn': inn,
-            'owner': owner,
-            'revenue': 0,
-            'growth_rate': 0
-        }
-
+        ).text
 
         info_elements = company_element.find_elements(By.CSS_SELECTOR, "div")
-        for element in info_elements:
-            text = element.text.strip()
-            if 'Выручка:' in text:
-                try:
-                    rev_text = text.split(':', 1)[1].strip().split('₽')[0].replace(' ', '').replace(',', '.')
-                    if rev_text !='' and 500000000<=float(rev_text)<= 15000000000:
-                        company_data['revenue'] = float(rev_text)
-                    elif 500000000>float(rev_text):
-                        return 'small'
-                    else:
-                        return None
-                    
-                except:
-                    return None
-            if 'Темп прироста:' in text:
-                try:
-                    growth_text = text.split(':')[-1].strip()[:-1].replace(',', '.')
-                    if growth_text != '-':
-                        company_data['growth_rate'] = float(growth_text)
-                    else:
-                        company_data['growth_rate'] = '-'
-                except:
-                    return None
-
-        return company_data
+        return company_data_from_texts(
+            name, inn_text, owner_text,
+            (element.text.strip() for element in info_elements),
+            okved
+        )
     except Exception as e:
         logger.error(f"Error extracting company data: {e}")
         return None
 
-async def parse_page(driver, url: str, page: int, db: Database) -> bool:
-    """
-    Парсинг одной страницы с немедленным сохранением в базу.
-    Возвращает False если нужно прекратить парсинг этого ОКВЭД.
-    """
-    try:
-        if page == 1:
-            full_url = url
-        else:
-            full_url = f"{url}{page}/"
+# Поля всех карточек страницы за один вызов WebDriver.
+# Позиции совпадают с селекторами extract_company_data
+CARD_FIELDS_JS = """
+const text = (el) => el ? el.innerText : null;
+const child = (el, n, tag) => el ? el.querySelector(`:scope > ${tag}:nth-child(${n})`) : null;
+return Array.from(document.querySelectorAll('.company-card')).map((card) => ({
+    name: text(child(card, 5, 'p')),
+    status: text(card.querySelector(':scope > span')),
+    inn: text(child(child(card, 10, 'div'), 1, 'p')),
+    owner: text(child(card, 7, 'p')),
+    info: Array.from(card.querySelectorAll('div')).map((el) => el.innerText),
+}));
+"""
+
+def _open_listing(driver, full_url: str):
+    with metrics.stage(DRIVER_GET):
         driver.get(full_url)
-        logger.info(f"Парсинг страницы: {full_url}")
-        
-        wait = WebDriverWait(driver, 10)
-        companies = wait.until(
+    logger.info(f"Парсинг страницы: {full_url}")
+
+    wait = WebDriverWait(driver, 10)
+    with metrics.stage(WAIT):
+        return wait.until(
             EC.presence_of_all_elements_located((By.CSS_SELECTOR, '.company-card'))
         )
-        
-        okved = url.split('/okved/')[-1].strip('/')
-        companies_to_save = []
-        low_revenue_count = 0  # Счетчик компаний с низкой выручкой
-        
-        for cnt, company in enumerate(companies, 1):
-            company_data = extract_company_data(company, cnt, okved)
-            if company_data != 'small' and company_data != None:
-                companies_to_save.append(Company(
-                    name=company_data['name'],
-                    okved=company_data['okved'],
-                    okved_1=company_data['okved_1'],
-                    okved_2=company_data['okved_2'],
-                    okved_3=company_data['okved_3'],
-                    inn=company_data['inn'],
-                    revenue=company_data['revenue'],
-                    growth_rate=company_data['growth_rate'],
-                    owner=company_data['owner']
-                ))
-            elif company_data == 'small':
-                low_revenue_count += 1
-        await db.save_companies(companies_to_save)
-        logger.info(f"Сохранено {len(companies_to_save)} компаний с ОКВЭД {okved}, страница {page}")
-
-        if low_revenue_count > 60:
-            logger.info(f"Прекращаем парсинг ОКВЭД {okved}: слишком много компаний с низкой выручкой")
-            return False
-            
-        return True
-            
-    except Exception as e:
-        logger.error(f"Error parsing page {page}: {e}")
-        return True
 
-async def process_sub_okved(driver, sub_link: str, db: Database):
-    """Обработка одного ОКВЭД"""
+def extract_cards_dom(driver, companies, okved: str, known: Optional[Container[str]] = None) -> List[CardResult]:
+    """По запросу WebDriver на каждое поле каждой карточки"""
+    return [extract_company_data(company, cnt, okved, known) for cnt, company in enumerate(companies, 1)]
+
+def extract_cards_snapshot(driver, companies, okved: str, known: Optional[Container[str]] = None) -> List[CardResult]:
+    """Один снимок page_source, карточки разбираются в процессе"""
+    return parse_company_cards(driver.page_source, okved, known)
+
+def extract_cards_js(driver, companies, okved: str, known: Optional[Container[str]] = None) -> List[CardResult]:
+    """Один вызов JavaScript, возвращающий тексты полей всех карточек"""
+    return cards_from_fields(driver.execute_script(CARD_FIELDS_JS), okved, known)
+
+EXTRACTORS = {
+    'dom': extract_cards_dom,
+    'snapshot': extract_cards_snapshot,
+    'js': extract_cards_js,
+}
+
+def _extract_page(driver, full_url: str, okved: str, extraction: str = 'dom',
+                  known: Optional[Container[str]] = None) -> List[CardResult]:
+    """Загрузка страницы и извлечение карточек (блокирующая часть, выполняется в потоке)"""
+    companies = _open_listing(driver, full_url)
+    with metrics.stage(EXTRACT):
+        return EXTRACTORS[extraction](driver, companies, okved, known)
+
+def _load_page_source(driver, full_url: str) -> str:
+    _open_listing(driver, full_url)
+    with metrics.stage(EXTRACT):
+        return driver.page_source
+
+def _probe_listing(driver, full_url: str):
+    return parse_listing_probe(_load_page_source(driver, full_url))
+
+def collect_companies(results: List[CardResult], known: Optional[Container[str]] = None):
+    """
+    Отбирает компании для сохранения, считает карточки с низкой выручкой
+    и с уже известным ИНН (в том числе разобранные в другом процессе без known)
+    """
+    # Известные ИНН страницы одной проверкой
+    known = page_known(known, (company_data['inn'] for company_data in results if isinstance(company_data, dict)))
+    companies_to_save = []
+    low_revenue_count = 0  # Счетчик компаний с низкой выручкой
+    seen_count = 0
+
+    for company_data in results:
+        if company_data == SEEN or (isinstance(company_data, dict) and known is not None
+                                    and company_data['inn'] in known):
+            seen_count += 1
+        elif company_data != 'small' and company_data != None:
+            companies_to_save.append(Company(
+                name=company_data['name'],
+                okved=company_data['okved'],
+                okved_1=company_data['okved_1'],
+                okved_2=company_data['okved_2'],
+                okved_3=company_data['okved_3'],
+                inn=company_data['inn'],
+                revenue=company_data['revenue'],
+                growth_rate=company_data['growth_rate'],
+                owner=company_data['owner']
+            ))
+        elif company_data == 'small':
+            low_revenue_count += 1
+    return companies_to_save, low_revenue_count, seen_count
+
+class SeleniumBackend:
+    """
+    Загрузка страниц через браузеры пула (DriverPool).
+    Selenium блокирует поток, поэтому вызовы драйвера уходят в пул потоков,
+    а цикл событий в это время обслуживает остальных воркеров. Каждый вызов
+    берет свободный драйвер; после ошибки драйвер может быть заменен
+    (см. driver_failure). Пул без start() запускает браузер при первом
+    обращении (так бэкенд работает запасным для HTTP).
+    extraction выбирает способ извлечения карточек (см. EXTRACTORS);
+    с parse_executor HTML снимка разбирается в отдельном процессе.
+    Загрузки страниц проходят через общий limiter (HostRateLimiter).
+    Карточки с ИНН из known не извлекаются дальше поля ИНН.
+    С cache page_source загруженных страниц сохраняется в кэш страниц.
+    """
+
+    def __init__(self, pool: DriverPool, extraction: str = 'dom', parse_executor=None,
+                 limiter: Optional[HostRateLimiter] = None, known: Optional[KnownInns] = None,
+                 cache: Optional[PageCache] = None):
+        self.pool = pool
+        self.extraction = extraction
+        self.parse_executor = parse_executor
+        self.limiter = limiter
+        self.known = known
+        self.cache = cache
+
+    def _run(self, func, driver, url: str, kind: str, *args):
+        result = func(driver, url, *args)
+        if self.cache is not None:
+            with metrics.stage(CACHE_WRITE):
+                html = result if func is _load_page_source else driver.page_source
+                self.cache.put(url, html, kind)
+        return result
+
+    async def _call(self, func, url: str, *args, kind: str = LISTING):
+        pooled = await self.pool.acquire()
+        failure = None
+        try:
+            if self.limiter is None:
+                return await self.pool.run(self._run, func, pooled.driver, url, kind, *args)
+            async with self.limiter.request(url):
+                return await self.pool.run(self._run, func, pooled.driver, url, kind, *args)
+        except Exception as e:
+            failure = driver_failure(e)
+            raise
+        finally:
+            await self.pool.release(pooled, failure)
+
+    async def get_sub_okved_links(self, okved_url: str) -> Set[str]:
+        return await self._call(_get_sub_okved_links, okved_url, kind=OKVED)
+
+    async def get_last_page(self, url: str) -> int:
+        return await self._call(get_last_page, url)
+
+    async def probe_listing(self, full_url: str):
+        return await self._call(_probe_listing, full_url)
+
+    async def load_cards(self, full_url: str, okved: str) -> List[CardResult]:
+        if self.extraction == 'snapshot' and self.parse_executor is not None:
+            # Драйвер освобождается сразу после снимка, разбор идет параллельно
+            # (known в другой процесс не передается, см. collect_companies)
+            html = await self._call(_load_page_source, full_url)
+            with metrics.stage(PARSE):
+                return await asyncio.get_running_loop().run_in_executor(
+                    self.parse_executor, parse_company_cards, html, okved
+                )
+        return await self._call(_extract_page, full_url, okved, self.extraction, self.known)
+
+    async def close(self):
+        await self.pool.close()
+
+# Причины досрочной остановки ОКВЭД
+LOW_REVENUE_STOP = 'low_revenue'
+REVENUE_BAND_STOP = 'revenue_band'
+
+async def parse_page(backend, url: str, page: int, db: Database,
+                     known: Optional[KnownInns] = None, writer: Optional[CompanyWriter] = None,
+                     task: Optional[FrontierTask] = None) -> Tuple[Optional[str], Optional[asyncio.Future]]:
+    """
+    Парсинг одной страницы с сохранением в базу: сразу или через writer,
+    который запишет компании и закроет task в crawl_frontier одной транзакцией
+    (ИНН страницы попадают в known только после записи, см. main).
+    Возвращает причину досрочной остановки ОКВЭД или None, если парсинг продолжается,
+    и future коммита страницы в writer (None без writer).
+    Ошибки загрузки страницы передаются вызывающему.
+    """
+    okved = okved_from_url(url)
+    results = await backend.load_cards(page_url(url, page), okved)
+    companies_to_save, low_revenue_count, seen_count = collect_companies(results, known)
+    stop_reason = LOW_REVENUE_STOP if low_revenue_count > 60 else None
+
+    saving = None
+    if writer is not None:
+        # Ждет только места в очереди, не коммита
+        saving = await writer.submit(companies_to_save, (task, stop_reason, seen_count))
+    else:
+        with metrics.stage(SAVE):
+            result = await db.save_companies(companies_to_save)
+        metrics.inc('companies', result.inserted + result.updated)
+        logger.info(
+            f"Сохранено {result.inserted} новых компаний с ОКВЭД {okved}, страница {page} "
+            f"(обновлено {result.updated}, пропущено {result.skipped}, известных ИНН {seen_count})"
+        )
+        if known is not None:
+            known.add(company.inn for company in companies_to_save)
+            known.skipped += seen_count
+    metrics.inc('pages')
+    metrics.inc('cards', len(results))
+    metrics.inc('cards_seen', seen_count)
+
+    if stop_reason:
+        logger.info(f"Прекращаем парсинг ОКВЭД {okved}: слишком много компаний с низкой выручкой")
+    return stop_reason, saving
+
+async def process_task(backend, task: FrontierTask, frontier: CrawlFrontier, db: Database,
+                       planner: Optional[PagePlanner] = None, profiler: Optional[OkvedProfiler] = None,
+                       known: Optional[KnownInns] = None, writer: Optional[CompanyWriter] = None):
+    """
+    Выполняет одну задачу очереди: выбор страниц ОКВЭД или парсинг страницы.
+    Возвращает future коммита страницы, отданной writer, иначе None.
+    """
+    okved_code = okved_from_url(task.url)
+    if profiler is not None:
+        with profiler.profile(okved_code):
+            return await _process_task(backend, task, frontier, db, planner, okved_code, known, writer)
+    return await _process_task(backend, task, frontier, db, planner, okved_code, known, writer)
+
+async def _process_task(backend, task: FrontierTask, frontier: CrawlFrontier, db: Database,
+                        planner: Optional[PagePlanner], okved_code: str, known: Optional[KnownInns],
+                        writer: Optional[CompanyWriter]):
     try:
-        okved_code = sub_link.split('/okved/')[-1].strip('/')
-        logger.info(f"Обработка ОКВЭД: {okved_code}")
-        
-        last_page = get_last_page(driver, sub_link)
-        logger.info(f"Найдено {last_page} страниц для ОКВЭД {okved_code}")
-        
-        for page in range(1, last_page + 1):
-            logger.info(f"Парсинг страницы {page}/{last_page} для ОКВЭД {okved_code}")
-            continue_parsing = await parse_page(driver, sub_link, page, db)
-            
-            if not continue_parsing:
+        if task.page == DISCOVERY_PAGE:
+            logger.info(f"Обработка ОКВЭД: {okved_code}")
+            if planner is None:
+                with metrics.stage(DISCOVERY):
+                    last_page = await backend.get_last_page(task.url)
+                logger.info(f"Найдено {last_page} страниц для ОКВЭД {okved_code}")
+                await frontier.expand(task, last_page)
+                return
+            # Только страницы с выручкой в диапазоне, остальные не загружаются
+            with metrics.stage(DISCOVERY):
+                plan = await planner.plan(backend, task.url)
+            stop_reason = REVENUE_BAND_STOP if plan.pages < plan.total_pages else None
+            if stop_reason:
+                metrics.inc('early_stops', reason=stop_reason)
+            await frontier.expand(task, plan.last_page, plan.first_page, stop_reason=stop_reason)
+            return
+
+        logger.info(f"Парсинг страницы {task.page}/{task.last_page} для ОКВЭД {okved_code}")
+        stop_reason, saving = await parse_page(backend, task.url, task.page, db, known, writer, task)
+        if writer is not None:
+            # Страницу закроет writer вместе с записью ее компаний
+            if stop_reason:
                 logger.info(f"Досрочное завершение парсинга ОКВЭД {okved_code}")
-                break
-                
-            await asyncio.sleep(2)
-            
+                metrics.inc('early_stops', reason=stop_reason)
+            return saving
+        if stop_reason:
+            logger.info(f"Досрочное завершение парсинга ОКВЭД {okved_code}")
+            metrics.inc('early_stops', reason=stop_reason)
+            await frontier.stop(task, stop_reason)
+        else:
+            await frontier.complete(task)
     except Exception as e:
-        logger.error(f"Ошибка при обработке ОКВЭД {sub_link}: {e}")
+        logger.error(f"Error parsing page {task.page} of {task.url} (попытка {task.attempts}): {e}")
+        metrics.inc('errors', reason=type(e).__name__)
+        await frontier.fail(task, str(e))
 
-async def process_driver_links(driver, links: List[str], db: Database):
-    """Обработка списка ссылок одним драйвером"""
-    for link in links:
-        await process_sub_okved(driver, link, db)
-        await asyncio.sleep(5)
+async def process_frontier(backend, frontier: CrawlFrontier, db: Database, worker: str,
+                           planner: Optional[PagePlanner] = None, profiler: Optional[OkvedProfiler] = None,
+                           known: Optional[KnownInns] = None, writer: Optional[CompanyWriter] = None):
+    """
+    Воркер: берет страницы из общей очереди crawl_frontier, пока они есть.
+    Свободный воркер забирает любой доступный ОКВЭД, поэтому тяжелый ОКВЭД
+    не задерживает остальные, а после перезапуска обход продолжается
+    с незавершенной страницы.
+    """
+    # Метрики этапов, в том числе в пуле потоков, записываются за этим воркером
+    set_worker(worker)
+    current_url = None
+    saving = None  # коммит последней страницы воркера в writer
+    while True:
+        task = await frontier.claim(worker, prefer_url=current_url)
+        if task is None:
+            if saving is not None:
+                # Следующая страница ОКВЭД выдается после коммита предыдущей:
+                # ждем его и сразу берем страницу снова
+                await writer.wait(saving)
+                saving = None
+                continue
+            if writer is not None:
+                # Страницы других воркеров тоже ждут записи
+                await writer.flush()
+            if not await frontier.has_work():
+                return
+            # Другие воркеры еще определяют число страниц своих ОКВЭД
+            await asyncio.sleep(1)
+            continue
+
+        current_url = task.url
+        # Темп запросов задает общий лимитер бэкенда, фиксированных пауз нет
+        saving = await process_task(backend, task, frontier, db, planner, profiler, known, writer)
 
 async def get_processed_okveds(db: Database) -> Set[str]:
     """Получает список уже обработанных ОКВЭД из базы данных"""
-    async with aiosqlite.connect(db.db_name) as db_conn:
+    async with db.connection() as db_conn:
         async with db_conn.execute('''
             SELECT DISTINCT okved_1, okved_2 
             FROM companies 
@@ -301,24 +517,72 @@ async def filter_sub_okved_links(sub_links: Set[str], db: Database) -> Set[str]:
         
     return filtered_links
 
-async def main():
-    db = Database()
-    await db.create_table()
-    initial_count = await db.get_total_companies()
-    logger.info(f"Начальное количество компаний в БД: {initial_count}")
-
-    num_drivers = 3
-    drivers = [setup_driver() for _ in range(num_drivers)]
-    
+async def main(num_workers: int = 3, backend: str = 'selenium', base_url: str = BASE_URL,
+               extraction: str = 'dom', parse_processes: int = 0, recrawl: bool = False,
+               rate: float = 1.0, min_rate: float = 0.2, max_rate: float = 5.0,
+               pagination: str = 'planned', snapshot: Optional[str] = None,
+               metrics_json: Optional[str] = None, metrics_prom: Optional[str] = None,
+               metrics_interval: float = 15.0, profile_okved: Optional[str] = None,
+               profiler_tool: str = 'cprofile', browser_profile: str = 'lean', browser_spares: int = 1,
+               max_driver_pages: int = 200, max_driver_rss: Optional[float] = 1500,
+               max_driver_timeouts: int = 3, known_inns: str = 'auto', write_batch: int = 2000,
+               write_interval: float = 1.0, write_queue: int = 10_000, page_cache: Optional[str] = None,
+               cache_ttl_days: float = DEFAULT_TTL_DAYS, cache_max_mb: float = DEFAULT_MAX_MB):
+    # Команды драйверам идут в собственные потоки DriverPool. Потоки по умолчанию
+    # (to_thread) нужны для одновременного запуска всех браузеров и запасных,
+    # закрытия заменяемых, записи метрик, кэша страниц и снимка базы
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=num_workers + browser_spares + 4, thread_name_prefix='blocking')
+    )
+    db = Database(pool_size=min(num_workers, 8))
+    await db.open()
+    # Все, что открыто после базы, закрывается в finally, даже если ошибка при запуске
+    known = parse_executor = profiler = reporter = writer = cache = fetcher = browser = None
     try:
+        await db.create_table()
+        initial_count = await db.get_total_companies()
+        logger.info(f"Начальное количество компаний в БД: {initial_count}")
+        # Известные ИНН: такие карточки не разбираются дальше поля ИНН
+        known = await load_known_inns(db, known_inns)
+
+        # Разбор HTML в отдельных процессах, когда он становится узким местом
+        parse_executor = ProcessPoolExecutor(max_workers=parse_processes) if parse_processes > 0 else None
+        # Один лимитер на хост для всех воркеров вместо пауз после каждой страницы
+        limiter = HostRateLimiter(rate=rate, min_rate=min_rate, max_rate=max_rate)
+        if profile_okved:
+            suffix = 'html' if profiler_tool == 'pyinstrument' else 'prof'
+            profiler = OkvedProfiler(profile_okved, os.path.join(log_dir, f'profile_{profile_okved}.{suffix}'), profiler_tool)
+        # Сжатый HTML листингов для повторного извлечения без обхода (--replay)
+        cache = open_page_cache(page_cache, cache_ttl_days, cache_max_mb) if page_cache else None
+        if metrics_json or metrics_prom:
+            metrics.enable()
+
+        def driver_pool(size: int) -> DriverPool:
+            return DriverPool(
+                partial(setup_driver, PROFILES[browser_profile]), size=size, spares=browser_spares,
+                max_pages=max_driver_pages, max_rss_mb=max_driver_rss, max_timeouts=max_driver_timeouts,
+            )
+
+        if backend == 'http':
+            # Одна сессия с пулом keep-alive соединений на всех воркеров,
+            # браузер запускается только для страниц без карточек в HTML
+            fetcher = HttpFetcher(max_connections=num_workers, limiter=limiter, cache=cache)
+            await fetcher.open()
+            browser = SeleniumBackend(driver_pool(1), extraction, parse_executor, limiter, known, cache)
+            backends = [HttpBackend(fetcher, browser, parse_executor, known)] * num_workers
+        else:
+            browser = SeleniumBackend(driver_pool(num_workers), extraction, parse_executor, limiter, known, cache)
+            await browser.pool.start()
+            backends = [browser] * num_workers
+
         main_okved = ['07']
-        main_okved_links = [f"https://companies.rbc.ru/okved/{okved}/" for okved in main_okved]
+        main_okved_links = [f"{base_url}/okved/{okved}/" for okved in main_okved]
         logger.info(f"Используем {len(main_okved)} основных ОКВЭД категорий")
         
         # Собираем все под-категории
         all_sub_links = set()
         for main_link in main_okved_links:
-            sub_links = await get_sub_okved_links(drivers[0], main_link)
+            sub_links = await backends[0].get_sub_okved_links(main_link)
             all_sub_links.update(sub_links)
         
         # Фильтруем ссылки(если надо, тут я не фильитрую), оставляя только те, которые нужно парсить
@@ -326,38 +590,288 @@ async def main():
         
         logger.info(f"Всего найдено {len(all_sub_links)} под-категорий ОКВЭД")
         logger.info(f"После фильтрации осталось {len(filtered_sub_links)} под-категорий для парсинга")
-        
-        if not filtered_sub_links:
-            logger.info("Нет новых ОКВЭД для парсинга")
+
+        # Прогресс обхода хранится постранично в crawl_frontier: уже пройденные
+        # страницы пропускаются, прерванный обход продолжается с места остановки
+        frontier = CrawlFrontier(db)
+        await frontier.create_table()
+        if recrawl:
+            await frontier.reset(filtered_sub_links)
+        new_links = await frontier.seed(filtered_sub_links)
+        if write_batch > 0:
+            async def finish_pages(conn, pages):
+                await frontier.finish_saved(conn, [(task, reason) for task, reason, _ in pages])
+
+            async def pages_saved(pages, batches):
+                # ИНН не записанной страницы не должны попасть в known: при
+                # повторе ее карточки были бы пропущены как известные
+                if known is not None:
+                    for (_, _, seen_count), companies in zip(pages, batches):
+                        known.add(company.inn for company in companies)
+                        known.skipped += seen_count
+
+            async def fail_pages(pages, error):
+                for task, _, _ in pages:
+                    await frontier.fail(task, f"Ошибка записи: {error}")
+
+            # Одна задача пишет компании крупными транзакциями вместе с закрытием страниц
+            writer = CompanyWriter(db, batch_size=write_batch, flush_interval=write_interval, max_queue=write_queue,
+                                   before_commit=finish_pages, after_commit=pages_saved, on_failure=fail_pages)
+            await writer.start()
+        planner = None
+        if pagination == 'planned':
+            planner = PagePlanner(db)
+            await planner.create_table()
+        logger.info(f"Новых ОКВЭД в очереди обхода: {new_links}, состояние очереди: {await frontier.stats()}")
+
+        if not await frontier.has_work():
+            logger.info("Нет новых страниц для парсинга")
             return
-        
-        # Разделяем отфильтрованные ссылки между драйверами
-        sub_links_list = sorted(list(filtered_sub_links))
-        links_per_driver = max(1, len(sub_links_list) // num_drivers)
-        driver_tasks = []
-        
-        for i in range(num_drivers):
-            start_idx = i * links_per_driver
-            end_idx = start_idx + links_per_driver if i < num_drivers - 1 else len(sub_links_list)
-            driver_links = sub_links_list[start_idx:end_idx]
-            if driver_links:
-                driver_tasks.append(process_driver_links(drivers[i], driver_links, db))
-        
-        # Запускаем все задачи параллельно
-        if driver_tasks:
-            await asyncio.gather(*driver_tasks)
+
+        async def refresh_gauges():
+            for status, count in (await frontier.stats()).items():
+                metrics.set_gauge('queue_depth', count, status=status)
+            for host, host_rate in limiter.rates().items():
+                metrics.set_gauge('request_rate', host_rate, host=host)
+
+        if metrics.enabled:
+            reporter = asyncio.create_task(
+                report_periodically(metrics_json, metrics_prom, metrics_interval, refresh_gauges)
+            )
+
+        logger.info(f"Запускаем {num_workers} воркеров ({backend})")
+        await asyncio.gather(*(
+            process_frontier(worker_backend, frontier, db, worker=str(i), planner=planner, profiler=profiler,
+                             known=known, writer=writer)
+            for i, worker_backend in enumerate(backends)
+        ))
+        if reporter is not None:
+            await refresh_gauges()
+        if writer is not None:
+            await writer.close()
+        logger.info(f"Состояние очереди обхода: {await frontier.stats()}")
+        logger.info(f"Темп запросов на конец обхода: {limiter.rates()}")
         
         final_count = await db.get_total_companies()
         logger.info(f"Парсинг завершен")
         logger.info(f"Было в базе: {initial_count} компаний")
         logger.info(f"Добавлено новых: {final_count - initial_count} компаний")
         logger.info(f"Всего в базе: {final_count} компаний")
+        if known is not None:
+            logger.info(f"Карточек с известным ИНН пропущено без разбора: {known.skipped}")
+        # Сводка для анализа ведется триггерами; при расхождении перестраивается
+        await db.check_summary(rebuild=True)
+        if snapshot:
+            await db.export_snapshot(snapshot)
         
     except Exception as e:
         logger.error(f"Произошла ошибка: {e}")
     finally:
-        for driver in drivers:
-            driver.quit()
+        if writer is not None:
+            # Остановка или ошибка: записать то, что уже извлечено
+            await writer.close()
+        if reporter is not None:
+            reporter.cancel()
+            # Итоговый снимок за весь обход
+            metrics.write(metrics_json, metrics_prom, overall=True)
+        if profiler is not None:
+            profiler.save()
+        if browser is not None:
+            await browser.close()
+        if known is not None:
+            known.close()
+        if fetcher is not None:
+            await fetcher.close()
+        if parse_executor is not None:
+            parse_executor.shutdown()
+        if cache is not None:
+            logger.info(f"Кэш страниц: {cache.stats()}")
+            cache.close()
+        await db.close()
+
+def open_page_cache(path: str, ttl_days: Optional[float], max_mb: Optional[float]) -> PageCache:
+    """None - без срока хранения или без ограничения размера"""
+    return PageCache(path, ttl=None if ttl_days is None else ttl_days * 86400,
+                     max_bytes=None if max_mb is None else int(max_mb * 2**20))
+
+async def replay(page_cache: str, processes: int = 0, on_conflict: str = 'refresh',
+                 cache_ttl_days: Optional[float] = None, cache_max_mb: Optional[float] = None,
+                 write_batch: int = 2000, snapshot: Optional[str] = None) -> int:
+    """
+    Повторное извлечение компаний из кэша страниц без браузера и сети:
+    последняя версия каждого листинга разбирается в пуле процессов (по
+    умолчанию на всех ядрах), компании записываются через CompanyWriter
+    в порядке обхода (ОКВЭД, страница), независимо от того, какой процесс
+    закончил раньше. on_conflict='refresh' обновляет выручку и рост уже
+    сохраненных компаний, не меняя их ОКВЭД; 'update' меняет и ОКВЭД (на
+    ОКВЭД последней по порядку страницы с компанией).
+    Срок хранения и размер кэша применяются, только если заданы явно: иначе
+    открытие кэша удалило бы как раз те старые страницы, ради которых replay.
+    Возвращает код завершения: 1, если в кэше нет листингов.
+    """
+    cache = open_page_cache(page_cache, cache_ttl_days, cache_max_mb)
+    pages = cache.latest(LISTING)
+    if not pages:
+        logger.warning(f"В кэше страниц {page_cache} нет листингов для повторного извлечения: {cache.stats()}")
+        cache.close()
+        return 1
+    pages.sort(key=lambda page: (okved_from_url(page[0]), page_from_url(page[0])))
+    processes = processes or os.cpu_count() or 1
+    logger.info(f"Повторное извлечение из кэша: {len(pages)} страниц, {processes} процессов")
+
+    db = Database()
+    await db.open()
+    await db.create_table()
+    initial_count = await db.get_total_companies()
+    writer = CompanyWriter(db, batch_size=write_batch or 2000, on_conflict=on_conflict)
+    await writer.start()
+    loop = asyncio.get_running_loop()
+    failed = 0
+
+    async def submit_next(window: deque):
+        nonlocal failed
+        url, future = window.popleft()
+        try:
+            results = await future
+        except Exception as e:
+            failed += 1
+            logger.error(f"Не удалось разобрать страницу из кэша {url}: {e}")
+            return
+        companies, _, _ = collect_companies(results)
+        await writer.submit(companies)
+
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            # Разбор идет параллельно на processes * 2 страниц вперед, а запись -
+            # строго в порядке pages: результат не зависит от того, кто закончил первым
+            window = deque()
+            for url, path in pages:
+                window.append((url, loop.run_in_executor(executor, parse_cached_page, path, okved_from_url(url))))
+                if len(window) >= processes * 2:
+                    await submit_next(window)
+            while window:
+                await submit_next(window)
+        await writer.close()
+        final_count = await db.get_total_companies()
+        stats = writer.stats()
+        logger.info(f"Повторное извлечение завершено за {time.perf_counter() - start:.1f} с: "
+                    f"страниц {len(pages) - failed}, ошибок {failed}, компаний записано {stats['rows']}, "
+                    f"новых {final_count - initial_count}, всего в базе {final_count}")
+        await db.check_summary(rebuild=True)
+        if snapshot:
+            await db.export_snapshot(snapshot)
+    finally:
+        await writer.close()
+        cache.close()
+        await db.close()
+    return 0
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Парсер компаний с companies.rbc.ru")
+    parser.add_argument('--workers', type=int, default=3, help="Количество параллельных воркеров")
+    parser.add_argument('--backend', choices=['selenium', 'http'], default='selenium',
+                        help="selenium - браузер на каждого воркера, http - HTTP-клиент с запасным браузером")
+    parser.add_argument('--base-url', default=BASE_URL,
+                        help="Адрес сайта (например, локальный сервер с сохраненными страницами)")
+    parser.add_argument('--extraction', choices=sorted(EXTRACTORS), default='dom',
+                        help="Извлечение карточек в Selenium: dom - запрос на каждое поле, "
+                             "snapshot - разбор page_source, js - один вызов JavaScript")
+    parser.add_argument('--parse-processes', type=int, default=0,
+                        help="Процессы для разбора HTML (0 - в потоке воркера)")
+    parser.add_argument('--recrawl', action='store_true',
+                        help="Сбросить сохраненный прогресс и обойти найденные ОКВЭД заново")
+    parser.add_argument('--rate', type=float, default=1.0, help="Начальный темп запросов к сайту, запросов/с")
+    parser.add_argument('--min-rate', type=float, default=0.2, help="Нижняя граница темпа при ошибках")
+    parser.add_argument('--max-rate', type=float, default=5.0, help="Верхняя граница темпа")
+    parser.add_argument('--pagination', choices=['planned', 'fixed'], default='planned',
+                        help="planned - только страницы в диапазоне выручки (поиск границ пробами), "
+                             f"fixed - первые {MAX_PAGES} страниц")
+    parser.add_argument('--snapshot', metavar='PATH',
+                        help="После обхода записать Parquet-снимок companies для analyze_outliers.py")
+    parser.add_argument('--metrics-json', metavar='PATH',
+                        help="Дописывать снимки метрик обхода (время этапов, темп, ошибки) в JSON Lines")
+    parser.add_argument('--metrics-prom', metavar='PATH',
+                        help="Файл метрик в формате Prometheus (*.prom для textfile collector node_exporter)")
+    parser.add_argument('--metrics-interval', type=float, default=15.0, help="Период записи метрик, с")
+    parser.add_argument('--profile-okved', metavar='OKVED',
+                        help="Профилировать задачи одного ОКВЭД (например, 07.10), профиль в logs/")
+    parser.add_argument('--profiler', choices=['cprofile', 'pyinstrument'], default='cprofile')
+    parser.add_argument('--browser-profile', choices=sorted(PROFILES), default='lean',
+                        help="lean - eager-загрузка, без картинок, шрифтов, счетчиков и расширений; "
+                             "default - обычный Chrome")
+    parser.add_argument('--browser-spares', type=int, default=1,
+                        help="Браузеров, заранее запущенных на замену")
+    parser.add_argument('--max-driver-pages', type=int, default=200,
+                        help="Заменять браузер после стольких страниц (0 - не заменять)")
+    parser.add_argument('--max-driver-rss', type=float, default=1500,
+                        help="Заменять браузер, когда память его процессов превышает столько МБ (0 - не проверять)")
+    parser.add_argument('--max-driver-timeouts', type=int, default=3,
+                        help="Заменять браузер после стольких таймаутов подряд")
+    parser.add_argument('--write-batch', type=int, default=2000,
+                        help="Компаний в одной транзакции записи (0 - сохранять каждую страницу сразу)")
+    parser.add_argument('--write-interval', type=float, default=1.0,
+                        help="Не дольше стольких секунд между записями очереди")
+    parser.add_argument('--write-queue', type=int, default=10_000,
+                        help="Компаний в очереди записи, при заполнении воркеры ждут")
+    parser.add_argument('--page-cache', metavar='DIR',
+                        help="Каталог кэша страниц: сжатый HTML листингов для повторного извлечения (--replay)")
+    parser.add_argument('--cache-ttl-days', type=float,
+                        help=f"Страницы в кэше старше стольких дней удаляются (по умолчанию {DEFAULT_TTL_DAYS:g}; "
+                             f"при --replay - только если задано)")
+    parser.add_argument('--cache-max-mb', type=float,
+                        help=f"Размер кэша страниц, МБ; сверх него удаляются самые старые страницы "
+                             f"(по умолчанию {DEFAULT_MAX_MB:g}; при --replay - только если задано)")
+    parser.add_argument('--replay', action='store_true',
+                        help="Извлечь компании заново из кэша страниц (--page-cache) без браузера и сети, "
+                             "разбор в --parse-processes процессах (0 - на всех ядрах)")
+    parser.add_argument('--replay-conflict', choices=['refresh', 'update', 'ignore'], default='refresh',
+                        help="refresh - обновить выручку и рост сохраненных компаний, не меняя их ОКВЭД, "
+                             "update - обновить и ОКВЭД, ignore - добавить только новые")
+    parser.add_argument('--known-inns', choices=KNOWN_INNS_MODES, default='auto',
+                        help="Пропуск карточек с ИНН, уже сохраненными в базе: exact - массив ИНН, "
+                             "bloom - фильтр Блума с проверкой по базе, auto - bloom для больших таблиц, off - без пропуска")
+    args = parser.parse_args()
+    if args.replay:
+        if not args.page_cache:
+            parser.error("--replay требует --page-cache")
+        raise SystemExit(asyncio.run(replay(
+            args.page_cache,
+            processes=args.parse_processes,
+            on_conflict=args.replay_conflict,
+            cache_ttl_days=args.cache_ttl_days,
+            cache_max_mb=args.cache_max_mb,
+            write_batch=args.write_batch,
+            snapshot=args.snapshot,
+        )))
+    else:
+        asyncio.run(main(
+            num_workers=args.workers,
+            backend=args.backend,
+            base_url=args.base_url.rstrip('/'),
+            extraction=args.extraction,
+            parse_processes=args.parse_processes,
+            recrawl=args.recrawl,
+            rate=args.rate,
+            min_rate=args.min_rate,
+            max_rate=args.max_rate,
+            pagination=args.pagination,
+            snapshot=args.snapshot,
+            metrics_json=args.metrics_json,
+            metrics_prom=args.metrics_prom,
+            metrics_interval=args.metrics_interval,
+            profile_okved=args.profile_okved,
+            profiler_tool=args.profiler,
+            browser_profile=args.browser_profile,
+            browser_spares=args.browser_spares,
+            max_driver_pages=args.max_driver_pages,
+            max_driver_rss=args.max_driver_rss,
+            max_driver_timeouts=args.max_driver_timeouts,
+            known_inns=args.known_inns,
+            write_batch=args.write_batch,
+            write_interval=args.write_interval,
+            write_queue=args.write_queue,
+            page_cache=args.page_cache,
+            cache_ttl_days=DEFAULT_TTL_DAYS if args.cache_ttl_days is None else args.cache_ttl_days,
+            cache_max_mb=DEFAULT_MAX_MB if args.cache_max_mb is None else args.cache_max_mb,
+        ))
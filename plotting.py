@@ -0,0 +1,115 @@
+"""
+График industry_distribution.png по готовым статистикам ящиков с усами
+(квартили, усы по правилу 1.5 IQR, ограниченная выборка выбросов) вместо
+передачи всех строк в seaborn. Статистики считаются векторно по кадру
+или по t-digest потокового режима; matplotlib импортируется только при
+рисовании.
+"""
+import logging
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PLOT_PATH = 'industry_distribution.png'
+WHISKER_IQR = 1.5
+# Сколько выбросов на группу попадает на график (включая крайние)
+MAX_FLIERS = 50
+GROWTH_YLIM = (-100, 300)
+
+
+def _sample_fliers(values: np.ndarray, limit: int = MAX_FLIERS) -> np.ndarray:
+    """Равномерная выборка из отсортированных выбросов с сохранением минимума и максимума"""
+    if len(values) <= limit:
+        return values
+    return values[np.linspace(0, len(values) - 1, limit).round().astype(int)]
+
+
+def frame_box_stats(df: pd.DataFrame, column: str, group_column: str = 'okved_1') -> List[dict]:
+    """
+    Статистики для Axes.bxp по группам df, как у seaborn/matplotlib boxplot:
+    квартили с линейной интерполяцией, усы - крайние значения внутри
+    [Q1 - 1.5 IQR, Q3 + 1.5 IQR]. Группы по возрастанию кода.
+    """
+    values = df[column].to_numpy(dtype=float)
+    codes, labels = pd.factorize(df[group_column], sort=True)
+    valid = ~np.isnan(values) & (codes >= 0)
+    values, codes = values[valid], codes[valid]
+    if not len(values):
+        return []
+
+    quartiles = pd.Series(values).groupby(codes).quantile([0.25, 0.5, 0.75]).unstack()
+    q1, med, q3 = (quartiles[q].reindex(range(len(labels))).to_numpy() for q in (0.25, 0.5, 0.75))
+    low = q1 - WHISKER_IQR * (q3 - q1)
+    high = q3 + WHISKER_IQR * (q3 - q1)
+    inside = (values >= low[codes]) & (values <= high[codes])
+    whiskers = pd.Series(values[inside]).groupby(codes[inside]).agg(['min', 'max'])
+
+    # Выбросы сортируются по группе и значению, затем режутся на группы
+    outside = np.flatnonzero(~inside)
+    order = outside[np.lexsort((values[outside], codes[outside]))]
+    flier_codes, flier_values = codes[order], values[order]
+    bounds = np.searchsorted(flier_codes, np.arange(len(labels) + 1))
+
+    stats = []
+    for code, label in enumerate(labels):
+        if np.isnan(med[code]):
+            continue
+        stats.append({
+            'label': label, 'q1': q1[code], 'med': med[code], 'q3': q3[code],
+            'whislo': whiskers.at[code, 'min'], 'whishi': whiskers.at[code, 'max'],
+            'fliers': _sample_fliers(flier_values[bounds[code]:bounds[code + 1]]),
+        })
+    return stats
+
+
+def state_box_stats(states: Dict, column: str) -> List[dict]:
+    """
+    Приближенные статистики по GroupState потокового режима: квартили из
+    t-digest, усы и выбросы - по центроидам (на краях это отдельные значения).
+    """
+    stats = []
+    for okved in sorted(states):
+        digest = states[okved].columns[column].digest
+        if digest is None or not digest.count:
+            continue
+        q1, med, q3 = (digest.quantile(q) for q in (0.25, 0.5, 0.75))
+        low = q1 - WHISKER_IQR * (q3 - q1)
+        high = q3 + WHISKER_IQR * (q3 - q1)
+        points = np.concatenate([[digest.min], digest.means, [digest.max]])
+        inside = points[(points >= low) & (points <= high)]
+        fliers = np.unique(points[(points < low) | (points > high)])
+        stats.append({
+            'label': okved, 'q1': q1, 'med': med, 'q3': q3,
+            'whislo': inside.min() if len(inside) else q1, 'whishi': inside.max() if len(inside) else q3,
+            'fliers': _sample_fliers(fliers),
+        })
+    return stats
+
+
+def plot_distributions(revenue_stats: List[dict], growth_stats: List[dict], path: str = PLOT_PATH):
+    """Два графика распределений по отраслям в один PNG"""
+    # Figure без pyplot: не нужен интерактивный бэкенд и глобальное состояние
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(15, 10))
+    revenue_ax, growth_ax = figure.subplots(2, 1)
+
+    revenue_ax.bxp(revenue_stats, patch_artist=True, boxprops={'facecolor': 'tab:blue', 'alpha': 0.6})
+    revenue_ax.set_title('Распределение выручки по отраслям')
+    revenue_ax.set_xlabel('okved_1')
+    revenue_ax.set_ylabel('revenue')
+
+    growth_ax.bxp(growth_stats, patch_artist=True, boxprops={'facecolor': 'tab:blue', 'alpha': 0.6})
+    growth_ax.set_title('Распределение темпов роста по отраслям')
+    growth_ax.set_xlabel('okved_1')
+    growth_ax.set_ylabel('growth_rate')
+    growth_ax.set_ylim(*GROWTH_YLIM)
+
+    for ax in (revenue_ax, growth_ax):
+        ax.tick_params(axis='x', labelrotation=45)
+    figure.tight_layout()
+    figure.savefig(path)
+    logger.info(f"График распределений записан в {path}")
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlparse
+
+from crawl_metrics import RATE_WAIT, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket с адаптивной скоростью (AIMD).
+    Пока запросы проходят без ошибок и средняя задержка ниже latency_target,
+    скорость растет на increase запросов/с после каждого ответа; таймаут,
+    ошибка или медленный ответ умножают ее на decrease (не чаще раза в cooldown
+    секунд, чтобы одна волна ошибок не обнулила темп).
+    """
+
+    def __init__(self, rate: float = 1.0, min_rate: float = 0.2, max_rate: float = 5.0,
+                 burst: float = 1.0, increase: float = 0.05, decrease: float = 0.5,
+                 latency_target: float = 8.0, cooldown: float = 5.0, name: str = ''):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.name = name
+        self._rate = min(max(rate, min_rate), max_rate)
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._last_decrease = float('-inf')
+        self._latency: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def rate(self) -> float:
+        """Текущая скорость, запросов в секунду"""
+        return self._rate
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Скользящее среднее задержки ответа, секунд"""
+        return self._latency
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Ждет своей очереди на запрос"""
+        # Под блокировкой ожидающие обслуживаются по порядку
+        async with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+                self._refill(time.monotonic())
+            self._tokens -= 1
+
+    def record(self, latency: float, ok: bool):
+        """Учитывает результат запроса и подстраивает скорость"""
+        self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+        if ok and self._latency <= self.latency_target:
+            self._rate = min(self.max_rate, self._rate + self.increase)
+            return
+
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._rate = max(self.min_rate, self._rate * self.decrease)
+        reason = "ошибка" if not ok else f"задержка {self._latency:.1f} с"
+        logger.info(f"Снижаем темп запросов к {self.name}: {self._rate:.2f} запросов/с ({reason})")
+
+    @asynccontextmanager
+    async def request(self) -> AsyncIterator[None]:
+        """Запрос через лимитер: ожидание очереди, замер задержки и учет ошибок"""
+        with metrics.stage(RATE_WAIT):
+            await self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.record(time.monotonic() - start, ok=False)
+            raise
+        self.record(time.monotonic() - start, ok=True)
+
+
+class HostRateLimiter:
+    """Общие для всех воркеров лимитеры, по одному на хост"""
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self._limiters: Dict[str, AdaptiveRateLimiter] = {}
+
+    def for_url(self, url: str) -> AdaptiveRateLimiter:
+        host = urlparse(url).netloc
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limiter = self._limiters[host] = AdaptiveRateLimiter(name=host, **self.settings)
+        return limiter
+
+    def request(self, url: str):
+        return self.for_url(url).request()
+
+    def rates(self) -> Dict[str, float]:
+        return {host: limiter.rate for host, limiter in self._limiters.items()}
@@ -0,0 +1,126 @@
+"""
+Отчет по отраслям: лист General_Analysis с метриками и листы Top10_<ОКВЭД>.
+Топ-10 всех отраслей считается одной сортировкой и groupby.head, Excel
+пишется построчно через xlsxwriter в режиме constant_memory (без него -
+обычным pd.ExcelWriter). Те же таблицы можно выгрузить в CSV и Parquet.
+"""
+import logging
+import math
+import os
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+REPORT_NAME = 'industry_analysis_cleaned'
+REPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+TOP_COLUMNS = ['name', 'inn', 'revenue', 'growth_rate', 'okved']
+TOP_SIZE = 10
+METRICS_SHEET = 'General_Analysis'
+
+
+def top_by_group(df: pd.DataFrame, columns: Sequence[str] = TOP_COLUMNS, n: int = TOP_SIZE,
+                 group_column: str = 'okved_1', value_column: str = 'revenue') -> Dict[str, pd.DataFrame]:
+    """
+    Первые n строк каждой группы по убыванию value_column, как nlargest(n)
+    внутри группы (при равенстве раньше идет строка, стоявшая раньше в df,
+    NaN пропускаются). Группы по возрастанию кода.
+    """
+    # Сортируются только номера строк (по группе, затем по убыванию значения),
+    # копируются лишь итоговые строки
+    codes, okveds = pd.factorize(df[group_column], sort=True)
+    values = df[value_column].to_numpy(dtype=float)
+    rows = np.flatnonzero(~np.isnan(values) & (codes >= 0))
+    order = rows[np.lexsort((-values[rows], codes[rows]))]
+    if not len(order):
+        return {}
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    # Номер строки внутри своей группы
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    keep = rank < n
+    top = df.iloc[order[keep]][list(columns)]
+    bounds = np.r_[0, np.cumsum(np.minimum(np.diff(np.r_[starts, len(order)]), n))]
+    return {okveds[sorted_codes[start]]: top.iloc[begin:end]
+            for start, begin, end in zip(starts, bounds[:-1], bounds[1:])}
+
+
+def _cell(value):
+    """Значение для xlsxwriter: NaN и NA - пустая ячейка"""
+    if value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value
+
+
+def _write_sheet(workbook, name: str, frame: pd.DataFrame, header_format):
+    worksheet = workbook.add_worksheet(name)
+    worksheet.write_row(0, 0, [str(column) for column in frame.columns], header_format)
+    # constant_memory: строки пишутся строго по порядку
+    for row, values in enumerate(frame.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(row, 0, [_cell(value) for value in values])
+
+
+def write_excel(path: str, metrics: pd.DataFrame, tops: Dict[str, pd.DataFrame]):
+    """Книга отчета; память не зависит от числа листов, если установлен xlsxwriter"""
+    try:
+        import xlsxwriter
+    except ImportError:
+        logger.warning("xlsxwriter не установлен, отчет пишется через pd.ExcelWriter")
+        with pd.ExcelWriter(path) as writer:
+            metrics.to_excel(writer, sheet_name=METRICS_SHEET, index=False)
+            for okved, top in tops.items():
+                top.to_excel(writer, sheet_name=f'Top10_{okved}', index=False)
+        return
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    try:
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center'})
+        _write_sheet(workbook, METRICS_SHEET, metrics, header_format)
+        for okved, top in tops.items():
+            _write_sheet(workbook, f'Top10_{okved}', top, header_format)
+    finally:
+        workbook.close()
+
+
+def long_top_table(tops: Dict[str, pd.DataFrame], group_column: str = 'okved_1') -> pd.DataFrame:
+    """Топ-10 всех отраслей одной таблицей с колонкой group_column"""
+    if not tops:
+        return pd.DataFrame(columns=[group_column] + TOP_COLUMNS)
+    frames = [top.assign(**{group_column: okved}) for okved, top in tops.items()]
+    table = pd.concat(frames, ignore_index=True)
+    return table[[group_column] + [column for column in table.columns if column != group_column]]
+
+
+def write_report(metrics: pd.DataFrame, tops: Dict[str, pd.DataFrame], name: str = REPORT_NAME,
+                 formats: Iterable[str] = ('xlsx',)) -> List[str]:
+    """
+    Пишет отчет в выбранных форматах и возвращает пути файлов:
+    xlsx - <name>.xlsx; csv и parquet - <name>_metrics.* и <name>_top10.*
+    """
+    formats = list(formats)
+    unknown = set(formats) - set(REPORT_FORMATS)
+    if unknown:
+        raise ValueError(f"Неизвестные форматы отчета: {sorted(unknown)}")
+    directory = os.path.dirname(name)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    paths = []
+    if 'xlsx' in formats:
+        write_excel(f'{name}.xlsx', metrics, tops)
+        paths.append(f'{name}.xlsx')
+    flat = [fmt for fmt in formats if fmt != 'xlsx']
+    if flat:
+        top = long_top_table(tops)
+        for fmt in flat:
+            for suffix, table in (('metrics', metrics), ('top10', top)):
+                path = f'{name}_{suffix}.{fmt}'
+                if fmt == 'csv':
+                    table.to_csv(path, index=False)
+                else:
+                    table.to_parquet(path, index=False)
+                paths.append(path)
+    logger.info(f"Отчет записан: {', '.join(paths)}")
+    return paths
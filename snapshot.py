@@ -0,0 +1,212 @@
+"""
+Колоночный снимок таблицы companies в Parquet, разбитый по okved_1
+(каталоги okved_1=<код>/). Рядом лежит _snapshot.json с маркером изменений
+базы: пока маркер совпадает, анализ читает снимок (только нужные колонки
+и отрасли, через memory map) вместо построчной загрузки из SQLite.
+
+    python snapshot.py --db companies.db --path companies_snapshot
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from database import COMPANY_COLUMNS, NUMERIC_COLUMNS
+from industry_metrics import MAX_ANALYSIS_REVENUE, companies_where
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = 'companies_snapshot'
+MANIFEST_NAME = '_snapshot.json'
+# Колонки, которых хватает для метрик и очистки от выбросов
+ANALYSIS_COLUMNS = ['inn', 'okved_1', 'revenue', 'growth_rate']
+
+
+def _arrow():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return pa, ds
+
+
+def _schema():
+    pa, _ = _arrow()
+    return pa.schema([
+        (column, pa.float64() if column in NUMERIC_COLUMNS else pa.string())
+        for column in COMPANY_COLUMNS
+    ])
+
+
+def _partitioning():
+    pa, ds = _arrow()
+    # Явная схема: иначе код '07' при чтении превратится в число 7
+    return ds.partitioning(pa.schema([('okved_1', pa.string())]), flavor='hive')
+
+
+def change_marker(cnx: sqlite3.Connection) -> Optional[str]:
+    """
+    Маркер изменений companies: версия схемы, сумма и максимум версий групп
+    okved_summary (растут при любой записи и при перестроении сводки, см.
+    триггеры Database) и число компаний.
+    None - в базе нет сводки, свежесть снимка проверить нельзя.
+    """
+    try:
+        version_sum, version_max, companies = cnx.execute('''
+            SELECT COALESCE(SUM(version), 0), COALESCE(MAX(version), 0), COALESCE(SUM(companies), 0)
+            FROM okved_summary WHERE level = 1
+        ''').fetchone()
+    except sqlite3.OperationalError:
+        return None
+    schema_version = cnx.execute('PRAGMA user_version').fetchone()[0]
+    return f'{schema_version}:{version_sum}:{version_max}:{companies}'
+
+
+def read_manifest(path: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(path, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _record_batches(cursor: sqlite3.Cursor, batch_size: int) -> Iterator:
+    pa, _ = _arrow()
+    schema = _schema()
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+        )
+
+
+def write_snapshot(db_path: str, path: str = SNAPSHOT_PATH, batch_size: int = 100_000) -> dict:
+    """
+    Записывает снимок companies и возвращает его описание. Данные и маркер
+    читаются в одной транзакции, снимок подменяется целиком после записи.
+    """
+    pa, ds = _arrow()
+    start = time.perf_counter()
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    # Пакеты запрашивает поток записи pyarrow; курсор читается последовательно
+    cnx = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        # Одна транзакция чтения: маркер соответствует записанным строкам
+        cnx.execute('BEGIN')
+        marker = change_marker(cnx)
+        cursor = cnx.execute(f"SELECT {', '.join(COMPANY_COLUMNS)} FROM companies ORDER BY okved_1")
+        reader = pa.RecordBatchReader.from_batches(_schema(), _record_batches(cursor, batch_size))
+        ds.write_dataset(
+            reader, tmp_path, format='parquet', partitioning=_partitioning(),
+            existing_data_behavior='overwrite_or_ignore',
+        )
+        rows = cnx.execute('SELECT COUNT(*) FROM companies').fetchone()[0]
+        cnx.rollback()
+    finally:
+        cnx.close()
+
+    manifest = {'marker': marker, 'rows': rows, 'source': os.path.abspath(db_path), 'created_at': time.time()}
+    with open(os.path.join(tmp_path, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    old_path = f'{path}.old-{os.getpid()}'
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    logger.info(f"Снимок companies записан в {path}: {rows} строк за {time.perf_counter() - start:.1f} с")
+    return manifest
+
+
+def snapshot_is_fresh(db_path: str, path: str = SNAPSHOT_PATH) -> bool:
+    """Снимок есть и записан с тем же маркером изменений, что у базы сейчас"""
+    manifest = read_manifest(path)
+    if manifest is None or manifest.get('marker') is None:
+        return False
+    cnx = sqlite3.connect(db_path)
+    try:
+        return change_marker(cnx) == manifest['marker']
+    finally:
+        cnx.close()
+
+
+def read_snapshot(path: str = SNAPSHOT_PATH, columns: Optional[List[str]] = None,
+                  okveds: Optional[Iterable[str]] = None, analysis_rows: bool = False,
+                  inns: Optional[Iterable[str]] = None,
+                  max_revenue: Optional[float] = MAX_ANALYSIS_REVENUE) -> pd.DataFrame:
+    """
+    Чтение снимка с отбором колонок и отраслей (лишние каталоги okved_1 не
+    открываются). analysis_rows - только строки, которые берет анализ
+    (companies_where(max_revenue)).
+    """
+    import pyarrow.parquet as pq
+    _, ds = _arrow()
+    condition = None
+
+    def add(expression):
+        nonlocal condition
+        condition = expression if condition is None else condition & expression
+
+    if okveds is not None:
+        add(ds.field('okved_1').isin(list(okveds)))
+    if inns is not None:
+        add(ds.field('inn').isin(list(inns)))
+    if analysis_rows:
+        # То же, что companies_where
+        add(ds.field('revenue').is_valid() & ds.field('growth_rate').is_valid())
+        if max_revenue is not None:
+            add(ds.field('revenue') < max_revenue)
+    table = pq.read_table(path, columns=columns, filters=condition, memory_map=True,
+                          partitioning=_partitioning(), ignore_prefixes=['_', '.'])
+    return table.to_pandas()
+
+
+def load_analysis_frame(db_path: str, path: str = SNAPSHOT_PATH, columns: Optional[List[str]] = None,
+                        max_revenue: Optional[float] = MAX_ANALYSIS_REVENUE) -> Tuple[pd.DataFrame, str]:
+    """
+    Строки для анализа: из свежего снимка (только columns, по умолчанию
+    ANALYSIS_COLUMNS) или из SQLite. Возвращает кадр и источник.
+    """
+    if snapshot_is_fresh(db_path, path):
+        frame = read_snapshot(path, columns or ANALYSIS_COLUMNS, analysis_rows=True, max_revenue=max_revenue)
+        return frame, 'snapshot'
+    if read_manifest(path) is not None:
+        logger.info(f"Снимок {path} устарел, данные загружаются из SQLite")
+    cnx = sqlite3.connect(db_path)
+    try:
+        # Как в COMPANIES_QUERY: выборка почти без отсева, индекс по выручке не нужен
+        query = f"SELECT * FROM companies NOT INDEXED WHERE {companies_where(max_revenue)}"
+        return pd.read_sql_query(query, cnx), 'sqlite'
+    finally:
+        cnx.close()
+
+
+def fill_top_details(tops: Dict[str, pd.DataFrame], path: str, columns: List[str]) -> Dict[str, pd.DataFrame]:
+    """Дочитывает из снимка колонки columns для строк топ-таблиц (по inn)"""
+    inns = [inn for top in tops.values() for inn in top['inn']]
+    if not inns:
+        return tops
+    details = read_snapshot(path, columns, inns=inns).drop_duplicates('inn').set_index('inn')
+    filled = {}
+    for okved, top in tops.items():
+        rows = details.loc[top['inn']].reset_index()
+        filled[okved] = rows[columns].set_axis(top.index)
+    return filled
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='companies.db')
+    parser.add_argument('--path', default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+    write_snapshot(args.db, args.path)
@@ -0,0 +1,357 @@
+"""
+Потоковый расчет метрик по отраслям: таблица companies читается порциями,
+по каждому okved_1 хранится сливаемое состояние (счетчики, суммы, среднее
+и дисперсия по Велфорду/Чану, t-digest для квантилей, топ-10 по выручке).
+Память не зависит от размера таблицы, части таблицы можно считать
+в разных процессах и сливать.
+"""
+import math
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from industry_metrics import COMPANIES_WHERE, DEFAULT_WEIGHTS, METRIC_COLUMNS, ScoreWeights, add_perspective_score
+VALUE_COLUMNS = ('revenue', 'growth_rate')
+TOP_COLUMNS = ['name', 'inn', 'revenue', 'growth_rate', 'okved']
+TOP_SIZE = 10
+Z_SCORE_LIMIT = 3
+
+
+class TDigest:
+    """
+    Merging t-digest (Dunning): отсортированные центроиды с весами, число
+    которых ограничено compression. Слияние - объединение центроидов и
+    повторное сжатие, поэтому дайджесты частей таблицы складываются.
+    Пока точек мало, центроиды совпадают с точками и квантили точные.
+    """
+
+    __slots__ = ('compression', 'means', 'weights', 'min', 'max')
+
+    def __init__(self, compression: float = 500):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = math.inf
+        self.max = -math.inf
+
+    @classmethod
+    def from_values(cls, values: np.ndarray, compression: float = 500) -> 'TDigest':
+        digest = cls(compression)
+        values = np.sort(np.asarray(values, dtype=float))
+        if len(values):
+            digest.min, digest.max = values[0], values[-1]
+            digest._compress(values, np.ones(len(values)))
+        return digest
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def merge(self, other: 'TDigest') -> 'TDigest':
+        if not len(other.means):
+            return self
+        means = np.concatenate([self.means, other.means])
+        weights = np.concatenate([self.weights, other.weights])
+        order = np.argsort(means, kind='stable')
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(means[order], weights[order])
+        return self
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        total = weights.sum()
+        # Масштаб k1: центроид занимает не больше единицы k, поэтому у хвостов
+        # центроиды мелкие (точные крайние квантили), в середине - крупные
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * math.pi) * np.arcsin(2 * q - 1)
+        buckets = np.floor(k)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        if len(starts) == len(means):
+            self.means, self.weights = means, weights
+            return
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q: float) -> float:
+        """Линейная интерполяция между центрами центроидов, как Series.quantile"""
+        if not len(self.means):
+            return math.nan
+        centers = np.cumsum(self.weights) - self.weights / 2
+        # Для единичных весов совпадает с позицией q * (n - 1) в pandas
+        target = q * (self.count - 1) + 0.5
+        return float(np.interp(target, centers, self.means, left=self.min, right=self.max))
+
+
+@dataclass
+class ColumnState:
+    """Счетчик, сумма, среднее и M2 (сумма квадратов отклонений) колонки"""
+    count: int = 0
+    total: float = 0.0
+    mean: float = 0.0
+    m2: float = 0.0
+    digest: Optional[TDigest] = None
+
+    def merge(self, count: int, total: float, mean: float, m2: float, digest: Optional[TDigest] = None):
+        """Слияние по формулам Чана"""
+        if count:
+            merged = self.count + count
+            delta = mean - self.mean
+            self.m2 += m2 + delta * delta * self.count * count / merged
+            self.mean += delta * count / merged
+            self.count = merged
+            self.total += total
+        if digest is not None:
+            self.digest = digest if self.digest is None else self.digest.merge(digest)
+        return self
+
+    def merge_state(self, other: 'ColumnState'):
+        return self.merge(other.count, other.total, other.mean, other.m2, other.digest)
+
+    @property
+    def std(self) -> float:
+        """Стандартное отклонение с ddof=1, как Series.std"""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+    @property
+    def population_std(self) -> float:
+        """Стандартное отклонение с ddof=0, как stats.zscore"""
+        return math.sqrt(self.m2 / self.count) if self.count else math.nan
+
+    def quantile(self, q: float) -> float:
+        return self.digest.quantile(q) if self.digest is not None else math.nan
+
+
+@dataclass
+class GroupState:
+    size: int = 0
+    positive_growth: int = 0
+    columns: Dict[str, ColumnState] = field(default_factory=lambda: {c: ColumnState() for c in VALUE_COLUMNS})
+    top: Optional[pd.DataFrame] = None
+
+    def merge(self, other: 'GroupState'):
+        self.size += other.size
+        self.positive_growth += other.positive_growth
+        for column, state in other.columns.items():
+            self.columns[column].merge_state(state)
+        if other.top is not None:
+            self.top = other.top if self.top is None else _top(pd.concat([self.top, other.top]))
+        return self
+
+
+def merge_states(states: List[Dict[str, GroupState]]) -> Dict[str, GroupState]:
+    merged: Dict[str, GroupState] = {}
+    for part in states:
+        for okved, state in part.items():
+            if okved in merged:
+                merged[okved].merge(state)
+            else:
+                merged[okved] = state
+    return merged
+
+
+def _top(frame: pd.DataFrame) -> pd.DataFrame:
+    return frame.nlargest(TOP_SIZE, 'revenue')
+
+
+# Диапазон ИНН [от, до); None - без границы
+InnRange = Tuple[Optional[str], Optional[str]]
+
+
+def read_chunks(db_path: str, chunk_size: int, inn_range: Optional[InnRange] = None) -> Iterator[pd.DataFrame]:
+    """Порции строк companies; inn_range - часть таблицы по ключу inn (работает и без rowid)"""
+    query = f"SELECT {', '.join(TOP_COLUMNS)}, okved_1 FROM companies WHERE {COMPANIES_WHERE}"
+    params: list = []
+    low, high = inn_range or (None, None)
+    if low is not None:
+        query += " AND inn >= ?"
+        params.append(low)
+    if high is not None:
+        query += " AND inn < ?"
+        params.append(high)
+    cnx = sqlite3.connect(db_path)
+    try:
+        for chunk in pd.read_sql_query(query, cnx, params=params, chunksize=chunk_size):
+            for column in VALUE_COLUMNS:
+                chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+            yield chunk
+    finally:
+        cnx.close()
+
+
+def chunk_state(chunk: pd.DataFrame, compression: float = 500,
+                with_details: bool = True) -> Dict[str, GroupState]:
+    """Состояние одной порции; with_details=False - только моменты (первый проход)"""
+    grouped = chunk.groupby('okved_1', sort=False)
+    sizes = grouped.size()
+    positive = (chunk['growth_rate'] > 0).groupby(chunk['okved_1'], sort=False).sum()
+    moments = {}
+    for column in VALUE_COLUMNS:
+        values = grouped[column]
+        count = values.count()
+        mean = values.mean()
+        # M2 = var(ddof=0) * n; у групп без значений count = 0 и состояние не меняется
+        m2 = values.var(ddof=0).fillna(0) * count
+        moments[column] = (count, values.sum(), mean, m2)
+
+    states = {}
+    for okved in sizes.index:
+        state = GroupState(size=int(sizes[okved]), positive_growth=int(positive[okved]))
+        for column, (count, total, mean, m2) in moments.items():
+            state.columns[column].merge(int(count[okved]), float(total[okved]),
+                                        float(mean[okved]) if count[okved] else 0.0, float(m2[okved]))
+        states[okved] = state
+
+    if with_details:
+        # Сортировка по (группа, значение) один раз на колонку, дальше срезы
+        codes, uniques = pd.factorize(chunk['okved_1'])
+        for column in VALUE_COLUMNS:
+            values = chunk[column].to_numpy(dtype=float)
+            valid = ~np.isnan(values)
+            order = np.lexsort((values[valid], codes[valid]))
+            sorted_codes = codes[valid][order]
+            sorted_values = values[valid][order]
+            bounds = np.searchsorted(sorted_codes, np.arange(len(uniques) + 1))
+            for code, okved in enumerate(uniques):
+                part = sorted_values[bounds[code]:bounds[code + 1]]
+                if len(part):
+                    states[okved].columns[column].digest = TDigest.from_values(part, compression)
+        tops = chunk.sort_values('revenue', ascending=False, kind='stable').groupby('okved_1', sort=False).head(TOP_SIZE)
+        for okved, top in tops.groupby('okved_1', sort=False):
+            states[okved].top = top[TOP_COLUMNS]
+    return states
+
+
+def _population_limits(raw: Dict[str, GroupState]) -> Dict[str, Dict[str, Tuple[float, float]]]:
+    return {okved: {column: (state.mean, state.population_std) for column, state in group.columns.items()}
+            for okved, group in raw.items()}
+
+
+def clean_chunk(chunk: pd.DataFrame, limits: Dict[str, Dict[str, Tuple[float, float]]]) -> pd.DataFrame:
+    """
+    Отбор строк с |z| < 3 по обеим колонкам внутри своего ОКВЭД, как
+    remove_outliers в analyze_outliers.py (z-score с ddof=0, строки групп
+    с нулевым разбросом отбрасываются).
+    """
+    keep = np.ones(len(chunk), dtype=bool)
+    for column in VALUE_COLUMNS:
+        mean = chunk['okved_1'].map({okved: limit[column][0] for okved, limit in limits.items()})
+        std = chunk['okved_1'].map({okved: limit[column][1] for okved, limit in limits.items()})
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = (chunk[column] - mean) / std
+        keep &= (z.abs() < Z_SCORE_LIMIT).to_numpy()
+    return chunk[keep]
+
+
+def _raw_pass(db_path: str, chunk_size: int, inn_range) -> Dict[str, GroupState]:
+    state: Dict[str, GroupState] = {}
+    for chunk in read_chunks(db_path, chunk_size, inn_range):
+        state = merge_states([state, chunk_state(chunk, with_details=False)])
+    return state
+
+
+def _clean_pass(db_path: str, chunk_size: int, limits, compression, inn_range) -> Dict[str, GroupState]:
+    state: Dict[str, GroupState] = {}
+    for chunk in read_chunks(db_path, chunk_size, inn_range):
+        cleaned = clean_chunk(chunk, limits)
+        if len(cleaned):
+            state = merge_states([state, chunk_state(cleaned, compression)])
+    return state
+
+
+def _inn_ranges(db_path: str, parts: int) -> List[Optional[InnRange]]:
+    """Примерно равные части таблицы по первичному ключу inn"""
+    if parts <= 1:
+        return [None]
+    cnx = sqlite3.connect(db_path)
+    try:
+        total = cnx.execute("SELECT COUNT(*) FROM companies").fetchone()[0]
+        bounds = []
+        for part in range(1, parts):
+            row = cnx.execute("SELECT inn FROM companies ORDER BY inn LIMIT 1 OFFSET ?",
+                              (total * part // parts,)).fetchone()
+            if row is not None and (not bounds or row[0] > bounds[-1]):
+                bounds.append(row[0])
+    finally:
+        cnx.close()
+    edges = [None] + bounds + [None]
+    return list(zip(edges, edges[1:]))
+
+
+def _run(executor, func, ranges) -> Dict[str, GroupState]:
+    """func(inn_range) по всем диапазонам, в процессах executor или на месте"""
+    if executor is None:
+        return merge_states([func(inn_range) for inn_range in ranges])
+    return merge_states(list(executor.map(func, ranges)))
+
+
+def stream_industry_state(db_path: str, chunk_size: int = 100_000, workers: int = 1,
+                          compression: float = 500) -> Tuple[Dict[str, GroupState], int]:
+    """
+    Два прохода по таблице: моменты исходных данных для z-score, затем
+    состояние очищенных данных. Возвращает состояния групп и число строк до очистки.
+    """
+    ranges = _inn_ranges(db_path, workers)
+    executor = ProcessPoolExecutor(max_workers=workers) if len(ranges) > 1 else None
+    try:
+        raw = _run(executor, partial(_raw_pass, db_path, chunk_size), ranges)
+        limits = _population_limits(raw)
+        cleaned = _run(executor, partial(_clean_pass, db_path, chunk_size, limits, compression), ranges)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return cleaned, sum(group.size for group in raw.values())
+
+
+def metrics_from_state(states: Dict[str, GroupState], weights: ScoreWeights = DEFAULT_WEIGHTS) -> pd.DataFrame:
+    """Таблица метрик в формате compute_industry_metrics (квантили - по t-digest)"""
+    # Порядок отраслей как у groupby по всей таблице
+    groups = sorted(states.items())
+    rows = []
+    for okved, group in groups:
+        revenue = group.columns['revenue']
+        growth = group.columns['growth_rate']
+        rows.append({
+            'okved': okved,
+            'company_count': group.size,
+            'avg_revenue': revenue.mean if revenue.count else math.nan,
+            'avg_growth': growth.mean if growth.count else math.nan,
+            'revenue_std': revenue.std,
+            'growth_std': growth.std,
+            'revenue_median': revenue.quantile(0.5),
+            'growth_median': growth.quantile(0.5),
+            'revenue_q1': revenue.quantile(0.25),
+            'revenue_q3': revenue.quantile(0.75),
+            'growth_q1': growth.quantile(0.25),
+            'growth_q3': growth.quantile(0.75),
+            'total_revenue': revenue.total,
+            'positive_growth_ratio': group.positive_growth / group.size * 100,
+        })
+    metrics = pd.DataFrame(rows, columns=[
+        'okved', 'company_count', 'avg_revenue', 'avg_growth', 'revenue_std', 'growth_std',
+        'revenue_median', 'growth_median', 'revenue_q1', 'revenue_q3', 'growth_q1', 'growth_q3',
+        'total_revenue', 'positive_growth_ratio',
+    ])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics['revenue_cv'] = metrics['revenue_std'] / metrics['avg_revenue'] * 100
+        metrics['growth_cv'] = metrics['growth_std'] / metrics['avg_growth'] * 100
+    metrics['revenue_iqr'] = metrics['revenue_q3'] - metrics['revenue_q1']
+    metrics['growth_iqr'] = metrics['growth_q3'] - metrics['growth_q1']
+
+    revenue_count = sum(group.columns['revenue'].count for _, group in groups)
+    revenue_mean = sum(group.columns['revenue'].total for _, group in groups) / revenue_count if revenue_count else math.nan
+    return add_perspective_score(metrics[METRIC_COLUMNS[:-1]], revenue_mean, weights)
+
+
+def top_companies(states: Dict[str, GroupState]) -> Dict[str, pd.DataFrame]:
+    """Топ-10 компаний по выручке в каждом ОКВЭД (при равной выручке - по ИНН)"""
+    tops = {}
+    for okved, group in sorted(states.items()):
+        if group.top is not None:
+            top = group.top.sort_values(['revenue', 'inn'], ascending=[False, True])
+            tops[okved] = top[TOP_COLUMNS].reset_index(drop=True)
+    return tops